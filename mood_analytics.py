@@ -0,0 +1,333 @@
+"""Mood trends for the statistics view, computed with NumPy.
+
+The log is loaded into two columns, entry time (seconds since 1970) and
+mood code, and every trend is a handful of whole-array operations over
+them. Even the parsing is vectorized: header lines have a fixed layout, so
+dates, times and moods are read straight out of the file bytes. The columns
+are saved to <log>.analytics.npz and only entries appended after it are
+parsed on the next run, the same way the statistics snapshot works.
+
+NumPy is optional - without it the statistics view just leaves the trends out.
+"""
+import os
+import sys
+from datetime import datetime
+
+from mood_storage import (log_offset_is_boundary, log_exists, log_size, open_log, get_mood_log, dead_entries,
+                          log_generation)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("numpy not found. Mood trends disabled. Install with: pip install numpy")
+
+# Layout of a header line: "Date: YYYY-MM-DD Time: HH:MM:SS Mood: <mood>"
+header_literals = {0: b"Date: ", 10: b"-", 13: b"-", 16: b" Time: ", 25: b":", 28: b":", 31: b" Mood: "}
+header_digits = (6, 7, 8, 9, 11, 12, 14, 15, 23, 24, 26, 27, 29, 30)
+header_length = 38  # The mood name starts here
+mood_key_length = 32  # Mood names are told apart by their first 32 bytes
+block_size = 32 * 1024 * 1024
+weekday_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def parse_header_columns(buf):
+    """Find the entries in a block of log bytes that starts at an entry boundary.
+
+    Returns (seconds, mood keys, positions in the block) arrays, one item per
+    valid entry - a header line with a real date and time, followed by a
+    "Note: " line.
+    """
+    newlines = np.flatnonzero(buf == 10)
+    if len(newlines) == 0:
+        # Not even one full line
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=f"V{mood_key_length}"), np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], newlines + 1))
+    starts = starts[starts + header_length <= len(buf)]
+    # Cheap first pass - most note lines don't start with "D"
+    starts = starts[buf[starts] == 68]
+
+    valid = np.ones(len(starts), dtype=bool)
+    for position, literal in header_literals.items():
+        for i, byte in enumerate(literal):
+            valid &= buf[starts + position + i] == byte
+    for position in header_digits:
+        digit = buf[starts + position]
+        valid &= (digit >= 48) & (digit <= 57)
+    starts = starts[valid]
+
+    def number(*positions):
+        value = np.zeros(len(starts), dtype=np.int64)
+        for position in positions:
+            value = value * 10 + buf[starts + position] - 48
+        return value
+    year, month, day = number(6, 7, 8, 9), number(11, 12), number(14, 15)
+    hour, minute, second = number(23, 24), number(26, 27), number(29, 30)
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    # Reject days past the end of the month (e.g. 02-30), which strptime refuses too
+    valid &= days.astype("datetime64[M]") == months
+
+    # The mood runs to the end of the line; the next line must be the note
+    mood_start = starts + header_length
+    line_end = newlines[np.minimum(np.searchsorted(newlines, mood_start), len(newlines) - 1)]
+    line_end = np.where(line_end >= mood_start, line_end, len(buf))
+    note_start = np.minimum(line_end + 1, len(buf) - 6)
+    for i, byte in enumerate(b"Note: "):
+        valid &= (line_end + 1 + 6 <= len(buf)) & (buf[note_start + i] == byte)
+
+    # Strip spaces and carriage returns around the mood, like the line parser does
+    mood_end = line_end
+    for _ in range(4):
+        mood_start = np.where((mood_start < mood_end) & (buf[np.minimum(mood_start, len(buf) - 1)] == 32),
+                              mood_start + 1, mood_start)
+        trailing = buf[np.maximum(mood_end - 1, 0)]
+        mood_end = np.where((mood_end > mood_start) & ((trailing == 32) | (trailing == 13) | (trailing == 9)),
+                            mood_end - 1, mood_end)
+    valid &= mood_end > mood_start
+
+    keep = np.flatnonzero(valid)
+    seconds = (days[keep].astype(np.int64) * 86400 + hour[keep] * 3600 + minute[keep] * 60 + second[keep])
+    mood_start, mood_end = mood_start[keep], mood_end[keep]
+    columns = np.arange(mood_key_length)
+    positions = mood_start[:, None] + columns
+    keys = np.where(columns < (mood_end - mood_start)[:, None], buf[np.minimum(positions, len(buf) - 1)], np.uint8(0))
+    keys = np.ascontiguousarray(keys).view(f"V{mood_key_length}").ravel()
+    return seconds, keys, starts[keep].astype(np.int64)
+
+# Columnar copy of the mood log, kept next to it and extended as entries are appended
+class MoodColumns:
+    def __init__(self, log_path="mood_log.txt"):
+        self.log_path = log_path
+        self.cache_path = os.path.splitext(log_path)[0] + ".analytics.npz"
+        self.reset()
+
+    def reset(self):
+        self.offset = 0  # Byte offset in the log covered by the columns
+        self.generation = log_generation(self.log_path)  # Compactions of the log move every offset
+        self.seconds = np.zeros(0, dtype=np.int64)  # Entry times, seconds since 1970
+        self.moods = np.zeros(0, dtype=np.uint16)  # Index into mood_names
+        self.offsets = np.zeros(0, dtype=np.int64)  # Byte offset of each entry, to leave out dead ones
+        self.mood_names = []
+
+    def load(self):
+        """Load the saved columns and parse only the entries written after them"""
+        self.reset()
+        try:
+            if os.path.exists(self.cache_path):
+                with np.load(self.cache_path) as data:
+                    offset = int(data["offset"])
+                    if "offsets" in data.files and log_offset_is_boundary(self.log_path, offset):
+                        self.offset = offset
+                        self.seconds = data["seconds"]
+                        self.moods = data["moods"]
+                        self.offsets = data["offsets"]
+                        self.mood_names = [str(name) for name in data["mood_names"]]
+        except Exception as e:
+            print(f"Error loading analytics cache: {e}", file=sys.stderr)
+            self.reset()
+
+        start_offset = self.offset
+        self.refresh()
+        if self.offset != start_offset:
+            self.save()
+
+    def refresh(self):
+        """Parse entries appended to the log since the last update"""
+        if not log_exists(self.log_path):
+            return
+        end_offset = log_size(self.log_path)
+        if end_offset < self.offset or self.generation != log_generation(self.log_path):
+            # The log was truncated, replaced or compacted - start over
+            self.reset()
+        if end_offset == self.offset:
+            return
+
+        seconds_parts, mood_parts, offset_parts = [self.seconds], [self.moods], [self.offsets]
+        with open_log(self.log_path) as file:
+            file.seek(self.offset)
+            position = self.offset  # Log offset of the first byte of data
+            carry = b""
+            while True:
+                block = file.read(block_size)
+                data = carry + block
+                if block:
+                    # Only parse up to the last entry that is known to be complete
+                    cut = data.rfind(b"\nDate: ") + 1
+                    if cut <= 0:
+                        carry = data
+                        continue
+                    data, carry = data[:cut], data[cut:]
+                if data:
+                    seconds, keys, starts = parse_header_columns(np.frombuffer(data, dtype=np.uint8))
+                    seconds_parts.append(seconds)
+                    mood_parts.append(self.mood_codes(keys))
+                    offset_parts.append(starts + position)
+                    position += len(data)
+                if not block:
+                    break
+        self.seconds = np.concatenate(seconds_parts)
+        self.moods = np.concatenate(mood_parts).astype(np.uint16)
+        self.offsets = np.concatenate(offset_parts)
+        self.offset = end_offset
+
+    def mood_codes(self, keys):
+        """Turn mood keys into codes, giving new moods the next free code"""
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        code_map = np.zeros(len(unique_keys), dtype=np.uint16)
+        for i, key in enumerate(unique_keys):
+            name = bytes(key).rstrip(b"\0").decode("utf-8", "replace")
+            if name not in self.mood_names:
+                self.mood_names.append(name)
+            code_map[i] = self.mood_names.index(name)
+        return code_map[inverse.ravel()]
+
+    def save(self):
+        try:
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "wb") as file:
+                np.savez(file, offset=np.int64(self.offset), seconds=self.seconds, moods=self.moods,
+                         offsets=self.offsets, mood_names=np.array(self.mood_names, dtype=str))
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error saving analytics cache: {e}", file=sys.stderr)
+
+    def without(self, offsets):
+        """A copy of the columns leaving out the entries at the given log offsets"""
+        columns = MoodColumns(self.log_path)
+        keep = ~np.isin(self.offsets, np.fromiter(offsets, dtype=np.int64))
+        columns.offset, columns.mood_names = self.offset, self.mood_names
+        columns.seconds, columns.moods, columns.offsets = self.seconds[keep], self.moods[keep], self.offsets[keep]
+        return columns
+
+    def in_order(self):
+        """Times and moods sorted by time (entries are usually already in order)"""
+        if len(self.seconds) > 1 and np.any(self.seconds[1:] < self.seconds[:-1]):
+            order = np.argsort(self.seconds, kind="stable")
+            return self.seconds[order], self.moods[order]
+        return self.seconds, self.moods
+
+# Vectorized queries over MoodColumns
+def day_numbers(seconds):
+    """Days since 1970 for each entry"""
+    return seconds // 86400
+
+def weekdays(days):
+    """Monday is 0 - 1970-01-01 was a Thursday"""
+    return (days + 3) % 7
+
+def moods_per_period(columns, period="day"):
+    """Entry counts per mood for each day, week (starting Monday) or month with entries.
+
+    Returns (period starts as datetime64[D], counts array of shape (periods, moods)).
+    """
+    days = day_numbers(columns.seconds)
+    if period == "day":
+        keys = days
+    elif period == "week":
+        keys = days - weekdays(days)
+    else:
+        keys = days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    periods, period_index = np.unique(keys, return_inverse=True)
+    mood_count = len(columns.mood_names)
+    counts = np.bincount(period_index.ravel() * mood_count + columns.moods,
+                         minlength=len(periods) * mood_count).reshape(len(periods), mood_count)
+    return periods.astype("datetime64[D]"), counts
+
+def hour_histogram(columns):
+    return np.bincount((columns.seconds % 86400) // 3600, minlength=24)
+
+def weekday_histogram(columns):
+    return np.bincount(weekdays(day_numbers(columns.seconds)), minlength=7)
+
+def logging_streaks(columns, today=None):
+    """(current streak, longest streak) in days with at least one entry.
+
+    The current streak still counts if nothing has been logged yet today.
+    """
+    days = np.unique(day_numbers(columns.seconds))
+    if len(days) == 0:
+        return 0, 0
+    # Split the days into runs of consecutive dates
+    breaks = np.flatnonzero(np.diff(days) != 1) + 1
+    run_starts = np.concatenate(([0], breaks))
+    run_lengths = np.diff(np.concatenate((run_starts, [len(days)])))
+    today = (today or datetime.now().date()) - datetime(1970, 1, 1).date()
+    current = int(run_lengths[-1]) if days[-1] >= today.days - 1 else 0
+    return current, int(run_lengths.max())
+
+def transition_matrix(columns):
+    """counts[a, b] = how often mood b was the next entry after mood a"""
+    _, moods = columns.in_order()
+    mood_count = len(columns.mood_names)
+    pairs = moods[:-1].astype(np.int64) * mood_count + moods[1:]
+    return np.bincount(pairs, minlength=mood_count * mood_count).reshape(mood_count, mood_count)
+
+def trends_text(columns):
+    """The trends section of the statistics page"""
+    if len(columns.seconds) == 0:
+        return ""
+    names = columns.mood_names
+    text = ""
+
+    current, longest = logging_streaks(columns)
+    text += "STREAKS:\n"
+    text += f"Current Streak: {current} days\n"
+    text += f"Longest Streak: {longest} days\n\n"
+
+    for title, period, shown in (("RECENT DAYS", "day", 7), ("RECENT WEEKS", "week", 4), ("RECENT MONTHS", "month", 6)):
+        periods, counts = moods_per_period(columns, period)
+        text += f"{title}:\n"
+        for start, row in zip(periods[-shown:][::-1], counts[-shown:][::-1]):
+            label = str(start)[:7] if period == "month" else str(start)
+            top = np.argsort(row)[::-1][:2]
+            summary = ", ".join(f"{names[mood]} {row[mood]}" for mood in top if row[mood])
+            text += f"{label}: {row.sum()} entries ({summary})\n"
+        text += "\n"
+
+    hours = hour_histogram(columns)
+    text += "BUSIEST HOURS:\n"
+    for hour in np.argsort(hours, kind="stable")[::-1][:3]:
+        if hours[hour]:
+            text += f"{hour:02d}:00-{hour:02d}:59: {hours[hour]} entries\n"
+    text += "\n"
+
+    days = weekday_histogram(columns)
+    text += "BY WEEKDAY:\n"
+    text += ", ".join(f"{name} {count}" for name, count in zip(weekday_names, days)) + "\n\n"
+
+    transitions = transition_matrix(columns)
+    if transitions.sum():
+        text += "MOOD SHIFTS (what usually comes next):\n"
+        for mood in np.argsort(transitions.sum(axis=1), kind="stable")[::-1]:
+            row = transitions[mood]
+            if row.sum():
+                following = int(np.argmax(row))
+                text += f"{names[mood]} -> {names[following]} ({row[following] / row.sum() * 100:.0f}%)\n"
+    return text
+
+# Columns for each log that has been analysed, kept up to date between visits to the stats view
+loaded_columns = {}
+
+# Function to calculate the mood trends
+def calculate_mood_trends():
+    """The trends section of the statistics page (empty without NumPy)"""
+    if np is None:
+        return ""
+    try:
+        mood_log = get_mood_log()
+        mood_log.flush()
+        columns = loaded_columns.get(mood_log.path)
+        if columns is None:
+            columns = loaded_columns[mood_log.path] = MoodColumns(mood_log.path)
+            columns.load()
+        else:
+            start_offset = columns.offset
+            columns.refresh()
+            if columns.offset != start_offset:
+                columns.save()
+        # Deleted and replaced entries stay in the columns until the log is compacted
+        dead = dead_entries(mood_log.path)
+        return trends_text(columns.without(list(dead)) if dead else columns)
+    except Exception as e:
+        return f"Error calculating mood trends: {e}"
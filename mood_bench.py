@@ -0,0 +1,418 @@
+"""Benchmarks for the mood tracker - storage, statistics, UI and startup.
+
+Synthetic mood logs (1k entries up to 10M) are generated once into
+.bench_data/ and reused. Every measurement runs in a fresh Python process so
+peak memory and cold caches are not skewed by earlier runs, and the results
+are saved as JSON that can be compared between commits:
+
+    python mood_bench.py --sizes 1k,10k,100k -o before.json
+    python mood_bench.py --sizes 1k,10k,100k -o after.json --compare before.json
+
+The UI benchmarks need a display; run them headlessly with a virtual X
+server (xvfb-run python mood_bench.py ...). Without one they are recorded as
+skipped, except the leaf animation which falls back to a stubbed canvas.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows - peak RSS is not reported
+
+repo_folder = os.path.dirname(os.path.abspath(__file__))
+
+moods = ["Joy", "Neutral", "Sadness", "Anger", "Annoyed", "Anxiety", "Fear"]
+mood_weights = [30, 25, 15, 8, 10, 8, 4]
+note_words = ("today i felt really good tired happy sad work school friends family dinner coffee rain "
+              "sunny walk slept late early meeting deadline game music movie book garden cat dog call "
+              "mom dad sister brother exam lunch gym run anxious calm busy quiet weekend monday trip "
+              "home late night morning headache pancakes festival fishing farm harvest").split()
+
+# Function to parse sizes such as "10k" or "1M"
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+# Function to make up a note of realistic length
+def make_note(rng):
+    """Mostly a short sentence, sometimes empty, now and then a few lines long"""
+    if rng.random() < 0.1:
+        return ""
+    word_count = min(int(rng.lognormvariate(2.3, 0.8)) + 1, 200)
+    words = [rng.choice(note_words) for _ in range(word_count)]
+    if word_count > 40 and rng.random() < 0.5:
+        # Long notes are sometimes split into paragraphs
+        words.insert(word_count // 2, "\n")
+    return " ".join(words).replace(" \n ", "\n")
+
+# Function to write a synthetic mood log
+def generate_mood_log(path, count, seed=1234):
+    """Write count entries, oldest first, ending now with a few entries per day"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    # About three entries a day, packed closer for huge logs so they still fit in 30 years
+    spacing = max(2, min(28800, 30 * 365 * 86400 // count))
+    start = now - timedelta(seconds=count * spacing)
+    with open(path, "w", encoding="utf-8") as file:
+        batch = []
+        for n in range(count):
+            timestamp = start + timedelta(seconds=n * spacing + rng.randint(1, spacing - 1))
+            mood = rng.choices(moods, mood_weights)[0]
+            batch.append(f"Date: {timestamp:%Y-%m-%d} Time: {timestamp:%H:%M:%S} Mood: {mood}\n"
+                         f"Note: {make_note(rng)}\n\n")
+            if len(batch) >= 10000:
+                file.write("".join(batch))
+                batch.clear()
+        file.write("".join(batch))
+
+# Function to get the folder of a generated log, generating it if needed
+def prepare_data(data_folder, count, seed):
+    """Return a folder holding mood_log.txt with count entries and a link to the images"""
+    folder = os.path.join(data_folder, str(count))
+    marker_path = os.path.join(folder, "generated.json")
+    marker = {"count": count, "seed": seed}
+    try:
+        with open(marker_path, "r", encoding="utf-8") as file:
+            if json.load(file) == marker:
+                return folder
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(folder, exist_ok=True)
+    # The app splits the log into monthly segments the first time it opens it
+    shutil.rmtree(os.path.join(folder, "mood_log.segments"), ignore_errors=True)
+    print(f"Generating {count} entries...", file=sys.stderr)
+    start = time.perf_counter()
+    generate_mood_log(os.path.join(folder, "mood_log.txt"), count, seed)
+    print(f"  done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    clear_caches(folder)
+    with open(marker_path, "w", encoding="utf-8") as file:
+        json.dump(marker, file)
+    return folder
+
+# Function to remove everything the app derives from the log and the images
+def clear_caches(folder):
+    from mood_storage import offset_cache_suffixes, segment_folder
+    # Every file and folder kept next to the log, and the segment manifest (read from the segments again)
+    names = ["mood_log" + suffix for suffix in offset_cache_suffixes] + [".music_library.json", ".image_cache"]
+    segments = segment_folder(os.path.join(folder, "mood_log.txt"))
+    paths = [os.path.join(folder, name) for name in names]
+    paths += [os.path.join(segments, "manifest.json"), segments + ".compact", segments + ".old"]
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+# Function to give a benchmark folder the app's images
+def link_images(folder):
+    images = os.path.join(folder, "images")
+    if not os.path.exists(images):
+        try:
+            os.symlink(os.path.join(repo_folder, "images"), images, target_is_directory=True)
+        except OSError:
+            shutil.copytree(os.path.join(repo_folder, "images"), images)
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def measure(function):
+    """Time one call and how much it raised the peak memory of the process"""
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    result = {"seconds": seconds}
+    if rss_before is not None:
+        result["peak_growth_kb"] = peak_rss_kb() - rss_before
+    return result
+
+# Benchmarks run inside a child process, started in the benchmark folder
+
+def child_save(options):
+    """save_mood_log() throughput, including the time to flush the journal on close"""
+    import mood_storage
+    mood_log = mood_storage.open_mood_log("mood_log.txt", fsync_policy=options["fsync"])
+    rng = random.Random(options["seed"])
+    records = [(rng.choices(moods, mood_weights)[0], make_note(rng)) for _ in range(options["count"])]
+    # save_mood_log() prints every entry - keep that out of the measurement
+    sys.stdout = open(os.devnull, "w")
+    start = time.perf_counter()
+    for mood, note in records:
+        mood_storage.save_mood_log(mood, note)
+    queued = time.perf_counter() - start
+    mood_log.close()
+    seconds = time.perf_counter() - start
+    sys.stdout = sys.__stdout__
+    return {"entries": options["count"], "seconds": seconds, "enqueue_seconds": queued,
+            "entries_per_second": options["count"] / seconds}
+
+def child_history(options):
+    """load_mood_history() latency and peak memory"""
+    import mood_storage
+    start = time.perf_counter()
+    mood_storage.open_mood_log("mood_log.txt")
+    result = {"open_seconds": time.perf_counter() - start}
+    result.update(measure(mood_storage.load_mood_history))
+    return result
+
+def child_stats(options):
+    """calculate_mood_stats() latency and peak memory"""
+    import mood_storage
+    start = time.perf_counter()
+    mood_storage.open_mood_log("mood_log.txt")
+    result = {"open_seconds": time.perf_counter() - start}
+    result.update(measure(mood_storage.calculate_mood_stats))
+    return result
+
+def open_app():
+    """Import the app and build the main view without entering the event loop"""
+    import tkinter
+    import simple_code as app
+    try:
+        app.create_window()
+    except tkinter.TclError as e:
+        return None, f"no display ({e})"
+    app.root.withdraw()
+    app.load_background()
+    app.load_main_view()
+    app.open_log()
+    app.root.update()
+    return app, None
+
+def child_history_paint(options):
+    """Time from clicking History until the first page is drawn"""
+    sys.stdout = open(os.devnull, "w")
+    app, skipped = open_app()
+    if skipped:
+        return {"skipped": skipped}
+    start = time.perf_counter()
+    app.open_history()
+    app.root.update()
+    seconds = time.perf_counter() - start
+    app.on_close()
+    return {"seconds": seconds}
+
+# Minimal canvas for timing the leaf animation without a display
+class StubCanvas:
+    def __init__(self):
+        self.next_id = 0
+
+    def create_image(self, *args, **kwargs):
+        self.next_id += 1
+        return self.next_id
+
+    def coords(self, *args):
+        pass
+
+    def itemconfigure(self, *args, **kwargs):
+        pass
+
+    def tag_raise(self, *args):
+        pass
+
+def child_leaves(options):
+    """Time per animation frame with the leaf pool full"""
+    sys.stdout = open(os.devnull, "w")
+    app, skipped = open_app()
+    if app:
+        backend = "tk"
+        canvas, photo = app.canvas, app.canvas.bg
+        redraw = app.root.update_idletasks
+    else:
+        import simple_code as app
+        backend = "stub"
+        canvas, photo = StubCanvas(), None
+        redraw = lambda: None
+    random.seed(options["seed"])
+    leaves = app.LeafParticles(canvas, photo, spawn_chance=1.0)
+    # Let the pool fill up before timing
+    for _ in range(200):
+        leaves.update(0.05)
+    frame_times = []
+    for _ in range(options["frames"]):
+        start = time.perf_counter()
+        leaves.update(0.05)
+        redraw()
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    return {"backend": backend, "frames": len(frame_times),
+            "mean_ms": sum(frame_times) / len(frame_times) * 1000,
+            "p50_ms": frame_times[len(frame_times) // 2] * 1000,
+            "p99_ms": frame_times[int(len(frame_times) * 0.99)] * 1000}
+
+def child_startup(options):
+    """Run the real startup and quit as soon as every deferred phase has finished"""
+    import tkinter
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError as e:
+        return {"skipped": f"no display ({e})"}
+    sys.stdout = open(os.devnull, "w")
+    import simple_code as app
+
+    report = app.startup_timeline.report
+    def report_and_quit():
+        report()
+        app.on_close()
+    app.startup_timeline.report = report_and_quit
+    app.main()
+    phases = {name: {"start_ms": start, "duration_ms": duration} for name, start, duration in app.startup_timeline.phases}
+    return {"first_paint_ms": phases.get("first paint", {}).get("start_ms"),
+            "complete_ms": phases.get("startup complete", {}).get("start_ms"), "phases": phases}
+
+child_benchmarks = {
+    "save_mood_log": child_save,
+    "load_mood_history": child_history,
+    "calculate_mood_stats": child_stats,
+    "history_first_paint": child_history_paint,
+    "leaf_frame": child_leaves,
+    "startup": child_startup,
+}
+
+def run_child(name, folder, options):
+    """Run one benchmark in a new interpreter and return its result with the peak RSS"""
+    result_path = os.path.join(folder, "result.json")
+    if os.path.exists(result_path):
+        os.remove(result_path)
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, "--child-options", json.dumps(options),
+               "--child-result", result_path]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_folder, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=folder, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True)
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0 or not os.path.exists(result_path):
+        return {"error": completed.stderr.strip().splitlines()[-1:] or f"exit code {completed.returncode}"}
+    with open(result_path, "r", encoding="utf-8") as file:
+        result = json.load(file)
+    result["process_seconds"] = wall_seconds
+    return result
+
+def child_main(name, options, result_path):
+    result = child_benchmarks[name](options)
+    result["peak_rss_kb"] = peak_rss_kb()
+    with open(result_path, "w", encoding="utf-8") as file:
+        json.dump(result, file)
+
+# Function to run the whole suite
+def run_suite(args):
+    groups = set(args.only.split(","))
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    results = []
+
+    def record(benchmark, size, state, result):
+        results.append(dict(benchmark=benchmark, size=size, state=state, **result))
+        summary = result.get("skipped") or result.get("error") or ", ".join(
+            f"{key}={value:.4g}" for key, value in result.items() if isinstance(value, float))
+        print(f"{benchmark:22} {size if size is not None else '':>9} {state:5} {summary}", file=sys.stderr)
+
+    if "storage" in groups:
+        folder = os.path.join(args.data, "save")
+        for fsync_policy in ("interval", "always"):
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder)
+            record("save_mood_log", args.save_count, fsync_policy,
+                   run_child("save_mood_log", folder, {"count": args.save_count, "fsync": fsync_policy,
+                                                       "seed": args.seed}))
+        for size in sizes:
+            folder = prepare_data(args.data, size, args.seed)
+            for benchmark in ("load_mood_history", "calculate_mood_stats"):
+                # Cold: no stats snapshot or search index yet; warm: the second run reuses them
+                clear_caches(folder)
+                for state in ("cold", "warm"):
+                    record(benchmark, size, state, run_child(benchmark, folder, {"seed": args.seed}))
+
+    if "ui" in groups:
+        for size in sizes:
+            folder = prepare_data(args.data, size, args.seed)
+            link_images(folder)
+            record("history_first_paint", size, "warm",
+                   run_child("history_first_paint", folder, {"seed": args.seed}))
+        folder = prepare_data(args.data, sizes[0], args.seed)
+        record("leaf_frame", None, "warm", run_child("leaf_frame", folder, {"seed": args.seed, "frames": args.frames}))
+
+    if "startup" in groups:
+        for size in sizes:
+            folder = prepare_data(args.data, size, args.seed)
+            link_images(folder)
+            clear_caches(folder)
+            for state in ("cold", "warm"):
+                record("startup", size, state, run_child("startup", folder, {"seed": args.seed}))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_folder, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+# Function to compare two result files
+def compare(old, new):
+    """Print how each number changed between two runs (ratio new/old)"""
+    def key(result):
+        return (result["benchmark"], result["size"], result["state"])
+    old_results = {key(result): result for result in old["results"]}
+    print(f"Compared with {old['meta'].get('commit')} ({old['meta'].get('date')}):")
+    for result in new["results"]:
+        previous = old_results.get(key(result))
+        if not previous or "skipped" in result or "skipped" in previous:
+            continue
+        for metric in ("seconds", "entries_per_second", "mean_ms", "p99_ms", "first_paint_ms", "complete_ms",
+                       "process_seconds", "peak_growth_kb", "peak_rss_kb"):
+            if result.get(metric) and previous.get(metric):
+                ratio = result[metric] / previous[metric]
+                print(f"  {result['benchmark']:22} {result['size'] or '':>9} {result['state']:5} "
+                      f"{metric:18} {previous[metric]:12.4g} -> {result[metric]:12.4g}  x{ratio:.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mood tracker.")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="log sizes to test, e.g. 1k,100k,10M")
+    parser.add_argument("--only", default="storage,ui,startup", help="benchmark groups to run")
+    parser.add_argument("--data", default=os.path.join(repo_folder, ".bench_data"),
+                        help="folder for generated logs (kept between runs)")
+    parser.add_argument("--save-count", type=int, default=10000, help="entries written by the save benchmark")
+    parser.add_argument("--frames", type=int, default=1000, help="frames timed by the leaf benchmark")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-o", "--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-options", help=argparse.SUPPRESS)
+    parser.add_argument("--child-result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child_main(args.child, json.loads(args.child_options), args.child_result)
+        return 0
+
+    args.data = os.path.abspath(args.data)
+    data = {"meta": {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "sizes": args.sizes, "seed": args.seed},
+            "results": run_suite(args)}
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+    print(f"Results saved to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            compare(json.load(file), data)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
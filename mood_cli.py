@@ -0,0 +1,193 @@
+"""Command line tool for the mood log - no window, images or music are loaded.
+
+Examples:
+    python mood_cli.py log Joy "pancakes for breakfast"
+    python mood_cli.py import old_tracker.csv
+    python mood_cli.py export --format csv > moods.csv
+    python mood_cli.py stats
+    python mood_cli.py sync shared_moods
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+
+from mood_storage import open_mood_log, save_mood_log, iter_mood_entries, iter_mood_entries_reversed
+from mood_sync import MoodSync, peer_from_address
+
+def parse_timestamp(record):
+    """Read the entry time from a "timestamp" field or from "date" and "time" fields"""
+    if record.get("timestamp"):
+        timestamp = datetime.fromisoformat(record["timestamp"])
+        if timestamp.tzinfo:
+            # The log keeps local times without an offset, like the app and the mood server write them
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return timestamp
+    if record.get("date"):
+        return datetime.strptime(f"{record['date']} {record.get('time') or '00:00:00'}", "%Y-%m-%d %H:%M:%S")
+    return None
+
+def iter_import_records(file, file_format):
+    """Yield (line number, record dict, error) one at a time from a CSV or JSON-lines file.
+
+    A line that can't be read comes out with record None and the error, and
+    reading carries on with the next one (an exception would end the generator).
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                yield reader.line_num, None, e
+                continue
+            yield reader.line_num, record, None
+    else:
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, e
+                continue
+            yield line_no, record, None
+
+def guess_format(path, default="jsonl"):
+    if path.lower().endswith(".csv"):
+        return "csv"
+    if path.lower().endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    return default
+
+def command_log(mood_log, args):
+    save_mood_log(args.mood, args.note)
+    return 0
+
+def command_import(mood_log, args):
+    imported = 0
+    skipped = 0
+    for path in args.files:
+        file_format = args.format or guess_format(path)
+        file = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+        try:
+            for line_no, record, error in iter_import_records(file, file_format):
+                if error is not None:
+                    # A broken line - report it and carry on with the next one
+                    skipped += 1
+                    print(f"{path}:{line_no}: skipped unreadable line: {error}", file=sys.stderr)
+                    continue
+                try:
+                    mood = (record.get("mood") or "").strip()
+                    if not mood:
+                        raise ValueError("missing mood")
+                    note = (record.get("note") or "").replace("\r\n", "\n")
+                    mood_log.save(mood, note, parse_timestamp(record), checkpoint=False)
+                    imported += 1
+                except (ValueError, AttributeError) as e:
+                    skipped += 1
+                    print(f"{path}:{line_no}: skipped entry: {e}", file=sys.stderr)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+    
+    # One statistics snapshot for the whole import instead of one per entry
+    mood_log.checkpoint()
+    print(f"Imported {imported} entries ({skipped} skipped)", file=sys.stderr)
+    return 0
+
+def command_export(mood_log, args):
+    mood_log.flush()
+    entries = iter_mood_entries_reversed(mood_log.path) if args.newest_first else iter_mood_entries(mood_log.path)
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(["timestamp", "mood", "note"])
+            for entry in entries:
+                writer.writerow([entry.timestamp.isoformat(), entry.mood, entry.note])
+        else:
+            for entry in entries:
+                record = {"timestamp": entry.timestamp.isoformat(), "mood": entry.mood, "note": entry.note}
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+def command_stats(mood_log, args):
+    if not args.json:
+        print(mood_log.stats_text())
+        return 0
+    mood_stats = mood_log.current_stats()
+    data = mood_stats.snapshot_data()
+    del data["offset"], data["daily_counts"], data["tombstones"]
+    data["today_count"] = mood_stats.today_count()
+    data["last_7_days"] = mood_stats.recent_count()
+    print(json.dumps(data, indent=2))
+    return 0
+
+def command_sync(mood_log, args):
+    def save_entries(entries):
+        for entry in entries:
+            mood_log.save(entry.mood, entry.note, entry.timestamp, checkpoint=False)
+        mood_log.checkpoint()
+        # The next round reads the log, so the entries must be in it
+        mood_log.journal.flush()
+    
+    mood_log.journal.flush()
+    sent, added, fetched = MoodSync(mood_log.path, peer_from_address(args.peer), args.batch_size).sync(save_entries)
+    print(f"Sent {sent} entries ({added} new to the replica), received {fetched}", file=sys.stderr)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Log, import, export and summarise moods without opening the app.")
+    parser.add_argument("--log", default="mood_log.txt", help="mood log file (default: mood_log.txt)")
+    parser.add_argument("--fsync", choices=["always", "interval", "never"], default="interval",
+                        help="how often written entries are synced to disk (default: interval)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    log_parser = commands.add_parser("log", help="append one entry")
+    log_parser.add_argument("mood")
+    log_parser.add_argument("note", nargs="?", default="")
+    log_parser.set_defaults(handler=command_log)
+
+    import_parser = commands.add_parser("import", help="append entries from CSV or JSON-lines files")
+    import_parser.add_argument("files", nargs="+", help='files to import, or "-" for standard input')
+    import_parser.add_argument("--format", choices=["csv", "jsonl"],
+                               help="input format (default: from the file extension, JSON lines otherwise)")
+    import_parser.set_defaults(handler=command_import)
+
+    export_parser = commands.add_parser("export", help="write every entry as CSV or JSON lines")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    export_parser.add_argument("--output", "-o", help="output file (default: standard output)")
+    export_parser.add_argument("--newest-first", action="store_true")
+    export_parser.set_defaults(handler=command_export)
+
+    stats_parser = commands.add_parser("stats", help="print the statistics page")
+    stats_parser.add_argument("--json", action="store_true", help="print machine-readable totals")
+    stats_parser.set_defaults(handler=command_stats)
+
+    sync_parser = commands.add_parser("sync", help="exchange new entries with a replica folder or socket")
+    sync_parser.add_argument("peer", help='replica folder, Unix socket or "host:port" (see mood_sync.py)')
+    sync_parser.add_argument("--batch-size", type=int, default=500, help="entries sent or received per round")
+    sync_parser.set_defaults(handler=command_sync)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    mood_log = open_mood_log(args.log, fsync_policy=args.fsync)
+    try:
+        return args.handler(mood_log, args)
+    except BrokenPipeError:
+        # Output piped into something like head that stopped reading
+        sys.stderr.close()
+        return 1
+    finally:
+        mood_log.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
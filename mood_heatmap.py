@@ -0,0 +1,186 @@
+"""Year in pixels: one square per day, coloured by the mood logged most that day.
+
+Each month is drawn as its own tile - a strip of 31 day cells - with PIL on a
+background thread, and kept together with the key it was drawn for (from
+month_versions(): the segments that can hold the month, how much of them was
+read and its dead entries). Any save, edit or delete in a month changes its
+key, so after logging a mood only the current month is read and drawn again;
+the other eleven tiles are pasted as they are. The Tk thread only passes the
+year and the log_version() after a flush, and turns the finished image into a
+PhotoImage.
+"""
+import os
+import sys
+import threading
+import queue
+from calendar import monthrange
+
+from PIL import Image, ImageDraw, ImageFont, ImageStat
+
+from mood_storage import date_filter_bounds, iter_mood_entries_between, month_versions, mood_order
+
+# Colours of the moods the app ships portraits for; any other mood gets the average colour of its portrait
+mood_colours = {
+    "joy": (247, 197, 72),
+    "neutral": (185, 162, 122),
+    "sadness": (79, 124, 172),
+    "anger": (192, 57, 43),
+    "annoyed": (230, 126, 34),
+    "anxiety": (142, 111, 191),
+    "fear": (61, 59, 110),
+}
+background_colour = (255, 196, 120)  # Same as the text boxes
+empty_colour = (255, 224, 168)  # A day without entries
+text_colour = (136, 86, 61)
+cell_width, cell_height, gap = 14, 9, 1
+label_width = 30  # Month names on the left
+legend_height = 20
+month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def dominant_moods(entries):
+    """{day of month: mood} from MoodEntry tuples in log order - ties go to the mood logged last that day"""
+    counts = {}  # day -> {mood: (entries, position of the last one)}
+    for position, entry in enumerate(entries):
+        day_counts = counts.setdefault(entry.timestamp.day, {})
+        day_counts[entry.mood] = (day_counts.get(entry.mood, (0, 0))[0] + 1, position)
+    return {day: max(day_counts, key=day_counts.get) for day, day_counts in counts.items()}
+
+# Draws and caches the month tiles and year images on its own thread
+class YearInPixels:
+    def __init__(self, image_folder="images"):
+        self.image_folder = image_folder
+        self.tiles = {}  # (year, month) -> (key, (entry count, last offset), tile image, moods in it)
+        self.colours = {}  # mood -> RGB, worked out the first time each mood is drawn
+        self.portraits = {}  # mood -> small portrait for the legend (None if there is no image)
+        self.font = None
+        self.lock = threading.Lock()
+        self.images = {}  # year -> finished image
+        self.version = 0  # Goes up every time an image is finished
+        self.requested = 0  # Requests made so far
+        self.handled = 0  # Requests covered by a finished (or failed) drawing
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="mood-heatmap", daemon=True)
+        self.thread.start()
+
+    def request(self, year, log_path, version):
+        """Queue drawing a year of a log; version is its log_version() after MoodLog.flush()"""
+        with self.lock:
+            self.requested += 1
+            self.requests.put((self.requested, year, log_path, version))
+
+    def busy(self):
+        """True until the newest request has been drawn"""
+        with self.lock:
+            return self.handled < self.requested
+
+    def image(self, year):
+        """The last finished image of a year, or None"""
+        with self.lock:
+            return self.images.get(year)
+
+    def run(self):
+        while True:
+            number, year, log_path, version = self.requests.get()
+            # Only the newest request matters - saves can queue several while one is drawn
+            try:
+                while True:
+                    number, year, log_path, version = self.requests.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                image = self.draw_year(year, log_path, version)
+            except Exception as e:
+                print(f"Error drawing the year in pixels: {e}", file=sys.stderr)
+                image = None
+            with self.lock:
+                if image is not None:
+                    self.images[year] = image
+                    self.version += 1
+                self.handled = number
+
+    def portrait_path(self, mood):
+        for extension in (".png", ".jpg", ".jpeg"):
+            path = os.path.join(self.image_folder, mood.lower() + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def colour(self, mood):
+        colour = self.colours.get(mood)
+        if colour is None:
+            colour = mood_colours.get(mood.lower())
+            path = self.portrait_path(mood)
+            if colour is None and path:
+                try:
+                    # The average of the opaque pixels
+                    image = Image.open(path).convert("RGBA")
+                    opaque = image.getchannel("A").point(lambda alpha: 255 if alpha > 128 else 0)
+                    colour = tuple(int(value) for value in ImageStat.Stat(image.convert("RGB"), mask=opaque).mean)
+                except Exception as e:
+                    print(f"Error reading the colour of {path}: {e}", file=sys.stderr)
+            self.colours[mood] = colour = colour or (160, 160, 160)
+        return colour
+
+    def portrait(self, mood):
+        if mood not in self.portraits:
+            path = self.portrait_path(mood)
+            try:
+                self.portraits[mood] = Image.open(path).convert("RGBA").resize((14, 14), Image.Resampling.LANCZOS) if path else None
+            except Exception as e:
+                print(f"Error loading {path}: {e}", file=sys.stderr)
+                self.portraits[mood] = None
+        return self.portraits[mood]
+
+    def draw_month(self, year, month, entries):
+        """One month as a strip of day cells"""
+        tile = Image.new("RGB", (31 * (cell_width + gap), cell_height + gap), background_colour)
+        draw = ImageDraw.Draw(tile)
+        moods = dominant_moods(entries)
+        for day in range(1, monthrange(year, month)[1] + 1):
+            left = (day - 1) * (cell_width + gap)
+            colour = self.colour(moods[day]) if day in moods else empty_colour
+            draw.rectangle((left, 0, left + cell_width - 1, cell_height - 1), fill=colour)
+        return tile
+
+    def draw_year(self, year, log_path, version):
+        """Paste the month tiles (reading and drawing only the ones whose key changed) and a legend into one image"""
+        if self.font is None:
+            self.font = ImageFont.load_default()
+        width = label_width + 31 * (cell_width + gap)
+        image = Image.new("RGB", (width, 12 * (cell_height + gap) + legend_height), background_colour)
+        draw = ImageDraw.Draw(image)
+        seen = set()
+        _, tombstone_count, end_offset = version
+        for month, key in enumerate(month_versions(log_path, year, end_offset, tombstone_count), 1):
+            key = (log_path, key)
+            cached = self.tiles.get((year, month))
+            if cached is None or cached[0] != key:
+                start, end = date_filter_bounds(year, month)
+                entries = list(iter_mood_entries_between(log_path, start, end, end_offset=end_offset))
+                # A segment holding an entry logged for an earlier date is shared with that month - its key
+                # then changes with every save, but the tile only needs drawing when the entries did
+                content = (len(entries), entries[-1].offset if entries else None)
+                if cached is not None and cached[1] == content:
+                    cached = (key,) + cached[1:]
+                else:
+                    cached = (key, content, self.draw_month(year, month, entries), {entry.mood for entry in entries})
+                self.tiles[(year, month)] = cached
+            top = (month - 1) * (cell_height + gap)
+            draw.text((2, top - 1), month_names[month - 1], fill=text_colour, font=self.font)
+            image.paste(cached[2], (label_width, top))
+            seen.update(cached[3])
+
+        # The app's moods in their usual order, then any other mood logged this year
+        legend = [mood.capitalize() for mood in mood_order]
+        legend += sorted(mood for mood in seen if mood.lower() not in mood_order)
+        left, top = 2, 12 * (cell_height + gap) + 3
+        for mood in legend:
+            portrait = self.portrait(mood)
+            draw.rectangle((left, top + 3, left + 7, top + 10), fill=self.colour(mood))
+            left += 10
+            if portrait is not None:
+                image.paste(portrait, (left, top), portrait)
+                left += 16
+            draw.text((left, top + 2), mood, fill=text_colour, font=self.font)
+            left += int(draw.textlength(mood, font=self.font)) + 8
+        return image
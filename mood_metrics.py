@@ -0,0 +1,205 @@
+"""Opt-in timing of the Tk handlers, for tracking down UI freezes.
+
+Set MOOD_TRACKER_METRICS to a file name to turn it on:
+
+    MOOD_TRACKER_METRICS=mood_metrics.jsonl python simple_code.py
+
+Every wrapped handler feeds a latency histogram. The histograms, frame and
+late-frame counts go to the file as a JSON line every summary interval
+(the file rotates at 1 MB, keeping 3 old copies). A handler slower than
+MOOD_TRACKER_STALL_MS (default 250) is written straight away as a stall.
+With MOOD_TRACKER_PROFILE_STALLS=1 the Tk thread's stack is sampled while
+handlers run, and each stall also saves the sampled stacks in collapsed
+format (one "frame;frame;frame count" line per stack, as flamegraph.pl reads).
+"""
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import logging
+from logging.handlers import RotatingFileHandler
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+
+# Upper bounds of the histogram buckets in milliseconds; one more bucket holds anything slower
+latency_buckets_ms = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(latency_buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(latency_buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return latency_buckets_ms[bucket] if bucket < len(latency_buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in latency_buckets_ms] + [f">{latency_buckets_ms[-1]}"]
+        return {"count": self.count, "mean_ms": round(self.total_ms / self.count, 3),
+                "max_ms": round(self.max_ms, 3), "p50_ms": self.percentile(0.5), "p99_ms": self.percentile(0.99),
+                "buckets": {label: count for label, count in zip(labels, self.counts) if count}}
+
+# Samples the stack of one thread while a handler runs on it
+class StackSampler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()  # "file:function:line;..." outermost first -> times seen
+        self.lock = threading.Lock()
+        self.active = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def begin(self):
+        with self.lock:
+            self.samples.clear()
+        self.active.set()
+
+    def end(self):
+        self.active.clear()
+        with self.lock:
+            return Counter(self.samples)
+
+    def close(self):
+        self.closed = True
+        self.active.set()
+
+    def run(self):
+        while not self.closed:
+            self.active.wait()
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self.active.is_set():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                del frame
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+class HotPathMetrics:
+    def __init__(self, path, stall_threshold=0.25, summary_interval=30, max_bytes=1000000, backup_count=3,
+                 profile_stalls=False):
+        self.path = path
+        self.stall_threshold = stall_threshold  # Seconds a handler may take before it counts as a stall
+        self.summary_interval = summary_interval  # Seconds between summary lines
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger = logging.getLogger(f"mood_tracker.metrics.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        # Stacks are sampled on the thread that creates the metrics - the Tk thread
+        self.sampler = StackSampler(threading.get_ident()) if profile_stalls else None
+        self.depth = 0  # Handlers currently running, so nested calls don't restart the sampler
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}  # handler name -> LatencyHistogram
+        self.frames = 0
+        self.late_frames = 0
+        self.stalls = 0
+        self.window_start = time.perf_counter()
+
+    def wrap(self, name, function):
+        """Return function timed under the given handler name"""
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            outermost = self.depth == 0
+            if outermost and self.sampler:
+                self.sampler.begin()
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self.depth -= 1
+                samples = self.sampler.end() if outermost and self.sampler else None
+                self.record(name, seconds, samples)
+        return instrumented
+
+    def record(self, name, seconds, samples=None):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(seconds * 1000)
+        if seconds >= self.stall_threshold:
+            self.stalls += 1
+            event = {"event": "stall", "time": datetime.now().isoformat(timespec="milliseconds"),
+                     "handler": name, "ms": round(seconds * 1000, 1)}
+            if samples:
+                event["profile"] = self.dump_profile(name, samples)
+            self.write(event)
+        if time.perf_counter() - self.window_start >= self.summary_interval:
+            self.summarize()
+
+    def record_frame(self, lateness, interval):
+        """Count an animation frame, late if it started more than one frame after it was due"""
+        self.frames += 1
+        if lateness > interval:
+            self.late_frames += 1
+
+    def summarize(self):
+        """Write the histograms and frame counts gathered since the last summary"""
+        if self.histograms or self.frames:
+            self.write({"event": "summary", "time": datetime.now().isoformat(timespec="milliseconds"),
+                        "window_s": round(time.perf_counter() - self.window_start, 3),
+                        "frames": self.frames, "late_frames": self.late_frames, "stalls": self.stalls,
+                        "handlers": {name: histogram.as_dict() for name, histogram in self.histograms.items()}})
+        self.reset()
+
+    def dump_profile(self, name, samples):
+        """Save sampled stacks next to the metrics file and return the file name"""
+        profile_path = os.path.join(os.path.dirname(os.path.abspath(self.path)),
+                                    f"stall_{datetime.now():%Y%m%d_%H%M%S_%f}_{name}.txt")
+        try:
+            with open(profile_path, "w", encoding="utf-8") as file:
+                for stack, count in samples.most_common():
+                    file.write(f"{stack} {count}\n")
+        except Exception as e:
+            print(f"Error saving stall profile: {e}", file=sys.stderr)
+            return None
+        return profile_path
+
+    def write(self, event):
+        self.logger.info(json.dumps(event))
+
+    def close(self):
+        self.summarize()
+        if self.sampler:
+            self.sampler.close()
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+def metrics_from_environment():
+    """HotPathMetrics configured from the MOOD_TRACKER_* variables, or None when turned off"""
+    path = os.environ.get("MOOD_TRACKER_METRICS")
+    if not path:
+        return None
+    try:
+        stall_ms = float(os.environ.get("MOOD_TRACKER_STALL_MS", 250))
+        profile_stalls = os.environ.get("MOOD_TRACKER_PROFILE_STALLS", "") not in ("", "0")
+        return HotPathMetrics(path, stall_threshold=stall_ms / 1000, profile_stalls=profile_stalls)
+    except Exception as e:
+        print(f"Error starting metrics: {e}", file=sys.stderr)
+        return None
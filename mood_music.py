@@ -0,0 +1,270 @@
+"""Background music for the mood tracker.
+
+Every pygame call happens on one worker thread, so loading and decoding
+tracks never blocks the Tk event loop. The music folder is indexed into
+.music_library.json (duration and tags for each file) and a file is only
+looked at again when its modification time changes.
+"""
+import os
+import sys
+import json
+import random
+import threading
+import queue
+import time
+import wave
+
+# Optional - reads tags and durations of mp3/ogg files without decoding them
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+music_extensions = (".mp3", ".wav", ".ogg")
+
+# Persisted index of the music folder, refreshed by modification time
+class MusicLibrary:
+    def __init__(self, folder="music", index_path=".music_library.json"):
+        self.folder = folder
+        self.index_path = index_path
+        self.folder_mtime = None  # Listing is reused while the folder itself hasn't changed
+        self.tracks = {}  # path -> {"mtime", "size", "duration", "title", "artist", "album"}
+
+    def load(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                if data.get("folder") == os.path.abspath(self.folder):
+                    self.folder_mtime = data.get("folder_mtime")
+                    self.tracks = data.get("tracks", {})
+        except Exception as e:
+            print(f"Error loading music library: {e}", file=sys.stderr)
+
+    def save(self):
+        data = {"folder": os.path.abspath(self.folder), "folder_mtime": self.folder_mtime, "tracks": self.tracks}
+        try:
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file, indent=1)
+            os.replace(temp_path, self.index_path)
+        except Exception as e:
+            print(f"Error saving music library: {e}", file=sys.stderr)
+
+    def scan(self):
+        """Bring the index up to date and return the track paths"""
+        self.load()
+        changed = False
+        folder_mtime = os.stat(self.folder).st_mtime_ns
+        if folder_mtime != self.folder_mtime:
+            # Files were added or removed - list the folder once
+            paths = sorted(os.path.join(self.folder, entry.name) for entry in os.scandir(self.folder)
+                           if entry.is_file() and entry.name.lower().endswith(music_extensions))
+            for path in set(self.tracks) - set(paths):
+                del self.tracks[path]
+            for path in paths:
+                self.tracks.setdefault(path, {})
+            self.folder_mtime = folder_mtime
+            changed = True
+
+        for path in list(self.tracks):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.tracks[path]
+                changed = True
+                continue
+            info = self.tracks[path]
+            if info.get("mtime") != stat.st_mtime_ns or info.get("size") != stat.st_size:
+                self.tracks[path] = self.describe(path, stat)
+                changed = True
+
+        if changed:
+            self.save()
+        return sorted(self.tracks)
+
+    def describe(self, path, stat):
+        """Read the duration (seconds, None if unknown) and tags of one file"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        # "Artist - Title" file names are common; use them when there are no tags
+        artist, _, title = name.rpartition(" - ")
+        info = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "duration": None,
+                "title": title or name, "artist": artist or None, "album": None}
+        try:
+            if mutagen:
+                audio = mutagen.File(path, easy=True)
+                if audio is not None:
+                    info["duration"] = audio.info.length
+                    for tag in ("title", "artist", "album"):
+                        if audio.get(tag):
+                            info[tag] = audio[tag][0]
+            elif path.lower().endswith(".wav"):
+                with wave.open(path, "rb") as audio:
+                    info["duration"] = audio.getnframes() / audio.getframerate()
+        except Exception as e:
+            print(f"Error reading {path}: {e}", file=sys.stderr)
+        return info
+
+# Plays the library as a shuffled playlist on a dedicated thread
+class MusicPlayer:
+    def __init__(self, folder="music", library=None, poll_interval=0.5):
+        self.folder = folder
+        self.library = library or MusicLibrary(folder)
+        self.poll_interval = poll_interval  # Seconds between checks for the end of a track
+        self.commands = queue.Queue()
+        # What the user asked for - updated right away so the UI never waits on the worker
+        self.playing = False
+        self.paused = False
+        self.playlist = []
+        self.position = 0
+        self.track_started = None  # monotonic time the current track started, minus time spent paused
+        self.paused_at = None
+        self.preloaded = False  # The next track is queued in the mixer
+        self.pygame = None
+        self.thread = threading.Thread(target=self.run, name="music", daemon=True)
+
+    def start(self, autoplay=True):
+        if autoplay:
+            self.play()
+        self.thread.start()
+
+    def play(self):
+        self.playing, self.paused = True, False
+        self.commands.put("play")
+
+    def pause(self):
+        if self.playing:
+            self.playing, self.paused = False, True
+            self.commands.put("pause")
+
+    def toggle(self):
+        if self.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def next_track(self):
+        self.playing, self.paused = True, False
+        self.commands.put("next")
+
+    def stop(self):
+        self.playing, self.paused = False, False
+        self.commands.put("stop")
+
+    def close(self):
+        if self.thread.is_alive():
+            self.commands.put("quit")
+            self.thread.join(timeout=2)
+
+    def setup(self):
+        """Import pygame, start the mixer and index the music folder (worker thread)"""
+        try:
+            import pygame
+        except ImportError:
+            print("pygame not found. Music functionality disabled. Install with: pip install pygame")
+            return False
+        try:
+            pygame.mixer.init()
+            print("Music system initialized successfully")
+        except Exception as e:
+            print(f"Error initializing music system: {e}")
+            return False
+        self.pygame = pygame
+
+        # Create music folder if it doesn't exist
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+            print("Created 'music' folder. Add .mp3, .wav, or .ogg files there for background music!")
+            return False
+
+        self.playlist = self.library.scan()
+        random.shuffle(self.playlist)
+        if self.playlist:
+            print(f"Found {len(self.playlist)} music file(s):")
+            for music_file in self.playlist:
+                print(f"  - {os.path.basename(music_file)}")
+        else:
+            print("No music files found. Add .mp3, .wav, or .ogg files to the 'music' folder!")
+        return bool(self.playlist)
+
+    def run(self):
+        if not self.setup():
+            return
+        while True:
+            try:
+                command = self.commands.get(timeout=self.poll_interval)
+            except queue.Empty:
+                command = None
+            try:
+                if command == "quit":
+                    self.pygame.mixer.music.stop()
+                    self.pygame.mixer.quit()
+                    return
+                if command:
+                    self.handle(command)
+                else:
+                    self.follow_playlist()
+            except Exception as e:
+                print(f"Error playing music: {e}")
+
+    def handle(self, command):
+        music = self.pygame.mixer.music
+        if command == "play":
+            if self.paused_at is not None:
+                # Resume paused music
+                music.unpause()
+                self.track_started += time.monotonic() - self.paused_at
+                self.paused_at = None
+                print("Music resumed")
+            elif self.track_started is None:
+                self.start_track(self.position)
+        elif command == "pause" and self.track_started is not None and self.paused_at is None:
+            music.pause()
+            self.paused_at = time.monotonic()
+            print("Music paused")
+        elif command == "next":
+            self.paused_at = None
+            self.start_track(self.position + 1)
+        elif command == "stop":
+            music.stop()
+            self.track_started = None
+            self.paused_at = None
+            print("Music stopped")
+
+    def start_track(self, position):
+        music = self.pygame.mixer.music
+        self.position = position % len(self.playlist)
+        current_music_file = self.playlist[self.position]
+        music.load(current_music_file)
+        music.play()
+        self.track_started = time.monotonic()
+        self.preloaded = False
+        print(f"Playing: {os.path.basename(current_music_file)}")
+        self.preload_next()
+
+    def preload_next(self):
+        """Queue the following track in the mixer so it starts without a gap"""
+        # Only when we know how long the current track is, to tell when the queued one takes over
+        if self.duration(self.position) and len(self.playlist) > 1:
+            self.pygame.mixer.music.queue(self.playlist[(self.position + 1) % len(self.playlist)])
+            self.preloaded = True
+
+    def duration(self, position):
+        return self.library.tracks.get(self.playlist[position], {}).get("duration")
+
+    def follow_playlist(self):
+        """Move on when the current track has finished"""
+        if self.track_started is None or self.paused_at is not None:
+            return
+        if self.preloaded:
+            elapsed = time.monotonic() - self.track_started
+            duration = self.duration(self.position)
+            if elapsed >= duration:
+                # The mixer already switched to the queued track
+                self.track_started += duration
+                self.position = (self.position + 1) % len(self.playlist)
+                self.preloaded = False
+                print(f"Playing: {os.path.basename(self.playlist[self.position])}")
+                self.preload_next()
+        elif not self.pygame.mixer.music.get_busy():
+            self.start_track(self.position + 1)
@@ -0,0 +1,303 @@
+"""Note analytics for the statistics view: what the notes say for each mood.
+
+For every mood it counts the most used words and two-word phrases and the
+length of the notes in words, and over all notes it finds the words that
+most often turn up in the same note. Tokenizing is the expensive part, so
+each monthly segment of the log is counted in a worker process of a
+ProcessPoolExecutor and the partial counts are added up afterwards.
+
+The counts of each segment are saved in <log>.notes/, together with the
+segment size and how many of its entries were dead when it was counted.
+Older months never change, so a later run only counts the entries appended
+to the newest segment (and any month where an entry was since edited or
+deleted). Everything runs on a background thread - the Tk thread only asks
+for the text, and gets a placeholder until it is ready.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mood_storage import (iter_mood_entries, get_log_segments, dead_entries, log_generation, log_version,
+                          search_term_pattern)
+
+# Words too common to say anything about a mood
+stop_words = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can could did do
+does doing don down for from had has have having he her here hers him his how i if in into is it its just
+me more most my no not now of off on once only or other our out over own she so some than that the their
+them then there these they this those through to too up very was we were what when where which while who
+why will with would you your im ive dont didnt got get
+""".split())
+length_buckets = [(0, 0), (1, 5), (6, 10), (11, 20), (21, 50), (51, None)]  # Note lengths in words
+terms_per_note = 30  # Distinct words of a note paired up for co-occurrence
+shown_terms = 5  # Words and phrases listed per mood
+
+def note_terms(note):
+    """The words of a note that count, lowercase and in order"""
+    return [word for word in search_term_pattern.findall(note.lower()) if word not in stop_words and not word.isdigit()]
+
+def length_bucket(words):
+    for index, (low, high) in enumerate(length_buckets):
+        if words >= low and (high is None or words <= high):
+            return index
+    return len(length_buckets) - 1
+
+# Function run in the worker processes - everything it takes and returns must pickle
+def count_notes(path, start, end, dead):
+    """Count the notes of the entries from start to end of a segment file, skipping dead offsets.
+
+    Returns {mood: {"entries", "words", "phrases", "lengths"}} and a Counter
+    of word pairs seen in the same note ("a b" with a < b).
+    """
+    dead = set(dead)
+    moods = {}
+    pairs = Counter()
+    for entry in iter_mood_entries(path, start=start, end=end):
+        if entry.offset in dead:
+            continue
+        counts = moods.get(entry.mood)
+        if counts is None:
+            counts = moods[entry.mood] = {"entries": 0, "words": Counter(), "phrases": Counter(),
+                                          "lengths": [0] * len(length_buckets), "total_words": 0}
+        terms = note_terms(entry.note)
+        words = len(search_term_pattern.findall(entry.note))
+        counts["entries"] += 1
+        counts["words"].update(terms)
+        counts["phrases"].update(f"{first} {second}" for first, second in zip(terms, terms[1:]) if first != second)
+        counts["lengths"][length_bucket(words)] += 1
+        counts["total_words"] += words
+        distinct = sorted(set(terms[:terms_per_note]))
+        pairs.update(f"{first} {second}" for i, first in enumerate(distinct) for second in distinct[i + 1:])
+    return moods, pairs
+
+def merge_counts(total, part, sign=1):
+    """Add the counts of one segment (as count_notes() returns them) to a running total, or take them out with sign=-1"""
+    moods, pairs = part
+    for mood, counts in moods.items():
+        into = total[0].get(mood)
+        if into is None:
+            into = total[0][mood] = {"entries": 0, "words": Counter(), "phrases": Counter(),
+                                     "lengths": [0] * len(length_buckets), "total_words": 0}
+        into["entries"] += sign * counts["entries"]
+        if sign > 0:
+            into["words"].update(counts["words"])
+            into["phrases"].update(counts["phrases"])
+        else:
+            into["words"].subtract(counts["words"])
+            into["phrases"].subtract(counts["phrases"])
+        into["lengths"] = [a + sign * b for a, b in zip(into["lengths"], counts["lengths"])]
+        into["total_words"] += sign * counts["total_words"]
+    if sign > 0:
+        total[1].update(pairs)
+    else:
+        total[1].subtract(pairs)
+    return total
+
+def empty_counts():
+    return {}, Counter()
+
+# Per-segment counts of a log, brought up to date in a pool of worker processes
+class NoteAnalytics:
+    def __init__(self, log_path="mood_log.txt", max_workers=None):
+        self.log_path = log_path
+        self.cache_folder = os.path.splitext(log_path)[0] + ".notes"
+        self.max_workers = max_workers  # Default: one worker per core
+        self.executor = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.key = None  # log_version() the text below was computed for
+        self.text = None
+        # Counts of the whole log, only touched by the background thread
+        self.generation = None
+        self.total = None
+        self.counted = {}  # segment name -> (size, dead entries) included in total
+        self.version = 0  # Goes up every time a new text is ready
+
+    def request(self):
+        """Start bringing the text up to date in the background, unless it already is or is being done"""
+        key = log_version(self.log_path)
+        with self.lock:
+            if key == self.key or (self.thread is not None and self.thread.is_alive()):
+                return
+            self.thread = threading.Thread(target=self.run, args=(key,), name="mood-notes", daemon=True)
+            self.thread.start()
+
+    def pending(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self, key):
+        try:
+            text = notes_text(self.update(key[2]))
+        except Exception as e:
+            text = f"Error analysing notes: {e}\n"
+        with self.lock:
+            self.key, self.text = key, text
+            self.version += 1
+
+    def get_executor(self):
+        if self.executor is None:
+            # Never fork the app itself - its other threads (the journal, the record store) don't survive it
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self.executor
+
+    def segment_files(self, end_offset):
+        """(name, path, base offset, size) of each part of the log, up to end_offset"""
+        segments = get_log_segments(self.log_path)
+        if segments is None:
+            if not os.path.exists(self.log_path):
+                return []
+            return [(os.path.basename(self.log_path), self.log_path, 0, min(os.path.getsize(self.log_path), end_offset))]
+        with segments.lock:
+            listing = [dict(segment) for segment in segments.segments]
+        # The newest segment may be written to meanwhile - stop where the log ended when asked
+        return [(segment["name"], segments.segment_path(segment), segment["base"],
+                 min(os.path.getsize(segments.segment_path(segment)), end_offset - segment["base"]))
+                for segment in listing if segment["base"] < end_offset]
+
+    def update(self, end_offset):
+        """Count what changed since the last run and return the counts of the log up to end_offset"""
+        generation = log_generation(self.log_path)
+        if self.total is None or generation != self.generation:
+            # First run, or the log was compacted and every segment rewritten
+            self.generation, self.total, self.counted = generation, empty_counts(), {}
+        dead = dead_entries(self.log_path)
+        os.makedirs(self.cache_folder, exist_ok=True)
+        jobs = {}  # segment name -> (path, start, end, dead offsets in the segment)
+        for name, path, base, size in self.segment_files(end_offset):
+            segment_dead = sorted(offset - base for offset in dead if base <= offset < base + size)
+            state = self.counted.get(name)
+            if state is None:
+                cached = self.load_cache(name)
+                if cached and cached["generation"] == generation and cached["size"] <= size:
+                    merge_counts(self.total, cached["counts"])
+                    state = self.counted[name] = (cached["size"], cached["dead"])
+            if state == (size, len(segment_dead)):
+                continue
+            if state is not None and state[0] < size and state[1] == len(segment_dead):
+                # Only entries were appended - count just those
+                jobs[name] = (path, state[0], size, segment_dead)
+                continue
+            if state is not None:
+                # An entry in this month was edited or deleted - count it again from the start
+                cached = self.load_cache(name)
+                if cached:
+                    merge_counts(self.total, cached["counts"], sign=-1)
+                del self.counted[name]
+            jobs[name] = (path, 0, size, segment_dead)
+        if not jobs:
+            return self.total
+        try:
+            executor = self.get_executor()
+            futures = {executor.submit(count_notes, path, start, end, segment_dead): name
+                       for name, (path, start, end, segment_dead) in jobs.items()}
+            results = ((futures[future], future.result()) for future in as_completed(futures))
+        except Exception as e:
+            # No worker processes on this system (e.g. no semaphores) - count here instead
+            print(f"Counting notes without worker processes ({e})", file=sys.stderr)
+            results = ((name, count_notes(path, start, end, segment_dead))
+                       for name, (path, start, end, segment_dead) in jobs.items())
+        for name, part in results:
+            path, start, end, segment_dead = jobs[name]
+            merge_counts(self.total, part)
+            counts = part
+            if start:
+                cached = self.load_cache(name)
+                counts = merge_counts(cached["counts"], part) if cached else part
+            self.save_cache(name, {"generation": generation, "size": end, "dead": len(segment_dead), "counts": counts})
+            self.counted[name] = (end, len(segment_dead))
+        return self.total
+
+    def cache_path(self, name):
+        return os.path.join(self.cache_folder, os.path.splitext(name)[0] + ".json")
+
+    def load_cache(self, name):
+        try:
+            with open(self.cache_path(name), "r", encoding="utf-8") as file:
+                data = json.load(file)
+            moods, pairs = data["counts"]
+            for counts in moods.values():
+                counts["words"], counts["phrases"] = Counter(counts["words"]), Counter(counts["phrases"])
+            data["counts"] = (moods, Counter(pairs))
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading note counts for {name}: {e}", file=sys.stderr)
+            return None
+
+    def save_cache(self, name, data):
+        try:
+            temp_path = self.cache_path(name) + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(temp_path, self.cache_path(name))
+        except Exception as e:
+            print(f"Error saving note counts for {name}: {e}", file=sys.stderr)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+def notes_text(counts):
+    """The notes section of the statistics page"""
+    moods, pairs = counts
+    moods = {mood: mood_counts for mood, mood_counts in moods.items() if mood_counts["entries"]}
+    if not moods:
+        return ""
+    order = sorted(moods, key=lambda mood: moods[mood]["entries"], reverse=True)
+    text = "NOTE WORDS BY MOOD:\n"
+    for mood in order:
+        words = ", ".join(f"{word} {count}" for word, count in moods[mood]["words"].most_common(shown_terms))
+        text += f"{mood}: {words or '-'}\n"
+    text += "\nNOTE PHRASES BY MOOD:\n"
+    for mood in order:
+        phrases = ", ".join(f'"{phrase}" {count}' for phrase, count in moods[mood]["phrases"].most_common(3)
+                            if count > 1)
+        text += f"{mood}: {phrases or '-'}\n"
+    together = [(pair, count) for pair, count in pairs.most_common(shown_terms) if count > 1]
+    if together:
+        text += "\nWORDS THAT GO TOGETHER:\n"
+        for pair, count in together:
+            text += f"{pair.replace(' ', ' + ')}: {count} notes\n"
+    text += "\nNOTE LENGTH BY MOOD (words):\n"
+    labels = [str(low) if low == high else f"{low}+" if high is None else f"{low}-{high}" for low, high in length_buckets]
+    for mood in order:
+        mood_counts = moods[mood]
+        spread = ", ".join(f"{label}: {count}" for label, count in zip(labels, mood_counts["lengths"]) if count)
+        text += f"{mood}: avg {mood_counts['total_words'] / mood_counts['entries']:.1f} ({spread})\n"
+    return text
+
+# Analytics for each log, kept between visits to the stats view
+loaded_analytics = {}
+
+# Function to get the notes section without waiting for it
+def calculate_note_analytics(mood_log):
+    """The notes section of the statistics page as last computed (None while the first run is going).
+
+    Starts an update in the background if the log changed since; poll
+    note_analytics_version() to find out when a new text is ready.
+    """
+    analytics = loaded_analytics.get(mood_log.path)
+    if analytics is None:
+        analytics = loaded_analytics[mood_log.path] = NoteAnalytics(mood_log.path)
+    mood_log.flush()
+    analytics.request()
+    return analytics.text
+
+def note_analytics_version(mood_log):
+    """(version, still running) of the notes section of a log"""
+    analytics = loaded_analytics.get(mood_log.path)
+    if analytics is None:
+        return 0, False
+    return analytics.version, analytics.pending()
+
+def close_note_analytics():
+    for analytics in loaded_analytics.values():
+        analytics.close()
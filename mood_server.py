@@ -0,0 +1,530 @@
+"""Shared mood log service for a team, running on one host.
+
+    python mood_server.py serve --data team_moods --socket mood_tracker.sock
+    MOOD_TRACKER_SERVER=mood_tracker.sock python simple_code.py
+
+Every user gets their own log (team_moods/<user>/mood_log.txt) written by the
+same MoodLog as the app, so the records are exactly what save_mood_log()
+writes. Clients send one JSON object per line and get one JSON reply line
+back, in order:
+
+    {"op": "save", "user": "sam", "entries": [{"mood": "Joy", "note": "...", "timestamp": "2024-03-01T09:00:00"}]}
+    {"op": "history", "user": "sam", "query": "mood:joy", "skip": 0, "limit": 40}
+    {"op": "stats", "user": "sam", "query": ""}
+    {"op": "team"}
+
+Saves from all connections are gathered into batches and handed to a single
+storage thread, so the event loop never waits on the disk. Open logs (each
+with its writer thread and files) are kept in a small least recently used
+pool, while the running totals of every user stay in memory for the team
+statistics. A save is acknowledged once it is queued for writing, like a
+save in the app.
+
+    python mood_server.py loadtest --clients 1000 --saves 10
+
+starts a stand-in server on a temporary socket and data folder and reports
+the throughput and latency seen by that many concurrent clients.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import queue
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows - the open file limit is left alone
+
+from mood_storage import MoodLog, MoodStats, MoodEntry
+
+# User names become folder names
+user_pattern = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+max_line_bytes = 1 << 20  # Longest request line accepted
+
+# Open mood logs of the team, least recently used closed first
+class MoodLogPool:
+    def __init__(self, folder="team_moods", capacity=256, fsync_policy="interval"):
+        self.folder = folder
+        self.capacity = capacity
+        self.fsync_policy = fsync_policy
+        self.logs = OrderedDict()  # user -> open MoodLog
+        # user -> MoodStats of the users whose log isn't open (an open log's stats are read from it,
+        # as a reload or compaction replaces them)
+        self.team = {}
+
+    def log_path(self, user):
+        if not isinstance(user, str) or not user_pattern.match(user):
+            raise ValueError(f"invalid user name {user!r}")
+        return os.path.join(self.folder, user, "mood_log.txt")
+
+    def get(self, user):
+        """The user's MoodLog, opened (and the oldest one closed) if it isn't open yet"""
+        log = self.logs.get(user)
+        if log is not None:
+            self.logs.move_to_end(user)
+            return log
+        path = self.log_path(user)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        log = MoodLog(path, fsync_policy=self.fsync_policy)
+        log.open()
+        self.logs[user] = log
+        self.team.pop(user, None)
+        while len(self.logs) > self.capacity:
+            oldest_user, oldest = self.logs.popitem(last=False)
+            oldest.close()
+            self.team[oldest_user] = oldest.stats
+        return log
+
+    def team_stats(self):
+        """The MoodStats of every user"""
+        return [log.stats for log in self.logs.values()] + list(self.team.values())
+
+    def load_team(self):
+        """Read the running totals of every user in the data folder"""
+        os.makedirs(self.folder, exist_ok=True)
+        for name in sorted(os.listdir(self.folder)):
+            if name in self.team or name in self.logs or not user_pattern.match(name):
+                continue
+            path = os.path.join(self.folder, name, "mood_log.txt")
+            if os.path.isdir(os.path.dirname(path)):
+                stats = MoodStats(path)
+                stats.load()
+                self.team[name] = stats
+
+    def save_batch(self, batch):
+        """Append a batch of (user, records) - one statistics snapshot per user instead of one per entry.
+
+        Returns the error of each request (None if it was saved), so one bad
+        request doesn't fail the others.
+        """
+        # Group by user so each log is fetched from the pool once, even when the batch has more users than the pool
+        by_user = {}
+        for position, (user, records) in enumerate(batch):
+            by_user.setdefault(user, []).append((position, records))
+        errors = [None] * len(batch)
+        for user, requests in by_user.items():
+            try:
+                log = self.get(user)
+            except Exception as e:
+                for position, _ in requests:
+                    errors[position] = e
+                continue
+            for position, records in requests:
+                try:
+                    for mood, note, timestamp in records:
+                        log.save(mood, note, timestamp, checkpoint=False)
+                except Exception as e:
+                    errors[position] = e
+            log.checkpoint()
+        return errors
+
+    def history(self, user, query, skip, limit):
+        log = self.get(user)
+        offsets = islice(log.find_offsets(query), skip, skip + limit)
+        entries = map(log.entry_at, offsets)
+        return [{"timestamp": entry.timestamp.isoformat(), "mood": entry.mood, "note": entry.note}
+                for entry in entries if entry]
+
+    def stats_text(self, user, query):
+        log = self.get(user)
+        if query:
+            return log.filtered_stats_text(query)
+        return log.stats_text().rstrip("\n") + "\n\n" + self.team_text()
+
+    def team_totals(self):
+        mood_counts = Counter()
+        total_entries = today_count = 0
+        for stats in self.team_stats():
+            mood_counts.update(stats.mood_counts)
+            total_entries += stats.total_entries
+            today_count += stats.today_count()
+        return {"users": len(self.logs) + len(self.team), "total_entries": total_entries,
+                "today_count": today_count, "mood_counts": dict(mood_counts)}
+
+    def team_text(self):
+        totals = self.team_totals()
+        text = "TEAM:\n"
+        text += f"Members: {totals['users']}\n"
+        text += f"Total Entries: {totals['total_entries']}\n"
+        text += f"Today's Logs: {totals['today_count']}\n"
+        if totals["total_entries"]:
+            text += "Top Moods: " + ", ".join(
+                f"{mood} ({count / totals['total_entries'] * 100:.1f}%)"
+                for mood, count in Counter(totals["mood_counts"]).most_common(3)) + "\n"
+        return text
+
+    def close(self):
+        while self.logs:
+            _, log = self.logs.popitem(last=False)
+            log.close()
+
+# Function to check the entries of a save request
+def parse_records(entries):
+    """(mood, note, timestamp) tuples from the "entries" of a save request"""
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("entries must be a non-empty list")
+    records = []
+    for entry in entries:
+        mood = str(entry.get("mood") or "").strip()
+        if not mood or "\n" in mood:
+            raise ValueError(f"invalid mood {entry.get('mood')!r}")
+        note = str(entry.get("note") or "").replace("\r\n", "\n")
+        timestamp = datetime.fromisoformat(entry["timestamp"]) if entry.get("timestamp") else None
+        if timestamp and timestamp.tzinfo:
+            # The log keeps local times without an offset, like the app writes them
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        records.append((mood, note, timestamp))
+    return records
+
+class MoodServer:
+    def __init__(self, folder="team_moods", pool_size=256, max_batch=1024, fsync_policy="interval"):
+        self.pool = MoodLogPool(folder, pool_size, fsync_policy)
+        self.max_batch = max_batch  # Most save requests handed to the storage thread at once
+        # Every MoodLog call happens on this one thread, in the order requests arrived
+        self.storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mood-storage")
+        self.saves = None  # (user, records, future) waiting for the batch writer
+        self.server = None
+        self.writer_task = None
+        self.clients = 0
+
+    async def start(self, socket_path=None, host=None, port=None):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.storage, self.pool.load_team)
+        self.saves = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self.write_batches())
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)  # Left over from a server that didn't shut down cleanly
+            self.server = await asyncio.start_unix_server(self.handle_client, socket_path,
+                                                          limit=max_line_bytes, backlog=4096)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host or "127.0.0.1", port,
+                                                     limit=max_line_bytes, backlog=4096)
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.writer_task:
+            # Let queued saves finish before the logs are closed
+            await self.saves.join()
+            self.writer_task.cancel()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.storage, self.pool.close)
+        self.storage.shutdown()
+
+    async def handle_client(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break  # Line over the limit, or the client went away
+                if not line:
+                    break
+                try:
+                    reply = await self.dispatch(json.loads(line))
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def dispatch(self, message):
+        op = message.get("op")
+        loop = asyncio.get_running_loop()
+        if op == "save":
+            user = message.get("user")
+            self.pool.log_path(user)
+            records = parse_records(message.get("entries"))
+            done = loop.create_future()
+            await self.saves.put((user, records, done))
+            await done
+            return {"ok": True, "saved": len(records)}
+        if op == "history":
+            entries = await loop.run_in_executor(
+                self.storage, self.pool.history, message.get("user"), message.get("query") or "",
+                max(0, int(message.get("skip", 0))), min(500, max(1, int(message.get("limit", 40)))))
+            return {"ok": True, "entries": entries}
+        if op == "stats":
+            text = await loop.run_in_executor(self.storage, self.pool.stats_text, message.get("user"),
+                                              message.get("query") or "")
+            return {"ok": True, "text": text}
+        if op == "team":
+            totals = await loop.run_in_executor(self.storage, self.pool.team_totals)
+            return {"ok": True, **totals}
+        raise ValueError(f"unknown op {op!r}")
+
+    async def write_batches(self):
+        """Hand the queued saves to the storage thread, as many at a time as have piled up"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.saves.get()]
+            while len(batch) < self.max_batch and not self.saves.empty():
+                batch.append(self.saves.get_nowait())
+            try:
+                errors = await loop.run_in_executor(self.storage, self.pool.save_batch,
+                                                    [(user, records) for user, records, _ in batch])
+            except Exception as e:
+                errors = [e] * len(batch)
+            for (user, _, done), error in zip(batch, errors):
+                if error is not None:
+                    print(f"Error saving moods for {user}: {error}", file=sys.stderr)
+                if not done.done():
+                    if error is None:
+                        done.set_result(None)
+                    else:
+                        done.set_exception(error)
+            for _ in batch:
+                self.saves.task_done()
+
+# Function to open a blocking connection to "host:port" or a Unix socket path
+def connect_socket(address, timeout):
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.create_connection((host, int(port)), timeout=timeout)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(address)
+    except OSError:
+        connection.close()
+        raise
+    return connection
+
+# Blocking client used by the Tk app - saves go out from a background thread
+class MoodServiceClient:
+    def __init__(self, address, user, timeout=5.0, retry_interval=2.0):
+        self.address = address  # Unix socket path, or "host:port"
+        self.user = user
+        self.timeout = timeout
+        self.retry_interval = retry_interval  # Seconds between attempts while the server is unreachable
+        self.lock = threading.Lock()  # One request at a time on the connection
+        self.connection = None
+        self.reader = None
+        self.outbox = queue.Queue()  # Entries waiting to be sent, None to stop
+        self.thread = None
+
+    def connect(self):
+        self.connection = connect_socket(self.address, self.timeout)
+        self.reader = self.connection.makefile("rb")
+
+    def disconnect(self):
+        if self.connection:
+            self.reader.close()
+            self.connection.close()
+        self.connection = self.reader = None
+
+    def request(self, message):
+        """Send one request and return the reply, reconnecting once if the connection dropped"""
+        data = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self.lock:
+            for attempt in (1, 2):
+                try:
+                    if self.connection is None:
+                        self.connect()
+                    self.connection.sendall(data)
+                    line = self.reader.readline()
+                    if not line:
+                        raise ConnectionError("server closed the connection")
+                    break
+                except OSError:
+                    self.disconnect()
+                    if attempt == 2:
+                        raise
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "request failed"))
+        return reply
+
+    def save(self, mood_name, note_text, timestamp=None):
+        """Queue an entry for the server and return straight away"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="mood-service", daemon=True)
+            self.thread.start()
+        timestamp = (timestamp or datetime.now()).replace(microsecond=0)
+        self.outbox.put({"mood": mood_name, "note": note_text, "timestamp": timestamp.isoformat()})
+
+    def run(self):
+        while True:
+            entries = [self.outbox.get()]
+            while not self.outbox.empty():
+                entries.append(self.outbox.get_nowait())
+            stopping = None in entries
+            entries = [entry for entry in entries if entry is not None]
+            while entries:
+                try:
+                    self.request({"op": "save", "user": self.user, "entries": entries})
+                    print(f"Sent {len(entries)} mood(s) to the mood server")
+                    break
+                except Exception as e:
+                    print(f"Error sending moods to the mood server: {e}", file=sys.stderr)
+                    if stopping:
+                        return
+                    time.sleep(self.retry_interval)
+            if stopping:
+                return
+
+    def history_page(self, query, skip, limit):
+        entries = self.request({"op": "history", "user": self.user, "query": query,
+                                "skip": skip, "limit": limit})["entries"]
+        return [MoodEntry(datetime.fromisoformat(entry["timestamp"]), entry["mood"], entry["note"], None)
+                for entry in entries]
+
+    def find_entries(self, query="", page_size=40):
+        """MoodEntry tuples matching a query, newest first, fetched a page at a time.
+
+        The first page is asked for right away, so an unreachable server
+        raises here rather than in the middle of scrolling.
+        """
+        page = self.history_page(query, 0, page_size)
+
+        def pages(page, skip):
+            while True:
+                yield from page
+                if len(page) < page_size:
+                    return
+                skip += len(page)
+                page = self.history_page(query, skip, page_size)
+        return pages(page, 0)
+
+    def stats_text(self, query=""):
+        return self.request({"op": "stats", "user": self.user, "query": query})["text"]
+
+    def close(self):
+        """Send whatever is still queued, then drop the connection"""
+        if self.thread is not None:
+            self.outbox.put(None)
+            self.thread.join(timeout=self.timeout)
+        self.disconnect()
+
+def client_from_environment():
+    """MoodServiceClient for MOOD_TRACKER_SERVER (as MOOD_TRACKER_USER), or None to use the local file"""
+    address = os.environ.get("MOOD_TRACKER_SERVER")
+    if not address:
+        return None
+    user = os.environ.get("MOOD_TRACKER_USER") or os.environ.get("USER") or os.environ.get("USERNAME") or "me"
+    if not user_pattern.match(user):
+        print(f"Invalid MOOD_TRACKER_USER {user!r}, saving to the local mood log instead", file=sys.stderr)
+        return None
+    return MoodServiceClient(address, user)
+
+# Function to run the server until Ctrl+C or SIGTERM
+async def serve(args):
+    server = MoodServer(args.data, pool_size=args.pool_size, max_batch=args.max_batch, fsync_policy=args.fsync)
+    await server.start(None if args.port else args.socket, args.host, args.port)
+    print(f"Serving mood logs from {args.data} on {f'{args.host}:{args.port}' if args.port else args.socket}",
+          file=sys.stderr)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    await stop.wait()
+    await server.close()
+    if not args.port and os.path.exists(args.socket):
+        os.remove(args.socket)
+    return 0
+
+# Function to hammer a stand-in server with concurrent clients
+async def load_test(args):
+    if resource:
+        # Every client needs a socket on both ends
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = args.clients * 2 + 256
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    with tempfile.TemporaryDirectory(prefix="mood_loadtest_") as folder:
+        socket_path = os.path.join(folder, "mood.sock")
+        server = MoodServer(os.path.join(folder, "data"), pool_size=args.pool_size, max_batch=args.max_batch,
+                            fsync_policy=args.fsync)
+        await server.start(socket_path)
+        latencies = []
+
+        async def client(number):
+            reader, writer = await asyncio.open_unix_connection(socket_path, limit=max_line_bytes)
+            user = f"user{number % args.users}"
+            try:
+                for n in range(args.saves):
+                    request = {"op": "save", "user": user, "entries": [{"mood": "Joy", "note": f"load test {n}"}]}
+                    start = time.perf_counter()
+                    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+                    reply = json.loads(await reader.readline())
+                    latencies.append(time.perf_counter() - start)
+                    if not reply.get("ok"):
+                        raise RuntimeError(reply.get("error"))
+            finally:
+                writer.close()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client(number) for number in range(args.clients)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        failures = [result for result in results if isinstance(result, Exception)]
+
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(b'{"op": "team"}\n')
+        totals = json.loads(await reader.readline())
+        writer.close()
+        await server.close()
+
+    latencies.sort()
+    saved = len(latencies)
+    print(f"{args.clients} clients x {args.saves} saves over {args.users} users in {elapsed:.2f}s")
+    print(f"Throughput: {saved / elapsed:.0f} saves/s")
+    if latencies:
+        print(f"Latency: p50 {latencies[saved // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[min(saved - 1, int(saved * 0.99))] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"Server total: {totals.get('total_entries')} entries for {totals.get('users')} users")
+    if failures:
+        print(f"{len(failures)} client(s) failed, e.g. {failures[0]!r}", file=sys.stderr)
+        return 1
+    return 0 if totals.get("total_entries") == saved else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve mood logs for a team from one host.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, handler, help_text in (("serve", serve, "run the server"),
+                                     ("loadtest", load_test, "measure a stand-in server under load")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--pool-size", type=int, default=256, help="mood logs kept open (default: 256)")
+        command.add_argument("--max-batch", type=int, default=1024, help="most saves written together")
+        command.add_argument("--fsync", choices=["always", "interval", "never"], default="interval")
+        command.set_defaults(handler=handler)
+        if name == "serve":
+            command.add_argument("--data", default="team_moods", help="folder with a log per user")
+            command.add_argument("--socket", default="mood_tracker.sock", help="Unix socket to listen on")
+            command.add_argument("--host", default="127.0.0.1", help="address for --port")
+            command.add_argument("--port", type=int, help="listen on TCP instead of the Unix socket")
+        else:
+            command.add_argument("--clients", type=int, default=1000, help="concurrent connections")
+            command.add_argument("--saves", type=int, default=10, help="saves sent by each client")
+            command.add_argument("--users", type=int, default=100, help="users the clients are spread over")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return asyncio.run(args.handler(args))
+    except KeyboardInterrupt:
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2248 @@
+"""Mood log storage shared by the Tk app (simple_code.py) and the command line tool (mood_cli.py).
+
+Nothing here imports tkinter, PIL or pygame, so scripts can log, import and
+export entries without opening a window. Diagnostics go to stderr so they
+never mix with exported data.
+"""
+import os
+import sys
+import io
+import re
+import shutil
+import struct
+import json
+import threading
+import queue
+import time
+import atexit
+import mmap
+from datetime import datetime, timedelta
+from collections import Counter, namedtuple
+from bisect import bisect_left, bisect_right
+from array import array
+
+# Pattern for the first line of every entry written by save_mood_log()
+entry_header_pattern = re.compile(r"Date: (\d{4}-\d{2}-\d{2}) Time: (\d{2}:\d{2}:\d{2}) Mood: (.+)")
+
+# A single parsed entry from the mood log (offset is the byte position of its header line)
+MoodEntry = namedtuple("MoodEntry", ["timestamp", "mood", "note", "offset"], defaults=[None])
+
+# Moods in the order the app shows them (the record store numbers them in this order too)
+mood_order = ["joy", "neutral", "sadness", "anger", "annoyed", "anxiety", "fear"]
+
+def build_mood_entry(header, note_lines, on_corrupt=None):
+    """Turn a matched header line and its note lines into a MoodEntry (or None if corrupt)"""
+    match, line_no, offset = header
+    try:
+        timestamp = datetime.strptime(f"{match.group(1)} {match.group(2)}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        if on_corrupt:
+            on_corrupt(line_no, "invalid date or time")
+        return None
+
+    if not note_lines or not note_lines[0].startswith("Note: "):
+        if on_corrupt:
+            on_corrupt(line_no, "missing note line")
+        return None
+
+    # Drop the "Note: " prefix and the blank line that separates entries
+    note = "".join(note_lines)[len("Note: "):]
+    if note.endswith("\n\n"):
+        note = note[:-2]
+    elif note.endswith("\n"):
+        note = note[:-1]
+    return MoodEntry(timestamp, match.group(3).strip(), note, offset)
+
+# Function to stream mood entries from the log file
+def iter_mood_entries(path="mood_log.txt", on_corrupt=None, start=0, end=None, include_dead=False):
+    """Yield MoodEntry tuples oldest first, reading the log one line at a time.
+
+    Notes may span several lines (including blank ones); an entry ends where the
+    next header line starts. Corrupt entries are skipped, and reported through
+    on_corrupt(line_no, reason) when a callback is given. start is a byte offset
+    at an entry boundary to resume reading from; reading stops at end (also an
+    entry boundary), so an entry being written past it is never half read.
+    Deleted and replaced entries are left out unless include_dead is set.
+    """
+    if not log_exists(path):
+        return
+
+    dead = {} if include_dead else dead_entries(path)
+    with open_log(path) as file:
+        file.seek(start)
+        header = None
+        note_lines = []
+        position = start
+        for line_no, raw_line in enumerate(file, 1):
+            if end is not None and position >= end:
+                break
+            line = raw_line.decode("utf-8", errors="replace").replace("\r\n", "\n")
+            match = entry_header_pattern.match(line)
+            if match:
+                if header:
+                    entry = build_mood_entry(header, note_lines, on_corrupt)
+                    if entry and entry.offset not in dead:
+                        yield entry
+                header = (match, line_no, position)
+                note_lines = []
+            elif header:
+                note_lines.append(line)
+            elif line.strip() and on_corrupt:
+                on_corrupt(line_no, "text outside of an entry")
+            position += len(raw_line)
+
+        if header:
+            entry = build_mood_entry(header, note_lines, on_corrupt)
+            if entry and entry.offset not in dead:
+                yield entry
+
+# Function to read the log file backwards, one block at a time
+def iter_lines_reversed(path, block_size=65536):
+    """Yield (offset, line) pairs of a file last to first (lines as bytes, without the newline).
+
+    Only one block is held in memory at a time. The first line yielded is
+    whatever follows the final newline, which is empty for a complete log.
+    """
+    position = log_size(path)
+    remainder = b""
+    with open_log(path) as file:
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            file.seek(position)
+            block = file.read(read_size) + remainder
+            lines = block.split(b"\n")
+            # The first piece may continue in the previous block
+            remainder = lines[0]
+            line_end = position + len(block)
+            for line in reversed(lines[1:]):
+                line_start = line_end - len(line)
+                yield line_start, line
+                line_end = line_start - 1
+    yield 0, remainder
+
+# Function to stream mood entries from the log file, newest first
+def iter_mood_entries_reversed(path="mood_log.txt", on_corrupt=None, block_size=65536):
+    """Yield MoodEntry tuples newest first by reading the log backwards from EOF.
+
+    Work is proportional to the entries actually consumed, not to the size of
+    the log, so the newest page costs the same on any log. Deleted and
+    replaced entries are left out.
+    """
+    if not log_exists(path):
+        return
+
+    dead = dead_entries(path)
+    note_lines = []  # Lines below the header we have not reached yet, bottom first
+    first_line = True
+    for line_offset, raw_line in iter_lines_reversed(path, block_size):
+        if first_line:
+            first_line = False
+            if not raw_line:
+                continue
+        line = raw_line.decode("utf-8", errors="replace")
+        if line.endswith("\r"):
+            line = line[:-1]
+        line += "\n"
+        match = entry_header_pattern.match(line)
+        if match:
+            note_lines.reverse()
+            entry = build_mood_entry((match, None, line_offset), note_lines, on_corrupt)
+            note_lines = []
+            if entry and entry.offset not in dead:
+                yield entry
+        else:
+            note_lines.append(line)
+
+    if any(line.strip() for line in note_lines) and on_corrupt:
+        on_corrupt(1, "text outside of an entry")
+
+def format_mood_entry(entry):
+    """Format a MoodEntry the same way save_mood_log() writes it"""
+    date = entry.timestamp.strftime("%Y-%m-%d")
+    time = entry.timestamp.strftime("%H:%M:%S")
+    return f"Date: {date} Time: {time} Mood: {entry.mood}\nNote: {entry.note}"
+
+# Monthly segments: once migrated, mood_log.txt is stored as mood_log.segments/YYYY-MM.txt files
+# plus a manifest with each segment's size, entry count, first and last entry time and mood counts.
+# The manifest is only rewritten when a segment is added; entries appended to the newest segment
+# since then are counted from the file when it is loaded.
+# Read one after another the segments hold exactly the bytes the single file did, so byte offsets
+# into the log (used by the snapshot and the indexes) keep their meaning.
+def segment_folder(path):
+    return os.path.splitext(path)[0] + ".segments"
+
+segment_name_pattern = re.compile(r"\d{4}-\d{2}\.txt$")
+
+# Deleted and edited entries: segments are only ever appended to, so a dead entry stays where it is and
+# gets a line in tombstones.txt next to the segments instead. An edit appends the corrected entry (same
+# time) first and then a tombstone pointing at it as the replacement. Readers skip dead entries, and
+# LogCompactor rewrites the segments without them once they make up enough of the log.
+Tombstone = namedtuple("Tombstone", ["offset", "replacement", "timestamp", "mood"])
+
+class LogSegments:
+    def __init__(self, path="mood_log.txt", folder=None):
+        self.path = path
+        self.folder = folder or segment_folder(path)
+        self.manifest_path = os.path.join(self.folder, "manifest.json")
+        self.manifest_mtime = None  # Reload when another process changed the manifest
+        self.segments = []  # Oldest first: {"name", "base", "size", "count", "first", "last", "moods"}
+        self.generation = 0  # Bumped by every compaction - byte offsets from another generation mean nothing
+        self.tombstones_path = os.path.join(self.folder, "tombstones.txt")
+        self.tombstones = []  # In the order they were written
+        self.dead = {}  # Offset of each dead entry -> its Tombstone
+        self.tombstones_size = 0  # Bytes of tombstones.txt read so far
+        self.lock = threading.RLock()
+
+    def load(self):
+        """Read the manifest and bring it in line with the segment files on disk"""
+        with self.lock:
+            known = {}
+            try:
+                if os.path.exists(self.manifest_path):
+                    with open(self.manifest_path, "r", encoding="utf-8") as file:
+                        manifest = json.load(file)
+                    known = {segment["name"]: segment for segment in manifest["segments"]}
+                    self.generation = manifest.get("generation", 0)
+            except Exception as e:
+                print(f"Error loading segment manifest: {e}", file=sys.stderr)
+
+            # Segment names only ever increase, so name order is log order
+            changed = False
+            segments = []
+            base = 0
+            names = sorted(name for name in os.listdir(self.folder) if segment_name_pattern.match(name))
+            for name in names:
+                size = os.path.getsize(os.path.join(self.folder, name))
+                segment = known.get(name)
+                if segment is not None and name == names[-1] and segment["size"] < size:
+                    # Appended to since the manifest was saved
+                    self.read_tail(segment)
+                elif segment is None or segment["size"] != size:
+                    segment = self.scan_segment(name)
+                    changed = True
+                segment["base"] = base
+                segments.append(segment)
+                base += segment["size"]
+            changed = changed or len(segments) != len(known)
+            self.segments = segments
+            if changed or not os.path.exists(self.manifest_path):
+                self.save()
+            else:
+                self.manifest_mtime = os.path.getmtime(self.manifest_path)
+            self.tombstones, self.dead, self.tombstones_size = [], {}, 0
+            self.load_tombstones()
+
+    def reload_if_changed(self):
+        try:
+            if os.path.getmtime(self.manifest_path) != self.manifest_mtime:
+                self.load()
+                return
+            if os.path.exists(self.tombstones_path) and os.path.getsize(self.tombstones_path) != self.tombstones_size:
+                self.load_tombstones()
+            if self.segments and os.path.getsize(self.segment_path(self.segments[-1])) > self.segments[-1]["size"]:
+                # Another process appended to the newest segment
+                with self.lock:
+                    self.read_tail(self.segments[-1])
+        except OSError:
+            pass
+
+    def read_tail(self, segment):
+        """Count the entries in a segment file past the size its manifest entry covers"""
+        with open(self.segment_path(segment), "rb") as file:
+            file.seek(segment["size"])
+            data = file.read()
+        # Up to the last whole line, so a header still being written is counted next time
+        data = data[:data.rfind(b"\n") + 1]
+        self.count_records(segment, data)
+        segment["size"] += len(data)
+
+    def load_tombstones(self):
+        """Read the tombstones written since the last call (a torn last line is left for later)"""
+        with self.lock:
+            if not os.path.exists(self.tombstones_path):
+                return
+            try:
+                with open(self.tombstones_path, "rb") as file:
+                    file.seek(self.tombstones_size)
+                    data = file.read()
+                complete = data[:data.rfind(b"\n") + 1]
+                # One line per dead entry: offset, offset of its replacement ("-" if deleted), time and mood
+                for line in complete.decode("utf-8", errors="replace").splitlines():
+                    fields = line.split("\t")
+                    try:
+                        tombstone = Tombstone(int(fields[0]), None if fields[1] == "-" else int(fields[1]),
+                                              datetime.strptime(fields[2], "%Y-%m-%d %H:%M:%S"), fields[3])
+                    except (ValueError, IndexError):
+                        continue  # Torn by a crash and completed by the next write
+                    self.remember_tombstone(tombstone)
+                self.tombstones_size += len(complete)
+            except Exception as e:
+                print(f"Error loading tombstones: {e}", file=sys.stderr)
+
+    def remember_tombstone(self, tombstone):
+        if tombstone.offset not in self.dead:
+            self.tombstones.append(tombstone)
+            self.dead[tombstone.offset] = tombstone
+
+    def add_tombstones(self, tombstones, sync=False):
+        """Mark entries as dead. With sync, the segments (holding any replacement) and tombstones reach the disk first"""
+        with self.lock:
+            lines = "".join(f"{tombstone.offset}\t{'-' if tombstone.replacement is None else tombstone.replacement}\t"
+                            f"{tombstone.timestamp:%Y-%m-%d %H:%M:%S}\t{tombstone.mood}\n" for tombstone in tombstones)
+            if sync and self.segments:
+                # A replacement must never be lost while the tombstone hiding the original survives
+                with open(self.segment_path(self.segments[-1]), "ab") as file:
+                    os.fsync(file.fileno())
+            with open(self.tombstones_path, "a+b") as file:
+                if file.seek(0, os.SEEK_END):
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        lines = "\n" + lines
+                file.write(lines.encode("utf-8"))
+                file.flush()
+                if sync:
+                    os.fsync(file.fileno())
+            self.tombstones_size = os.path.getsize(self.tombstones_path)
+            for tombstone in tombstones:
+                self.remember_tombstone(tombstone)
+
+    def entry_count(self):
+        """Entries in the segments, dead ones included"""
+        return sum(segment["count"] for segment in self.segments)
+
+    def scan_segment(self, name):
+        """Work out the manifest fields of one segment by reading it"""
+        segment_path = os.path.join(self.folder, name)
+        segment = {"name": name, "base": 0, "size": os.path.getsize(segment_path), "count": 0,
+                   "first": None, "last": None, "moods": {}}
+        for entry in iter_mood_entries(segment_path):
+            self.count_entry(segment, entry.timestamp.strftime("%Y-%m-%d %H:%M:%S"), entry.mood)
+        return segment
+
+    def count_records(self, segment, data):
+        """Count the entries in encoded log data belonging to a segment"""
+        for record in re.split(rb"(?=^Date: )", data, flags=re.MULTILINE):
+            match = entry_header_pattern.match(record.split(b"\n", 1)[0].decode("utf-8", errors="replace"))
+            if match:
+                self.count_entry(segment, f"{match.group(1)} {match.group(2)}", match.group(3).strip())
+
+    @staticmethod
+    def count_entry(segment, timestamp, mood):
+        segment["count"] += 1
+        segment["moods"][mood] = segment["moods"].get(mood, 0) + 1
+        if segment["first"] is None or timestamp < segment["first"]:
+            segment["first"] = timestamp
+        if segment["last"] is None or timestamp > segment["last"]:
+            segment["last"] = timestamp
+
+    def save(self):
+        with self.lock:
+            try:
+                temp_path = self.manifest_path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump({"generation": self.generation, "segments": self.segments}, file, indent=1)
+                os.replace(temp_path, self.manifest_path)
+                self.manifest_mtime = os.path.getmtime(self.manifest_path)
+            except Exception as e:
+                print(f"Error saving segment manifest: {e}", file=sys.stderr)
+
+    def segment_path(self, segment):
+        return os.path.join(self.folder, segment["name"])
+
+    def size(self):
+        """Total size of the log - the last segment may have grown since the manifest was saved"""
+        if not self.segments:
+            return 0
+        last = self.segments[-1]
+        try:
+            return last["base"] + os.path.getsize(self.segment_path(last))
+        except OSError:
+            return last["base"] + last["size"]
+
+    def locate(self, offset):
+        """Index of the segment holding a byte offset of the log"""
+        bases = [segment["base"] for segment in self.segments]
+        return max(0, bisect_right(bases, offset) - 1)
+
+    def between(self, start=None, end=None):
+        """Segments that may hold entries from start to end ("YYYY-MM-DD HH:MM:SS" strings, None = open)"""
+        return [segment for segment in self.segments if segment["count"] and
+                (start is None or segment["last"] >= start) and (end is None or segment["first"] <= end)]
+
+    def append(self, data, sync=False):
+        """Write encoded entries, starting a new segment when an entry is from a later month"""
+        with self.lock:
+            segment_count = len(self.segments)
+            runs = []  # (segment, bytes) in write order
+            for record in re.split(rb"(?=^Date: )", data, flags=re.MULTILINE):
+                if not record:
+                    continue
+                header = record.split(b"\n", 1)[0].decode("utf-8", errors="replace")
+                match = entry_header_pattern.match(header)
+                month = match.group(1)[:7] if match else None
+                if not self.segments or (month and month > self.segments[-1]["name"][:7]):
+                    base = self.segments[-1]["base"] + self.segments[-1]["size"] if self.segments else 0
+                    self.segments.append({"name": f"{month or datetime.now().strftime('%Y-%m')}.txt", "base": base,
+                                          "size": 0, "count": 0, "first": None, "last": None, "moods": {}})
+                segment = self.segments[-1]
+                if runs and runs[-1][0] is segment:
+                    runs[-1][1].append(record)
+                else:
+                    runs.append((segment, [record]))
+                segment["size"] += len(record)
+                if match:
+                    self.count_entry(segment, f"{match.group(1)} {match.group(2)}", match.group(3).strip())
+
+            try:
+                for segment, records in runs:
+                    with open(self.segment_path(segment), "ab") as file:
+                        file.write(b"".join(records))
+                        file.flush()
+                        if sync:
+                            os.fsync(file.fileno())
+            except Exception:
+                # Go back to what actually reached the disk before the caller retries
+                self.load()
+                raise
+            if len(self.segments) != segment_count:
+                self.save()
+
+# Seekable view of the segments as one continuous byte stream
+class SegmentReader(io.RawIOBase):
+    def __init__(self, segments):
+        self.segments = segments
+        self.position = 0
+        self.file = None
+        self.file_index = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.segments.size()
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        segment_list = self.segments.segments
+        index = self.segments.locate(self.position)
+        while index < len(segment_list):
+            if index != self.file_index:
+                if self.file:
+                    self.file.close()
+                self.file = open(self.segments.segment_path(segment_list[index]), "rb")
+                self.file_index = index
+            self.file.seek(self.position - segment_list[index]["base"])
+            count = self.file.readinto(buffer)
+            if count:
+                self.position += count
+                return count
+            # End of this segment - carry on with the next one
+            index += 1
+            if index < len(segment_list):
+                self.position = max(self.position, segment_list[index]["base"])
+        return 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        super().close()
+
+# Segment manifests of the logs opened so far, shared by readers and the writer
+loaded_segments = {}
+
+def get_log_segments(path):
+    """The LogSegments of a migrated log, or None for a plain single-file log"""
+    segments = loaded_segments.get(path)
+    if segments is None:
+        if not os.path.isdir(segment_folder(path)):
+            return None
+        segments = loaded_segments[path] = LogSegments(path)
+        segments.load()
+    else:
+        segments.reload_if_changed()
+    return segments
+
+def open_log(path):
+    """Open a log for binary reading, whether it is segmented or a single file"""
+    segments = get_log_segments(path)
+    if segments is None:
+        return open(path, "rb")
+    return io.BufferedReader(SegmentReader(segments), buffer_size=65536)
+
+def log_exists(path):
+    return os.path.isdir(segment_folder(path)) or os.path.exists(path)
+
+def log_size(path):
+    segments = get_log_segments(path)
+    if segments is not None:
+        return segments.size()
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def dead_entries(path):
+    """{offset: Tombstone} of the deleted and replaced entries of a log (only segmented logs have any)"""
+    segments = get_log_segments(path)
+    return segments.dead if segments is not None else {}
+
+def log_generation(path):
+    """How many times the log was compacted - offsets saved under another generation are stale"""
+    segments = get_log_segments(path)
+    return segments.generation if segments is not None else 0
+
+def log_version(path):
+    """(generation, dead entries, size) - changes whenever the entries a reader sees may have"""
+    segments = get_log_segments(path)
+    if segments is None:
+        return 0, 0, log_size(path)
+    return segments.generation, len(segments.tombstones), segments.size()
+
+# Function to convert a single-file log into monthly segments
+def migrate_to_segments(path):
+    """Split the log into a segment per month (one time), keeping the old file as <path>.migrated.
+
+    A new segment starts at the first entry from a later month than the
+    current one; entries from earlier months stay where they are, so the
+    segments hold the bytes of the old file unchanged and in order.
+    """
+    folder = segment_folder(path)
+    if os.path.isdir(folder):
+        if os.path.exists(path):
+            # A previous migration stopped just before putting the old file aside
+            os.replace(path, path + ".migrated")
+        return
+    temp_folder = folder + ".tmp"
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    if os.path.exists(path):
+        print(f"Splitting {path} into monthly segments in {folder}", file=sys.stderr)
+        current_month = None
+        output = None
+        leading = []  # Anything before the first entry goes into the first segment
+        with open(path, "rb") as file:
+            for line in file:
+                match = entry_header_pattern.match(line.decode("utf-8", errors="replace")) if line.startswith(b"Date: ") else None
+                if match and (current_month is None or match.group(1)[:7] > current_month):
+                    current_month = match.group(1)[:7]
+                    if output:
+                        output.close()
+                    output = open(os.path.join(temp_folder, f"{current_month}.txt"), "wb")
+                    output.writelines(leading)
+                    leading = []
+                if output:
+                    output.write(line)
+                else:
+                    leading.append(line)
+        if output:
+            output.close()
+        elif leading:
+            with open(os.path.join(temp_folder, f"{datetime.now():%Y-%m}.txt"), "wb") as output:
+                output.writelines(leading)
+    os.replace(temp_folder, folder)
+    if os.path.exists(path):
+        os.replace(path, path + ".migrated")
+
+# Function to stream the entries from a date range, reading only the segments that cover it
+def iter_mood_entries_between(path="mood_log.txt", start=None, end=None, include_dead=False, end_offset=None):
+    """Yield entries with start <= timestamp <= end (datetimes, None = open ended), in log order.
+
+    With end_offset (a log size after MoodLog.flush()) nothing past it is
+    read, so it is safe on another thread while entries are being written.
+    """
+    dead = {} if include_dead else dead_entries(path)
+    segments = get_log_segments(path)
+    if segments is None:
+        files = [(path, 0)] if os.path.exists(path) else []
+    else:
+        start_text = start.strftime("%Y-%m-%d %H:%M:%S") if start else None
+        end_text = end.strftime("%Y-%m-%d %H:%M:%S") if end else None
+        files = [(segments.segment_path(segment), segment["base"]) for segment in segments.between(start_text, end_text)]
+    for file_path, base in files:
+        if end_offset is not None and base >= end_offset:
+            break
+        for entry in iter_mood_entries(file_path, end=None if end_offset is None else end_offset - base):
+            if (start is None or entry.timestamp >= start) and (end is None or entry.timestamp <= end):
+                # Offsets count from the start of the whole log
+                if base + entry.offset not in dead:
+                    yield entry._replace(offset=base + entry.offset) if base else entry
+
+# Function to tell which months of a year may have changed without reading their entries
+def month_versions(path, year, end_offset, tombstone_count):
+    """For each month of a year, a value that changes whenever its entries may have.
+
+    It is made of the log generation, the segments that can hold the month
+    (with how much of each lies before end_offset) and the number of the
+    month's deleted and replaced entries among the first tombstone_count.
+    Only the manifest and the tombstones are looked at.
+    """
+    segments = get_log_segments(path)
+    if segments is None:
+        return [(0, end_offset, 0)] * 12
+    with segments.lock:
+        generation = segments.generation
+        dead = Counter(tombstone.timestamp.month for tombstone in segments.tombstones[:tombstone_count]
+                       if tombstone.timestamp.year == year)
+        versions = []
+        for month in range(1, 13):
+            start, end = (bound.strftime("%Y-%m-%d %H:%M:%S") for bound in date_filter_bounds(year, month))
+            read = tuple((segment["name"], min(segment["size"], end_offset - segment["base"]))
+                         for segment in segments.between(start, end) if segment["base"] < end_offset)
+            versions.append((generation, read, dead[month]))
+    return versions
+
+# Background writer that appends mood entries to the log so the Tk thread never waits on the disk
+class MoodJournal:
+    fsync_policies = ("always", "interval", "never")
+
+    def __init__(self, path="mood_log.txt", fsync_policy="interval", fsync_interval=1.0, max_batch=256,
+                 max_pending=10000):
+        if fsync_policy not in self.fsync_policies:
+            raise ValueError(f"fsync_policy must be one of {', '.join(self.fsync_policies)}")
+        self.path = path
+        self.fsync_policy = fsync_policy  # "always" syncs every batch, "interval" at most every fsync_interval seconds
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch  # Most queued jobs written together in one commit
+        # Bulk writers block once this many jobs are waiting instead of queueing the whole import in memory
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.end_offset = 0  # Size of the log once every queued entry is written
+        self.unwritten = b""  # Entries from a failed write, retried with the next batch
+        self.last_sync = 0.0
+        self.segments = None  # LogSegments the entries are written to
+        self.thread = None
+
+    def start(self):
+        """Split an old single-file log into segments, recover it after a crash and start the writer thread"""
+        LogCompactor.recover(self.path)
+        migrate_to_segments(self.path)
+        self.segments = get_log_segments(self.path)
+        if self.segments.segments and self.recover(self.segments.segment_path(self.segments.segments[-1])):
+            self.segments.load()
+        self.end_offset = self.segments.size()
+        self.thread = threading.Thread(target=self.run, name="mood-journal", daemon=True)
+        self.thread.start()
+
+    def recover(self, segment_path):
+        """Finish or set aside an entry that was only partly written when the app last stopped.
+
+        Only the last segment is ever written to, so that is the one to check.
+        Returns True if the segment was changed.
+        """
+        if not os.path.exists(segment_path) or os.path.getsize(segment_path) == 0:
+            return False
+        with open(segment_path, "rb") as file:
+            file.seek(max(0, os.path.getsize(segment_path) - 2))
+            if file.read() == b"\n\n":
+                return False
+        
+        # Find the start of the last entry
+        last_entry_offset = None
+        for line_offset, line in iter_lines_reversed(segment_path):
+            if line.startswith(b"Date: "):
+                last_entry_offset = line_offset
+                break
+        if last_entry_offset is None:
+            return False
+        with open(segment_path, "rb") as file:
+            file.seek(last_entry_offset)
+            tail = file.read()
+        
+        header_line, _, rest = tail.partition(b"\n")
+        if entry_header_pattern.match(header_line.decode("utf-8", errors="replace")) and rest.startswith(b"Note: "):
+            # The note made it to disk - only the blank line after it is missing
+            with open(segment_path, "ab") as file:
+                file.write(b"\n" if tail.endswith(b"\n") else b"\n\n")
+            print(f"Recovered partially written mood entry in {segment_path}", file=sys.stderr)
+        else:
+            # Not enough of the entry to keep in the log - move it aside instead of dropping it
+            with open(self.path + ".partial", "ab") as file:
+                file.write(tail + b"\n")
+            with open(segment_path, "rb+") as file:
+                file.truncate(last_entry_offset)
+            print(f"Moved an incomplete mood entry to {self.path}.partial", file=sys.stderr)
+        return True
+
+    def append(self, record):
+        """Queue an encoded entry; returns the (start, end) byte offsets it will occupy"""
+        start_offset = self.end_offset
+        self.end_offset += len(record)
+        self.jobs.put(("write", record))
+        return start_offset, self.end_offset
+
+    def submit(self, function, *args):
+        """Run function(*args) on the writer thread once everything queued before it is written"""
+        self.jobs.put(("call", function, args))
+
+    def submit_batched(self, function, item):
+        """Like submit(), but the items of all the jobs for function in one batch go to a single function(items)"""
+        self.jobs.put(("batch", function, (item,)))
+
+    def submit_latest(self, function, *args):
+        """Like submit(), but of the jobs for function in one batch only the newest runs (for snapshots)"""
+        self.jobs.put(("latest", function, args))
+
+    def flush(self):
+        """Wait until every queued job has been handled"""
+        if self.thread and self.thread.is_alive():
+            self.jobs.join()
+
+    def close(self):
+        """Write everything still queued, sync it and stop the writer"""
+        if not self.thread or not self.thread.is_alive():
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        # Appends leave the manifest as it was - bring it up to date so the next start reads nothing
+        self.segments.save()
+
+    def write(self, data, force_sync=False):
+        data = self.unwritten + data
+        if not data:
+            return
+        try:
+            now = time.monotonic()
+            sync = (force_sync or self.fsync_policy == "always" or
+                    (self.fsync_policy == "interval" and now - self.last_sync >= self.fsync_interval))
+            self.segments.append(data, sync)
+            if sync:
+                self.last_sync = now
+            self.unwritten = b""
+        except Exception as e:
+            self.unwritten = data
+            print(f"Error saving mood log: {e}", file=sys.stderr)
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.jobs.get()]
+            # Group commit: take everything else that is already waiting
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            
+            pending = []
+            calls = []
+            for job in batch:
+                if job is None:
+                    running = False
+                elif job[0] == "write":
+                    pending.append(job[1])
+                else:
+                    calls.append(job)
+            # One write for every entry in the batch - anything that depends on the log (snapshots,
+            # indexes) runs after it, so a call between two saves doesn't split the batch
+            self.write(b"".join(pending), force_sync=not running)
+            self.run_calls(calls)
+            
+            for _ in batch:
+                self.jobs.task_done()
+
+    def run_calls(self, calls):
+        # Combined jobs run where the last of them was queued
+        last = {function: position for position, (kind, function, _) in enumerate(calls) if kind != "call"}
+        items = {}
+        for position, (kind, function, args) in enumerate(calls):
+            if kind == "batch":
+                items.setdefault(function, []).append(args[0])
+            if kind != "call" and last[function] != position:
+                continue
+            if kind == "batch":
+                args = (items.pop(function),)
+            try:
+                function(*args)
+            except Exception as e:
+                print(f"Error in mood journal job: {e}", file=sys.stderr)
+
+# Files kept next to a log that point into it by byte offset
+# (the last three belong to mood_analytics.py, mood_sync.py and mood_notes.py)
+offset_cache_suffixes = (".stats.json", ".search_index.txt", ".time_index.bin", ".time_index.json", ".records",
+                         ".analytics.npz", ".entry_ids.bin", ".notes")
+
+def fsync_folder(folder):
+    """Make renames and new files in a folder durable (not possible on Windows, where it is skipped)"""
+    try:
+        descriptor = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+# Rewrites the segments of a log without their dead entries, then swaps the result in
+class LogCompactor:
+    """Drop deleted and replaced entries once they make up dead_ratio of the log.
+
+    The new segments are written to <segments>.compact on a background thread
+    while the app keeps saving. Segments without dead entries are hard linked
+    instead of copied, and an edited entry's latest version is written where
+    the original was. finish() then adds whatever was saved in the meantime
+    and swaps the folders with two renames: until the first the old log is
+    untouched, and after it the new one is complete, so recover() can always
+    finish or undo a swap that a crash interrupted.
+    """
+    dead_ratio = 0.2
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.path = journal.path
+        self.folder = segment_folder(journal.path)
+        self.staging_folder = self.folder + ".compact"
+        self.old_folder = self.folder + ".old"
+        self.done = threading.Event()
+        self.staged = None  # LogSegments of the new folder once it is complete
+        self.end_offset = 0  # Size of the log that was rewritten
+        self.tombstone_count = 0  # Tombstones the rewrite already applied
+        # Where the shift between old and new offsets changes, as parallel sorted arrays
+        self.old_breaks = array("q")
+        self.new_breaks = array("q")
+        self.moved = {}  # Old offset of an entry written in another place -> its new offset
+
+    @classmethod
+    def needed(cls, segments):
+        return bool(segments.tombstones) and len(segments.tombstones) >= segments.entry_count() * cls.dead_ratio
+
+    @staticmethod
+    def recover(path):
+        """Finish or undo a swap a crash interrupted, and remove what a stopped compaction left behind"""
+        folder = segment_folder(path)
+        staging_folder, old_folder = folder + ".compact", folder + ".old"
+        if not os.path.isdir(folder) and os.path.isdir(old_folder):
+            # The old segments are only moved aside once the new ones are complete
+            os.replace(staging_folder if os.path.isdir(staging_folder) else old_folder, folder)
+            print(f"Recovered {folder} after an interrupted compaction", file=sys.stderr)
+        shutil.rmtree(staging_folder, ignore_errors=True)
+        shutil.rmtree(old_folder, ignore_errors=True)
+
+    def start(self):
+        """Run as a journal job, so everything saved before it is in the segments"""
+        segments = self.journal.segments
+        self.end_offset = segments.size()
+        self.tombstone_count = len(segments.tombstones)
+        threading.Thread(target=self.run, name="mood-compactor", daemon=True).start()
+
+    def run(self):
+        try:
+            self.staged = self.write_staging()
+        except Exception as e:
+            print(f"Error compacting mood log: {e}", file=sys.stderr)
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
+        self.done.set()
+
+    def write_staging(self):
+        segments = self.journal.segments
+        with segments.lock:
+            segment_list = [dict(segment) for segment in segments.segments if segment["base"] < self.end_offset]
+        dead = {tombstone.offset: tombstone for tombstone in segments.tombstones[:self.tombstone_count]}
+        replacements = {tombstone.replacement for tombstone in dead.values()}
+        # The latest version of an edited entry takes the place of the original, keeping the log in time order
+        placed = {}  # Offset of an original -> offset of the entry to write there instead
+        for offset, tombstone in dead.items():
+            if offset not in replacements:
+                latest = tombstone.replacement
+                while latest in dead:
+                    latest = dead[latest].replacement
+                if latest is not None:
+                    placed[offset] = latest
+        skipped = set(dead) | set(placed.values())
+        changed = sorted(skipped)
+
+        shutil.rmtree(self.staging_folder, ignore_errors=True)
+        os.makedirs(self.staging_folder)
+        linked = []  # Manifest entries of the segments that are unchanged
+        new_base = 0
+        for segment in segment_list:
+            start = segment["base"]
+            stop = min(start + segment["size"], self.end_offset)
+            source = os.path.join(self.folder, segment["name"])
+            target = os.path.join(self.staging_folder, segment["name"])
+            self.old_breaks.append(start)
+            self.new_breaks.append(new_base)
+            if stop < self.end_offset and bisect_left(changed, start) == bisect_left(changed, stop):
+                # Only the last segment is ever appended to, so the others can be shared with the old folder
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+                linked.append(segment)
+                new_base += segment["size"]
+                continue
+
+            written = 0
+            with open(source, "rb") as file, open(target, "wb") as output:
+                starts = [entry.offset for entry in iter_mood_entries(source, end=stop - start)]
+                written += output.write(file.read(starts[0] if starts else stop - start))
+                for i, relative in enumerate(starts):
+                    end = starts[i + 1] if i + 1 < len(starts) else stop - start
+                    data = file.read(end - relative)
+                    offset = start + relative
+                    if offset in placed:
+                        self.moved[placed[offset]] = new_base + written
+                        data = self.read_record(placed[offset])
+                    elif offset in skipped:
+                        data = b""
+                    else:
+                        written += output.write(data)
+                        continue
+                    written += output.write(data)
+                    # The entries after this one move by a different amount
+                    self.old_breaks.append(start + end)
+                    self.new_breaks.append(new_base + written)
+                output.flush()
+                os.fsync(output.fileno())
+            if not written:
+                os.remove(target)
+            new_base += written
+        self.old_breaks.append(self.end_offset)
+        self.new_breaks.append(new_base)
+
+        staged = LogSegments(self.path, self.staging_folder)
+        staged.segments = linked
+        staged.generation = segments.generation + 1
+        # Saved first so that loading only has to scan the rewritten segments
+        staged.save()
+        staged.load()
+        return staged
+
+    def read_record(self, offset):
+        """The bytes of the entry at an offset of the old log, up to the next entry"""
+        entries = iter_mood_entries(self.path, start=offset, end=self.end_offset, include_dead=True)
+        try:
+            next(entries, None)
+            following = next(entries, None)
+        finally:
+            entries.close()
+        with open_log(self.path) as file:
+            file.seek(offset)
+            return file.read((following.offset if following else self.end_offset) - offset)
+
+    def new_offset(self, offset):
+        """Where an entry of the old log (or one saved during the rewrite) is in the new one"""
+        if offset in self.moved:
+            return self.moved[offset]
+        i = bisect_right(self.old_breaks, offset) - 1
+        return self.new_breaks[i] + offset - self.old_breaks[i]
+
+    def finish(self):
+        """Swap the new segments in - on the thread that owns the log, once the journal is flushed.
+
+        Returns True if the log was replaced; a failed swap leaves the old log in place.
+        """
+        staged, self.staged = self.staged, None
+        if staged is None:
+            return False
+        segments = self.journal.segments
+        try:
+            size = segments.size()
+            if size > self.end_offset:
+                # Entries saved while the rewrite was running
+                with open_log(self.path) as file:
+                    file.seek(self.end_offset)
+                    staged.append(file.read(size - self.end_offset), sync=True)
+                staged.save()
+            late = [tombstone._replace(offset=self.new_offset(tombstone.offset),
+                                       replacement=None if tombstone.replacement is None
+                                       else self.new_offset(tombstone.replacement))
+                    for tombstone in segments.tombstones[self.tombstone_count:]]
+            if late:
+                staged.add_tombstones(late, sync=True)
+            fsync_folder(self.staging_folder)
+            # Nothing built from the old offsets may outlive the old segments
+            for suffix in offset_cache_suffixes:
+                cache_path = os.path.splitext(self.path)[0] + suffix
+                if os.path.isdir(cache_path):
+                    shutil.rmtree(cache_path)
+                elif os.path.exists(cache_path):
+                    os.remove(cache_path)
+            shutil.rmtree(self.old_folder, ignore_errors=True)
+            os.replace(self.folder, self.old_folder)
+            try:
+                os.replace(self.staging_folder, self.folder)
+            except OSError:
+                os.replace(self.old_folder, self.folder)
+                raise
+        except Exception as e:
+            print(f"Error compacting mood log: {e}", file=sys.stderr)
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
+            return False
+        fsync_folder(os.path.dirname(os.path.abspath(self.folder)))
+        shutil.rmtree(self.old_folder, ignore_errors=True)
+        segments.load()
+        self.journal.end_offset = segments.size() + len(self.journal.unwritten)
+        print(f"Compacted {self.path}: {self.end_offset - self.new_offset(self.end_offset)} bytes of dead entries removed",
+              file=sys.stderr)
+        return True
+
+def log_offset_is_boundary(path, offset):
+    """Check that a saved byte offset still falls between two entries of the log"""
+    if not log_exists(path):
+        return offset == 0
+    size = log_size(path)
+    if offset > size:
+        return False
+    if offset == size:
+        return True
+    # A new entry must begin exactly at the offset
+    with open_log(path) as file:
+        file.seek(offset)
+        return file.read(6) == b"Date: "
+
+# Running statistics that are updated on every save and persisted next to the log
+class MoodStats:
+    recent_days = 7  # Size of the "Last 7 Days" window
+
+    def __init__(self, log_path="mood_log.txt"):
+        self.log_path = log_path
+        self.snapshot_path = os.path.splitext(log_path)[0] + ".stats.json"
+        self.reset()
+
+    def reset(self):
+        """Forget everything and start counting from the beginning of the log"""
+        self.offset = 0  # Byte offset in the log covered by these totals
+        self.total_entries = 0
+        self.mood_counts = Counter()
+        self.min_date = None
+        self.max_date = None
+        self.daily_counts = Counter()  # Only the last few days, for today / last 7 days
+        self.tombstones_applied = 0  # Dead entries taken back out of the totals
+        self.date_range_stale = False  # A dead entry was on the first or last date, which may have moved
+
+    def add(self, entry):
+        """Fold a single entry into the totals"""
+        date = entry.timestamp.date()
+        self.total_entries += 1
+        self.mood_counts[entry.mood] += 1
+        if self.min_date is None or date < self.min_date:
+            self.min_date = date
+        if self.max_date is None or date > self.max_date:
+            self.max_date = date
+        if date >= self.window_start():
+            self.daily_counts[date] += 1
+            if len(self.daily_counts) > self.recent_days + 1:
+                self.prune()
+
+    def remove(self, timestamp, mood):
+        """Take a deleted or replaced entry back out of the totals"""
+        date = timestamp.date()
+        self.total_entries -= 1
+        self.mood_counts[mood] -= 1
+        if self.mood_counts[mood] <= 0:
+            del self.mood_counts[mood]
+        if self.daily_counts.get(date):
+            self.daily_counts[date] -= 1
+        if date in (self.min_date, self.max_date):
+            self.date_range_stale = True
+
+    def window_start(self):
+        return datetime.now().date() - timedelta(days=self.recent_days)
+
+    def prune(self):
+        """Drop daily counts that have slid out of the recent window"""
+        cutoff = self.window_start()
+        for date in [date for date in self.daily_counts if date < cutoff]:
+            del self.daily_counts[date]
+
+    def today_count(self):
+        return self.daily_counts.get(datetime.now().date(), 0)
+
+    def recent_count(self):
+        self.prune()
+        return sum(self.daily_counts.values())
+
+    def load(self):
+        """Load the saved snapshot and replay only the entries written after it"""
+        self.reset()
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                if log_offset_is_boundary(self.log_path, data["offset"]):
+                    self.offset = data["offset"]
+                    self.total_entries = data["total_entries"]
+                    self.mood_counts = Counter(data["mood_counts"])
+                    if data["min_date"]:
+                        self.min_date = datetime.strptime(data["min_date"], "%Y-%m-%d").date()
+                        self.max_date = datetime.strptime(data["max_date"], "%Y-%m-%d").date()
+                    self.daily_counts = Counter({datetime.strptime(date, "%Y-%m-%d").date(): count
+                                                 for date, count in data["daily_counts"].items()})
+                    self.tombstones_applied = data.get("tombstones", 0)
+                else:
+                    print("Statistics snapshot is out of date, rebuilding from the mood log", file=sys.stderr)
+        except Exception as e:
+            print(f"Error loading statistics snapshot: {e}", file=sys.stderr)
+            self.reset()
+
+        start = (self.offset, self.tombstones_applied)
+        self.refresh()
+        if (self.offset, self.tombstones_applied) != start:
+            self.save()
+
+    def refresh(self):
+        """Replay entries appended to the log since the last update, then take out newly dead ones"""
+        if not log_exists(self.log_path):
+            return
+        end_offset = log_size(self.log_path)
+        if end_offset < self.offset:
+            # The log was truncated or replaced - start over
+            self.reset()
+        segments = get_log_segments(self.log_path)
+        if end_offset > self.offset:
+            if self.offset == 0 and segments is not None:
+                self.rebuild(segments)
+            if end_offset > self.offset:
+                # Dead entries are counted here and taken out again below, like the ones in the manifest totals
+                for entry in iter_mood_entries(self.log_path, start=self.offset, end=end_offset, include_dead=True):
+                    self.add(entry)
+                self.offset = end_offset
+        if segments is not None:
+            for tombstone in segments.tombstones[self.tombstones_applied:]:
+                self.remove(tombstone.timestamp, tombstone.mood)
+                self.tombstones_applied += 1
+            if self.date_range_stale:
+                self.find_date_range(segments)
+
+    def find_date_range(self, segments):
+        """Look up the first and last date again, reading only the segments that can hold them"""
+        dead = segments.dead
+        with segments.lock:
+            listing = [segment for segment in segments.segments if segment["count"]]
+        first = last = None  # "YYYY-MM-DD HH:MM:SS" of the first and last live entry
+        for segment in sorted(listing, key=lambda segment: segment["first"]):
+            if first is not None and first <= segment["first"]:
+                break
+            times = [entry.timestamp.strftime("%Y-%m-%d %H:%M:%S") for entry in iter_mood_entries(segments.segment_path(segment))
+                     if segment["base"] + entry.offset not in dead]
+            if times:
+                first = min(times + [first] if first else times)
+        for segment in sorted(listing, key=lambda segment: segment["last"], reverse=True):
+            if last is not None and last >= segment["last"]:
+                break
+            times = [entry.timestamp.strftime("%Y-%m-%d %H:%M:%S") for entry in iter_mood_entries(segments.segment_path(segment))
+                     if segment["base"] + entry.offset not in dead]
+            if times:
+                last = max(times + [last] if last else times)
+        self.min_date = datetime.strptime(first[:10], "%Y-%m-%d").date() if first else None
+        self.max_date = datetime.strptime(last[:10], "%Y-%m-%d").date() if last else None
+        self.date_range_stale = False
+
+    def rebuild(self, segments):
+        """Take the totals from the segment manifest and read only the segments of the recent window"""
+        with segments.lock:
+            for segment in segments.segments:
+                if segment["count"]:
+                    self.total_entries += segment["count"]
+                    self.mood_counts.update(segment["moods"])
+                    first = datetime.strptime(segment["first"], "%Y-%m-%d %H:%M:%S").date()
+                    last = datetime.strptime(segment["last"], "%Y-%m-%d %H:%M:%S").date()
+                    self.min_date = first if self.min_date is None else min(self.min_date, first)
+                    self.max_date = last if self.max_date is None else max(self.max_date, last)
+            if segments.segments:
+                self.offset = segments.segments[-1]["base"] + segments.segments[-1]["size"]
+        window_start = datetime.combine(self.window_start(), datetime.min.time())
+        for entry in iter_mood_entries_between(self.log_path, start=window_start, include_dead=True):
+            if entry.offset < self.offset:
+                self.daily_counts[entry.timestamp.date()] += 1
+
+    def record(self, entry, start_offset, end_offset):
+        """Account for an entry that save_mood_log() just appended"""
+        if start_offset == self.offset:
+            self.add(entry)
+            self.offset = end_offset
+        else:
+            # Something else wrote to the log in between - catch up from disk
+            self.refresh()
+
+    def snapshot_data(self):
+        return {
+            "offset": self.offset,
+            "total_entries": self.total_entries,
+            "mood_counts": dict(self.mood_counts),
+            "min_date": self.min_date.strftime("%Y-%m-%d") if self.min_date else None,
+            "max_date": self.max_date.strftime("%Y-%m-%d") if self.max_date else None,
+            "daily_counts": {date.strftime("%Y-%m-%d"): count for date, count in self.daily_counts.items()},
+            "tombstones": self.tombstones_applied,
+        }
+
+    def save(self, data=None):
+        """Write the snapshot atomically so a crash never leaves it half written.
+
+        data comes from snapshot_data(); it is taken up front when the write
+        happens on another thread.
+        """
+        if data is None:
+            data = self.snapshot_data()
+        try:
+            temp_path = self.snapshot_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Error saving statistics snapshot: {e}", file=sys.stderr)
+
+# Pattern for the words that make up a note
+search_term_pattern = re.compile(r"\w+")
+
+# Inverted index from note words to the entries that contain them, persisted next to the log
+class NoteSearchIndex:
+    result_limit = 500  # Most matches a single search returns
+
+    def __init__(self, log_path="mood_log.txt"):
+        self.log_path = log_path
+        self.index_path = os.path.splitext(log_path)[0] + ".search_index.txt"
+        self.loaded = False
+        self.reset()
+
+    def reset(self):
+        self.offset = 0  # Byte offset in the log covered by the index
+        # Packed arrays rather than lists of ints - a few bytes per posting instead of dozens
+        self.postings = {}  # word -> entry offsets, oldest first
+        self.mood_postings = {}  # lowercase mood -> entry offsets, oldest first
+        self.sorted_terms = None  # Sorted words for prefix lookups, rebuilt when stale
+
+    def add(self, offset, mood, terms):
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("q")
+            postings.append(offset)
+        postings = self.mood_postings.get(mood.lower())
+        if postings is None:
+            postings = self.mood_postings[mood.lower()] = array("q")
+        postings.append(offset)
+        self.sorted_terms = None
+
+    def ensure_loaded(self):
+        """Read the index file the first time it is needed and index any new entries"""
+        if self.loaded:
+            return
+        self.loaded = True
+        self.reset()
+        try:
+            if os.path.exists(self.index_path):
+                # One line per entry: offset, end offset, mood and its distinct words
+                with open(self.index_path, "r", encoding="utf-8") as file:
+                    for line in file:
+                        fields = line.rstrip("\n").split("\t")
+                        if len(fields) != 4:
+                            continue
+                        self.add(int(fields[0]), fields[2], fields[3].split())
+                        self.offset = int(fields[1])
+                if not log_offset_is_boundary(self.log_path, self.offset):
+                    print("Search index is out of date, rebuilding from the mood log", file=sys.stderr)
+                    self.reset()
+                    os.remove(self.index_path)
+        except Exception as e:
+            print(f"Error loading search index: {e}", file=sys.stderr)
+            self.reset()
+        self.refresh()
+
+    def refresh(self):
+        """Index entries appended to the log since the last update"""
+        if not log_exists(self.log_path):
+            return
+        end_offset = log_size(self.log_path)
+        if end_offset < self.offset:
+            # The log was truncated or replaced - start over
+            self.reset()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        if end_offset == self.offset:
+            return
+        # Dead entries are indexed too - search() leaves them out, as they can die after being indexed
+        entries = iter_mood_entries(self.log_path, start=self.offset, end=end_offset, include_dead=True)
+        self.append_entries(entries, end_offset)
+
+    def append_entries(self, entries, end_offset):
+        """Add entries to memory and to the index file; end_offset is where the last one ends"""
+        try:
+            with open(self.index_path, "a", encoding="utf-8") as file:
+                previous = None
+                for entry in entries:
+                    if previous:
+                        file.write(self.index_entry(previous, entry.offset))
+                    previous = entry
+                if previous:
+                    file.write(self.index_entry(previous, end_offset))
+            self.offset = end_offset
+        except Exception as e:
+            print(f"Error updating search index: {e}", file=sys.stderr)
+
+    def index_entry(self, entry, end_offset):
+        """Add an entry to the in-memory index and return its line for the index file"""
+        terms = sorted(set(search_term_pattern.findall(entry.note.lower())))
+        self.add(entry.offset, entry.mood, terms)
+        return f"{entry.offset}\t{end_offset}\t{entry.mood}\t{' '.join(terms)}\n"
+
+    def write_lines(self, lines):
+        try:
+            with open(self.index_path, "a", encoding="utf-8") as file:
+                file.writelines(lines)
+        except Exception as e:
+            print(f"Error updating search index: {e}", file=sys.stderr)
+
+    def record(self, entry, start_offset, end_offset):
+        """Index an entry that save_mood_log() just appended.
+
+        Returns the lines still to be written to the index file, so the caller
+        can write them off the Tk thread with write_lines().
+        """
+        if not self.loaded:
+            # Picked up from the log the first time the index is used
+            return []
+        if start_offset == self.offset:
+            self.offset = end_offset
+            return [self.index_entry(entry, end_offset)]
+        self.refresh()
+        return []
+
+    def prefix_postings(self, prefix):
+        """Offsets of entries containing any word that starts with prefix"""
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.postings)
+        offsets = set()
+        position = bisect_left(self.sorted_terms, prefix)
+        while position < len(self.sorted_terms) and self.sorted_terms[position].startswith(prefix):
+            offsets.update(self.postings[self.sorted_terms[position]])
+            position += 1
+        return offsets
+
+    def search(self, query, allowed=None):
+        """Return entry offsets matching every part of the query, newest first.
+
+        Words must all appear in the note, "word*" matches any word starting
+        with "word", and "mood:joy" keeps only entries logged with that mood.
+        allowed is an optional set of offsets the results must come from.
+        """
+        self.ensure_loaded()
+        self.refresh()
+        matches = None
+        for part in query.lower().split():
+            if part.startswith("mood:"):
+                offsets = set(self.mood_postings.get(part[len("mood:"):], ()))
+            elif part.endswith("*"):
+                prefix = part.rstrip("*")
+                if not prefix:
+                    continue
+                offsets = self.prefix_postings(prefix)
+            else:
+                offsets = None
+                for term in search_term_pattern.findall(part):
+                    term_offsets = set(self.postings.get(term, ()))
+                    offsets = term_offsets if offsets is None else offsets & term_offsets
+                if offsets is None:
+                    continue
+            matches = offsets if matches is None else matches & offsets
+            if not matches:
+                return []
+        if matches is None:
+            return []
+        if allowed is not None:
+            matches &= allowed
+        dead = dead_entries(self.log_path)
+        return sorted((offset for offset in matches if offset not in dead), reverse=True)[:self.result_limit]
+
+# Search filters for a date range: "date:2024-03" (a year, month or day), "from:2024-01-15", "to:2024-06"
+date_filter_pattern = re.compile(r"(date|from|to):(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?$")
+
+def date_filter_bounds(year, month=None, day=None):
+    """First and last second of a year, month or day"""
+    if day:
+        start = datetime(year, month, day)
+        end = start + timedelta(days=1)
+    elif month:
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+    else:
+        start = datetime(year, 1, 1)
+        end = datetime(year + 1, 1, 1)
+    return start, end - timedelta(seconds=1)
+
+def parse_mood_query(query):
+    """Split a query into its text parts (words and "mood:" filters), moods and date range.
+
+    Returns (text parts, lowercase moods, start, end); start and end are
+    datetimes or None. Raises ValueError for a date that doesn't exist.
+    """
+    text_parts, moods = [], []
+    start = end = None
+    for part in query.lower().split():
+        match = date_filter_pattern.match(part)
+        if match:
+            kind, year, month, day = match.groups()
+            try:
+                first, last = date_filter_bounds(int(year), month and int(month), day and int(day))
+            except ValueError:
+                raise ValueError(f"'{part}' is not a valid date") from None
+            if kind in ("date", "from"):
+                start = first if start is None else max(start, first)
+            if kind in ("date", "to"):
+                end = last if end is None else min(end, last)
+            continue
+        if part.startswith("mood:"):
+            moods.append(part[len("mood:"):])
+        text_parts.append(part)
+    return text_parts, moods, start, end
+
+# Entry times are stored as whole seconds since 1970 (local time, like the log itself)
+index_epoch = datetime(1970, 1, 1)
+
+def to_index_time(timestamp):
+    return (timestamp - index_epoch) // timedelta(seconds=1)
+
+def from_index_time(seconds):
+    return index_epoch + timedelta(seconds=seconds)
+
+# Sorted (time, offset, mood) index of every entry, persisted next to the log
+class MoodTimeIndex:
+    record_format = struct.Struct("<qqB")  # Entry time, byte offset of the entry, mood code
+
+    def __init__(self, log_path="mood_log.txt"):
+        self.log_path = log_path
+        self.index_path = os.path.splitext(log_path)[0] + ".time_index.bin"
+        # Mood names for the codes, and whether the file is in time order - written before any record needs them
+        self.info_path = os.path.splitext(log_path)[0] + ".time_index.json"
+        self.loaded = False
+        self.loader = None  # Thread loading the index in the background, see usable()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0  # Byte offset in the log covered by the index
+        # Parallel arrays sorted by entry time
+        self.times = array("q")
+        self.offsets = array("q")
+        self.moods = array("B")
+        self.mood_names = []
+        self.in_order = True  # The index file is sorted by time
+        self.last_offset = None  # Offset of the entry written last, where catching up resumes
+
+    @staticmethod
+    def column(data, start, width, record_size):
+        """Gather one fixed-width field of every record into contiguous bytes"""
+        count = len(data) // record_size
+        column = bytearray(width * count)
+        for byte in range(width):
+            column[byte::width] = data[start + byte::record_size]
+        return column
+
+    def ensure_loaded(self):
+        """Read the index file the first time it is needed and index any new entries"""
+        if self.loaded:
+            return
+        if self.loader is not None:
+            # Already being loaded in the background
+            self.loader.join()
+        else:
+            self.load()
+        self.loaded = True
+        self.refresh()
+
+    def usable(self, end_offset):
+        """Whether the index is loaded; starts loading it on a background thread the first time.
+
+        The thread reads the log up to end_offset (its size after a flush) and
+        the rest is indexed here once it is done. Until then record() leaves
+        new entries to that catch-up, so only one thread touches the index.
+        """
+        if self.loaded:
+            return True
+        if self.loader is None:
+            self.loader = threading.Thread(target=self.load, args=(end_offset,), name="mood-time-index", daemon=True)
+            self.loader.start()
+            return False
+        if self.loader.is_alive():
+            return False
+        self.ensure_loaded()
+        return True
+
+    def loading(self):
+        return self.loader is not None and self.loader.is_alive()
+
+    def load(self, end_offset=None):
+        """Read the index file (or start it over) and index the log up to end_offset"""
+        self.reset()
+        try:
+            if os.path.exists(self.index_path) and os.path.exists(self.info_path):
+                with open(self.info_path, "r", encoding="utf-8") as file:
+                    info = json.load(file)
+                with open(self.index_path, "rb") as file:
+                    data = file.read()
+                size = self.record_format.size
+                data = data[:len(data) - len(data) % size]
+                times = array("q", self.column(data, 0, 8, size))
+                offsets = array("q", self.column(data, 8, 8, size))
+                if sys.byteorder == "big":
+                    times.byteswap()
+                    offsets.byteswap()
+                moods = array("B", data[16::size])
+                self.mood_names = info["moods"]
+                self.in_order = info["in_order"]
+                if offsets and (max(moods) >= len(self.mood_names) or
+                                not log_offset_is_boundary(self.log_path, offsets[-1])):
+                    raise ValueError("it does not match the mood log")
+                if offsets:
+                    self.last_offset = offsets[-1]
+                if not self.in_order:
+                    # Entries were logged out of time order at some point - sort once in memory
+                    order = sorted(range(len(times)), key=times.__getitem__)
+                    times = array("q", (times[i] for i in order))
+                    offsets = array("q", (offsets[i] for i in order))
+                    moods = array("B", (moods[i] for i in order))
+                self.times, self.offsets, self.moods = times, offsets, moods
+        except Exception as e:
+            print(f"Rebuilding the time index ({e})", file=sys.stderr)
+            self.reset()
+            for path in (self.index_path, self.info_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.refresh(end_offset)
+
+    def refresh(self, end_offset=None):
+        """Index entries appended to the log since the last update (up to end_offset if given)"""
+        if not log_exists(self.log_path):
+            return
+        if end_offset is None:
+            end_offset = log_size(self.log_path)
+        if self.last_offset is not None and self.offset == 0:
+            # Just loaded: pick up after the last indexed entry
+            entries = iter_mood_entries(self.log_path, start=self.last_offset, end=end_offset, include_dead=True)
+            next(entries, None)
+        elif end_offset < self.offset:
+            # The log was truncated or replaced - start over
+            self.reset()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            entries = iter_mood_entries(self.log_path, end=end_offset, include_dead=True)
+        elif end_offset == self.offset:
+            return
+        else:
+            # Dead entries stay in the index - the queries below skip them
+            entries = iter_mood_entries(self.log_path, start=self.offset, end=end_offset, include_dead=True)
+        records = []
+        info = None
+        for entry in entries:
+            record, entry_info = self.index_entry(entry)
+            records.append(record)
+            info = entry_info or info
+        self.write_records(b"".join(records), info)
+        self.offset = end_offset
+
+    def index_entry(self, entry):
+        """Add an entry to the in-memory index.
+
+        Returns its record for the index file, and the new contents of the
+        info file if they changed (None otherwise).
+        """
+        info = None
+        if entry.mood not in self.mood_names:
+            self.mood_names.append(entry.mood)
+            info = True
+        code = self.mood_names.index(entry.mood)
+        seconds = to_index_time(entry.timestamp)
+        if self.times and seconds < self.times[-1]:
+            # Logged out of order - keep the arrays sorted
+            position = bisect_right(self.times, seconds)
+            self.times.insert(position, seconds)
+            self.offsets.insert(position, entry.offset)
+            self.moods.insert(position, code)
+            if self.in_order:
+                self.in_order = False
+                info = True
+        else:
+            self.times.append(seconds)
+            self.offsets.append(entry.offset)
+            self.moods.append(code)
+        self.last_offset = entry.offset
+        if info:
+            info = {"moods": list(self.mood_names), "in_order": self.in_order}
+        return self.record_format.pack(seconds, entry.offset, code), info
+
+    def write_records(self, data, info=None):
+        """Append records to the index file, after saving the info they rely on"""
+        try:
+            if info or not os.path.exists(self.info_path):
+                info = info or {"moods": list(self.mood_names), "in_order": self.in_order}
+                temp_path = self.info_path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump(info, file)
+                os.replace(temp_path, self.info_path)
+            if data:
+                with open(self.index_path, "ab") as file:
+                    file.write(data)
+        except Exception as e:
+            print(f"Error updating time index: {e}", file=sys.stderr)
+
+    def write_record_batch(self, records):
+        """write_records() for several (record, info) pairs at once"""
+        infos = [info for _, info in records if info]
+        self.write_records(b"".join(record for record, _ in records), infos[-1] if infos else None)
+
+    def record(self, entry, start_offset, end_offset):
+        """Index an entry that save_mood_log() just appended.
+
+        Returns (record, info) to pass to write_records() off the Tk thread,
+        or None when there is nothing to write.
+        """
+        if not self.loaded:
+            # Picked up from the log the first time the index is used
+            return None
+        if start_offset == self.offset:
+            self.offset = end_offset
+            return self.index_entry(entry)
+        self.refresh()
+        return None
+
+    def position_range(self, start=None, end=None):
+        """Positions lo:hi of the entries from start to end - two binary searches"""
+        self.ensure_loaded()
+        self.refresh()
+        lo = bisect_left(self.times, to_index_time(start)) if start else 0
+        hi = bisect_right(self.times, to_index_time(end)) if end else len(self.times)
+        return lo, max(lo, hi)
+
+    def mood_code(self, mood):
+        for code, name in enumerate(self.mood_names):
+            if name.lower() == mood.lower():
+                return code
+        return None
+
+    def offsets_between(self, start=None, end=None, mood=None, newest_first=True):
+        """Yield the offsets of entries from start to end (optionally of one mood), newest first"""
+        lo, hi = self.position_range(start, end)
+        code = None
+        if mood is not None:
+            code = self.mood_code(mood)
+            if code is None:
+                return
+        positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+        offsets, moods = self.offsets, self.moods
+        dead = dead_entries(self.log_path)
+        for position in positions:
+            if (code is None or moods[position] == code) and offsets[position] not in dead:
+                yield offsets[position]
+
+    def summary(self, start=None, end=None, moods=None):
+        """(entry count, Counter of moods, first time, last time) for the entries from start to end.
+
+        With moods (names, any case) only entries of those moods are counted
+        and bound the first and last time.
+        """
+        lo, hi = self.position_range(start, end)
+        wanted = None
+        if moods:
+            wanted = {code for code in map(self.mood_code, moods) if code is not None}
+            if not wanted:
+                return 0, Counter(), None, None
+        codes = Counter(self.moods[lo:hi])
+        if wanted is not None:
+            codes = Counter({code: count for code, count in codes.items() if code in wanted})
+        mood_counts = Counter({self.mood_names[code]: count for code, count in codes.items()})
+        count = sum(codes.values())
+        segments = get_log_segments(self.log_path)
+        dead = segments.dead if segments is not None else {}
+        if segments is not None and segments.tombstones:
+            # Take the dead entries in the range back out (they are skipped at both ends below)
+            for tombstone in segments.tombstones:
+                if ((start is None or tombstone.timestamp >= start) and (end is None or tombstone.timestamp <= end) and
+                        (wanted is None or self.mood_code(tombstone.mood) in wanted)):
+                    count -= 1
+                    mood_counts[tombstone.mood] -= 1
+            mood_counts = +mood_counts
+        
+        def counted(position):
+            return self.offsets[position] not in dead and (wanted is None or self.moods[position] in wanted)
+        while lo < hi and not counted(lo):
+            lo += 1
+        while hi > lo and not counted(hi - 1):
+            hi -= 1
+        if count <= 0 or lo == hi:
+            return 0, Counter(), None, None
+        return count, mood_counts, from_index_time(self.times[lo]), from_index_time(self.times[hi - 1])
+
+# Function to read the entry that starts at a byte offset of the log
+def read_mood_entry_at(offset, path="mood_log.txt"):
+    """Read a single entry by seeking straight to it (None if it was deleted or replaced)"""
+    if offset in dead_entries(path):
+        return None
+    entries = iter_mood_entries(path, start=offset, include_dead=True)
+    try:
+        return next(entries, None)
+    finally:
+        entries.close()
+
+# Entries of a log as packed columns in log order, kept in a folder next to the log.
+# times.bin, offsets.bin and note_ends.bin hold little-endian int64s, moods.bin one
+# byte per entry (codes in mood_order first, other names in info.json) and notes.bin
+# the UTF-8 notes back to back, note_ends.bin being its offset table. The files are
+# read through mmap, so a long log costs only the pages that are looked at, and a
+# note is decoded only when its entry is shown.
+class MoodRecordStore:
+    column_codes = {"times": "q", "offsets": "q", "note_ends": "q", "moods": "B"}
+    build_chunk = 10000  # Entries written at a time while catching up with the log
+
+    def __init__(self, log_path="mood_log.txt", journal=None):
+        self.log_path = log_path
+        self.journal = journal  # MoodJournal writing the log, if any - the catch-up finishes on its thread
+        self.folder = os.path.splitext(log_path)[0] + ".records"
+        self.info_path = os.path.join(self.folder, "info.json")
+        self.lock = threading.Lock()  # Held while the files are written after the store is ready
+        self.ready = False  # Caught up with the log - until then readers use the text log
+        self.builder = None
+        self.stopping = False
+        self.maps = []
+        self.views = None  # name -> memoryview of the mapped files, covering mapped_count entries
+        self.mapped_count = 0
+        self.offset = 0  # Byte offset in the log covered by the store
+        self.count = 0  # Entries in the files
+        self.notes_size = 0
+        self.generation = 0
+        self.mood_names = [mood.capitalize() for mood in mood_order]
+
+    def file_path(self, name):
+        return os.path.join(self.folder, name + ".bin")
+
+    def usable(self):
+        """Whether readers can use the store now; starts building it in the background the first time"""
+        if not self.ready:
+            if self.builder is None and not self.stopping:
+                self.builder = threading.Thread(target=self.build, name="mood-records", daemon=True)
+                self.builder.start()
+            return False
+        if log_size(self.log_path) != self.offset:
+            # Written by another program
+            with self.lock:
+                self.catch_up()
+        return self.ready
+
+    def build(self):
+        """Load the files (or start them over) and index the rest of the log - runs on the builder thread"""
+        resume = None
+        try:
+            resume = self.load()
+        except Exception as e:
+            print(f"Rebuilding the record store ({e})", file=sys.stderr)
+            resume = None
+        try:
+            if resume is None:
+                self.clear()
+            end_offset = log_size(self.log_path)
+            entries = iter_mood_entries(self.log_path, start=resume or 0, end=end_offset, include_dead=True)
+            if resume is not None:
+                next(entries, None)
+            chunk = []
+            for entry in entries:
+                if len(chunk) == self.build_chunk:
+                    if self.stopping:
+                        return
+                    # The chunk ends where this entry starts
+                    self.write_entries(chunk, entry.offset)
+                    chunk = []
+                chunk.append(entry)
+            self.write_entries(chunk, end_offset)
+        except Exception as e:
+            print(f"Error building the record store: {e}", file=sys.stderr)
+            return
+        if self.journal is not None:
+            # Entries queued meanwhile are written before this runs, and none is half written while it does
+            self.journal.submit(self.finish_build)
+        else:
+            self.finish_build()
+
+    def finish_build(self):
+        with self.lock:
+            if self.stopping:
+                return
+            self.ready = True
+            self.catch_up()
+
+    def load(self):
+        """Open existing files and cut them back to the last complete entry.
+
+        Returns the log offset of that entry to resume after, or None if the
+        files are missing or do not match the log.
+        """
+        if not os.path.exists(self.info_path):
+            return None
+        with open(self.info_path, "r", encoding="utf-8") as file:
+            info = json.load(file)
+        if info["generation"] != log_generation(self.log_path):
+            raise ValueError("the log was compacted since it was written")
+        self.generation = info["generation"]
+        self.mood_names = info["moods"]
+        # The columns are appended one after the other - a crash can leave some longer than others
+        count = min(os.path.getsize(self.file_path(name)) // array(code).itemsize
+                    for name, code in self.column_codes.items())
+        notes_size = os.path.getsize(self.file_path("notes"))
+        with open(self.file_path("note_ends"), "rb") as file:
+            while count:
+                file.seek((count - 1) * 8)
+                note_end, = struct.unpack("<q", file.read(8))
+                if note_end <= notes_size:
+                    break
+                count -= 1
+        for name, code in self.column_codes.items():
+            os.truncate(self.file_path(name), count * array(code).itemsize)
+        os.truncate(self.file_path("notes"), note_end if count else 0)
+        self.count, self.notes_size = count, note_end if count else 0
+        if not count:
+            return None
+        with self.lock:
+            views = self.mapped()
+        if max(views["moods"]) >= len(self.mood_names) or not log_offset_is_boundary(self.log_path, views["offsets"][-1]):
+            raise ValueError("it does not match the mood log")
+        self.offset = views["offsets"][-1]
+        return self.offset
+
+    def clear(self):
+        """Start with empty files"""
+        self.unmap()
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder)
+        for name in list(self.column_codes) + ["notes"]:
+            open(self.file_path(name), "wb").close()
+        self.offset = self.count = self.notes_size = 0
+        self.generation = log_generation(self.log_path)
+        self.mood_names = [mood.capitalize() for mood in mood_order]
+        self.save_info()
+
+    def save_info(self):
+        temp_path = self.info_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"generation": self.generation, "moods": self.mood_names}, file)
+        os.replace(temp_path, self.info_path)
+
+    def catch_up(self):
+        """Add entries another program appended to the log (with the lock held)"""
+        try:
+            end_offset = log_size(self.log_path)
+            if log_generation(self.log_path) != self.generation or end_offset < self.offset:
+                raise ValueError("the log was replaced")
+            if end_offset > self.offset:
+                self.write_entries(iter_mood_entries(self.log_path, start=self.offset, end=end_offset,
+                                                     include_dead=True), end_offset)
+        except Exception as e:
+            print(f"Record store is out of date, rebuilding it ({e})", file=sys.stderr)
+            self.ready = False
+            self.builder = None
+
+    def append_entries(self, saved):
+        """Add the (entry, start offset, end offset) of every entry in a journal batch - runs on the journal thread"""
+        with self.lock:
+            if not self.ready:
+                return
+            # Skip what the store already has (a build can finish in the middle of a batch)
+            saved = [item for item in saved if item[1] >= self.offset]
+            if not saved:
+                return
+            if saved[0][1] == self.offset and all(item[1] == previous[2] for previous, item in zip(saved, saved[1:])):
+                try:
+                    self.write_entries([entry for entry, _, _ in saved], saved[-1][2])
+                except Exception as e:
+                    print(f"Error updating the record store: {e}", file=sys.stderr)
+                    self.ready = False
+                    self.builder = None
+            else:
+                self.catch_up()
+
+    def write_entries(self, entries, end_offset):
+        """Append entries to the files; end_offset is where the last one ends in the log"""
+        columns = {name: array(code) for name, code in self.column_codes.items()}
+        notes = bytearray()
+        names_changed = False
+        for entry in entries:
+            if entry.mood not in self.mood_names:
+                if len(self.mood_names) > 255:
+                    raise ValueError("more moods than one-byte codes")
+                self.mood_names.append(entry.mood)
+                names_changed = True
+            notes += entry.note.encode("utf-8")
+            columns["times"].append(to_index_time(entry.timestamp))
+            columns["offsets"].append(entry.offset)
+            columns["note_ends"].append(self.notes_size + len(notes))
+            columns["moods"].append(self.mood_names.index(entry.mood))
+        if names_changed:
+            # Written before any code that needs it
+            self.save_info()
+        if len(columns["times"]):
+            # Notes first, so every note end on disk points at written bytes
+            with open(self.file_path("notes"), "ab") as file:
+                file.write(notes)
+            for name, column in columns.items():
+                if sys.byteorder == "big" and column.itemsize > 1:
+                    column.byteswap()
+                with open(self.file_path(name), "ab") as file:
+                    column.tofile(file)
+            self.count += len(columns["times"])
+            self.notes_size += len(notes)
+        self.offset = end_offset
+
+    def mapped(self):
+        """The views of the files, mapped again if entries were added since (with the lock held)"""
+        if self.views is None or self.mapped_count != self.count:
+            self.unmap()
+            views = {name: self.map_file(name, self.count * array(code).itemsize, code)
+                     for name, code in self.column_codes.items()}
+            views["notes"] = self.map_file("notes", self.notes_size, "B")
+            self.views, self.mapped_count = views, self.count
+        return self.views
+
+    def map_file(self, name, length, code):
+        if not length:
+            return memoryview(b"").cast(code)
+        with open(self.file_path(name), "rb") as file:
+            mapped = mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ)
+        if sys.byteorder == "big" and code != "B":
+            # The files are little-endian - swap a copy instead of reading the map directly
+            column = array(code, mapped)
+            column.byteswap()
+            mapped.close()
+            return memoryview(column)
+        self.maps.append(mapped)
+        return memoryview(mapped).cast(code)
+
+    def unmap(self):
+        self.views = None
+        self.mapped_count = 0
+        for mapped in self.maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # A reader still holds a slice - the map closes once it is let go
+        self.maps = []
+
+    def close(self):
+        """Stop the builder and let go of the files"""
+        self.stopping = True
+        if self.builder is not None and self.builder is not threading.current_thread():
+            self.builder.join()
+        with self.lock:
+            self.ready = False
+            self.unmap()
+
+    def entry(self, position, views):
+        """Decode the entry at a position - the only place a note becomes a string"""
+        note_ends = views["note_ends"]
+        start = note_ends[position - 1] if position else 0
+        note = str(views["notes"][start:note_ends[position]], "utf-8")
+        return MoodEntry(from_index_time(views["times"][position]), self.mood_names[views["moods"][position]],
+                         note, views["offsets"][position])
+
+    def entry_at(self, offset):
+        """The entry starting at a log offset, or None - one binary search over the offsets column"""
+        with self.lock:
+            views = self.mapped()
+        offsets = views["offsets"]
+        position = bisect_left(offsets, offset)
+        if position == len(offsets) or offsets[position] != offset:
+            return None
+        return self.entry(position, views)
+
+    def newest_entries(self):
+        """Every live entry, newest first, decoding each note only when it is reached"""
+        with self.lock:
+            views = self.mapped()
+        dead = dead_entries(self.log_path)
+        offsets = views["offsets"]
+        for position in range(len(offsets) - 1, -1, -1):
+            if offsets[position] not in dead:
+                yield self.entry(position, views)
+
+# One mood log file together with its background writer, statistics and search index
+class MoodLog:
+    def __init__(self, path="mood_log.txt", fsync_policy="interval"):
+        self.path = path
+        self.journal = MoodJournal(path, fsync_policy=fsync_policy)
+        self.stats = MoodStats(path)
+        self.search_index = NoteSearchIndex(path)
+        self.time_index = MoodTimeIndex(path)
+        self.records = MoodRecordStore(path, self.journal)
+        self.compactor = None  # LogCompactor started once enough entries are dead (kept after a failure)
+
+    def open(self):
+        """Recover any half-written entry, start the background writer and load the statistics snapshot"""
+        self.journal.start()
+        # Only entries written after the snapshot are read from the log
+        self.stats.load()
+
+    def close(self):
+        """Write everything still queued and stop the background writer"""
+        self.journal.close()
+        self.records.close()
+        if self.compactor and self.compactor.done.is_set():
+            self.compactor.finish()
+
+    def flush(self):
+        """Wait until queued entries are in the log, so it can be read.
+
+        Also where compaction happens: a finished one is swapped in (the log
+        is not being read or written right now) and a new one is started when
+        enough entries are dead. Call it from the thread that owns the log.
+        """
+        self.journal.flush()
+        if self.compactor is None:
+            if self.journal.segments is not None and LogCompactor.needed(self.journal.segments):
+                self.compactor = LogCompactor(self.journal)
+                self.journal.submit(self.compactor.start)
+        elif self.compactor.done.is_set() and self.compactor.staged is not None and not self.time_index.loading():
+            # Not while the time index loads in the background - it would write old offsets to the new files.
+            # The record store files are about to be deleted - let go of them first
+            self.records.close()
+            if self.compactor.finish():
+                self.compactor = None
+                self.reload()
+
+    def reload(self):
+        """Start the statistics and indexes over after a compaction moved every entry"""
+        self.stats = MoodStats(self.path)
+        self.stats.load()
+        self.search_index = NoteSearchIndex(self.path)
+        self.time_index = MoodTimeIndex(self.path)
+        self.records.close()
+        self.records = MoodRecordStore(self.path, self.journal)
+
+    def save(self, mood_name, note_text, timestamp=None, checkpoint=True):
+        """Append an entry and return it as a MoodEntry.
+
+        The entry is written in the background. With checkpoint=False the
+        statistics snapshot is not rewritten for this entry - bulk imports
+        call checkpoint() once at the end instead.
+        """
+        timestamp = (timestamp or datetime.now()).replace(microsecond=0)
+        date = timestamp.strftime("%Y-%m-%d")
+        time = timestamp.strftime("%H:%M:%S")
+        
+        record = f"Date: {date} Time: {time} Mood: {mood_name}\nNote: {note_text}\n\n"
+        start_offset, end_offset = self.journal.append(record.encode("utf-8"))
+        
+        # Keep the running statistics and search index in step with the log;
+        # their files are written by the journal after the entry itself
+        entry = MoodEntry(timestamp, mood_name, note_text, start_offset)
+        self.stats.record(entry, start_offset, end_offset)
+        if checkpoint:
+            self.checkpoint()
+        index_lines = self.search_index.record(entry, start_offset, end_offset)
+        for line in index_lines:
+            self.journal.submit_batched(self.search_index.write_lines, line)
+        time_record = self.time_index.record(entry, start_offset, end_offset)
+        if time_record:
+            self.journal.submit_batched(self.time_index.write_record_batch, time_record)
+        self.journal.submit_batched(self.records.append_entries, (entry, start_offset, end_offset))
+        return entry
+
+    def checkpoint(self):
+        """Queue a statistics snapshot covering everything saved so far"""
+        self.journal.submit_latest(self.stats.save, self.stats.snapshot_data())
+
+    def edit(self, offset, mood_name, note_text, generation=None):
+        """Replace the entry at a byte offset with a corrected one at the same time; returns the new MoodEntry.
+
+        The correction is appended like any entry and a tombstone hides the
+        original, so the cost does not depend on the size of the log. Pass the
+        log_generation() the offset was read under - a compaction in between
+        moves every entry, so the edit is refused instead of hitting another one.
+        """
+        entry = self.live_entry_at(offset, generation)
+        replacement = self.save(mood_name, note_text, entry.timestamp)
+        self.journal.submit(self.write_tombstone, Tombstone(offset, replacement.offset, entry.timestamp, entry.mood))
+        return replacement
+
+    def delete(self, offset, generation=None):
+        """Delete the entry at a byte offset by writing a tombstone for it (generation as for edit())"""
+        entry = self.live_entry_at(offset, generation)
+        self.journal.submit(self.write_tombstone, Tombstone(offset, None, entry.timestamp, entry.mood))
+
+    def live_entry_at(self, offset, generation=None):
+        self.flush()
+        if generation is not None and generation != log_generation(self.path):
+            raise ValueError("The log was compacted since that entry was read")
+        entry = read_mood_entry_at(offset, self.path)
+        if entry is None or entry.offset != offset:
+            raise ValueError("That entry was deleted or changed in the meantime")
+        return entry
+
+    def write_tombstone(self, tombstone):
+        # Runs on the journal thread, after the replacement entry is written
+        self.journal.segments.add_tombstones([tombstone], sync=self.journal.fsync_policy != "never")
+
+    def find_entries(self, query):
+        """Entries matching a search query, newest first.
+
+        Besides the words and mood filters of NoteSearchIndex.search(),
+        "date:2024-03" keeps a year, month or day and "from:"/"to:" bound
+        the range on one side.
+        """
+        offsets = self.find_offsets(query)
+        return (entry for entry in map(self.entry_at, offsets) if entry)
+
+    def find_offsets(self, query):
+        """Log offsets of the entries find_entries() returns, newest first (an empty query matches everything)"""
+        self.flush()
+        text_parts, moods, start, end = parse_mood_query(query)
+        if any(not part.startswith("mood:") for part in text_parts):
+            allowed = set(self.time_index.offsets_between(start, end)) if start or end else None
+            return self.search_index.search(" ".join(text_parts), allowed)
+        if len(set(moods)) > 1:
+            # An entry has only one mood
+            return []
+        # Only filters - walk the time index from the newest match, one seek per entry shown
+        return self.time_index.offsets_between(start, end, moods[0] if moods else None)
+
+    def entry_at(self, offset):
+        """The entry at a byte offset (None if it was deleted or replaced), from the record store once it is built"""
+        if self.records.usable():
+            return None if offset in dead_entries(self.path) else self.records.entry_at(offset)
+        return read_mood_entry_at(offset, self.path)
+
+    def newest_entries(self):
+        """Every entry, newest first.
+
+        Read backwards from the record store (or the end of the log while the
+        store is being built), or through the time index once an edit has
+        appended a corrected entry out of time order.
+        """
+        self.flush()
+        segments = self.journal.segments
+        if segments is not None and any(tombstone.replacement is not None for tombstone in segments.tombstones):
+            return self.find_entries("")
+        if self.records.usable():
+            return self.records.newest_entries()
+        return iter_mood_entries_reversed(self.path)
+
+    def history_text(self):
+        """All entries as text, newest first"""
+        content = '\n\n'.join(format_mood_entry(entry) for entry in self.newest_entries())
+        if not content:
+            return "No mood logs found. Start logging your moods!"
+        return content
+
+    def current_stats(self):
+        """The running statistics, caught up with the log (including entries still queued for writing)"""
+        self.flush()
+        # Pick up anything appended outside this app
+        self.stats.refresh()
+        return self.stats
+
+    def stats_text(self):
+        """The statistics page as text"""
+        mood_stats = self.current_stats()
+        if log_size(self.path) == 0:
+            return "No mood logs found. Start logging your moods!"
+        
+        # Read the running totals
+        total_entries = mood_stats.total_entries
+        
+        if not total_entries:
+            return "No valid mood entries found!"
+        
+        # Build statistics text
+        stats_text = "OVERVIEW:\n"
+        stats_text += f"Total Entries: {total_entries}\n"
+        stats_text += f"Today's Logs: {mood_stats.today_count()}\n"
+        stats_text += f"Last 7 Days: {mood_stats.recent_count()} entries\n\n"
+        
+        min_date = mood_stats.min_date
+        max_date = mood_stats.max_date
+        if min_date and max_date:
+            days_tracked = (max_date - min_date).days + 1
+            stats_text += f"DATE RANGE:\n"
+            stats_text += f"First Entry: {min_date.strftime('%Y-%m-%d')}\n"
+            stats_text += f"Latest Entry: {max_date.strftime('%Y-%m-%d')}\n"
+            stats_text += f"Days Tracked: {days_tracked}\n\n"
+        
+        stats_text += f"TOP 3 MOODS:\n"
+        for mood, count in mood_stats.mood_counts.most_common(3):
+            percentage = (count / total_entries) * 100
+            stats_text += f"{mood}: {count} times ({percentage:.1f}%)\n"
+        
+        return stats_text
+
+    def time_index_ready(self):
+        """Whether date filters can be answered without waiting; loads the time index in the background first"""
+        self.flush()
+        return self.time_index.usable(log_size(self.path))
+
+    def filtered_stats_text(self, query):
+        """The statistics page for the entries matching date and mood filters"""
+        self.flush()
+        text_parts, moods, start, end = parse_mood_query(query)
+        if any(not part.startswith("mood:") for part in text_parts):
+            return "Only date:, from:, to: and mood: filters work on the statistics page."
+        total_entries, mood_counts, first, last = self.time_index.summary(start, end, moods)
+        if not total_entries:
+            return f"No entries match '{query}'."
+        
+        stats_text = f"FILTER: {query}\n"
+        stats_text += f"Entries: {total_entries}\n"
+        stats_text += f"First Entry: {first.strftime('%Y-%m-%d')}\n"
+        stats_text += f"Latest Entry: {last.strftime('%Y-%m-%d')}\n"
+        stats_text += f"Days Tracked: {(last.date() - first.date()).days + 1}\n\n"
+        
+        if moods:
+            counts = {name.lower(): count for name, count in mood_counts.items()}
+            stats_text += "MOODS:\n"
+            for mood in dict.fromkeys(moods):
+                count = counts.get(mood, 0)
+                stats_text += f"{mood.capitalize()}: {count} times ({count / total_entries * 100:.1f}%)\n"
+        else:
+            stats_text += "TOP 3 MOODS:\n"
+            for mood, count in mood_counts.most_common(3):
+                stats_text += f"{mood}: {count} times ({count / total_entries * 100:.1f}%)\n"
+        return stats_text
+
+# The log used by save_mood_log(), load_mood_history() and calculate_mood_stats()
+default_mood_log = None
+
+def open_mood_log(path="mood_log.txt", fsync_policy="interval"):
+    """Open a mood log and make it the default one"""
+    global default_mood_log
+    if default_mood_log is not None:
+        default_mood_log.close()
+    default_mood_log = MoodLog(path, fsync_policy=fsync_policy)
+    default_mood_log.open()
+    # Flush queued entries even if the program exits without closing the log (e.g. Ctrl+C)
+    atexit.register(default_mood_log.close)
+    return default_mood_log
+
+def get_mood_log():
+    """Return the default mood log, opening mood_log.txt the first time"""
+    if default_mood_log is None:
+        open_mood_log()
+    return default_mood_log
+
+# Function to save mood log to file
+def save_mood_log(mood_name, note_text, timestamp=None):
+    """Save mood and note to a text file (written in the background)"""
+    try:
+        entry = get_mood_log().save(mood_name, note_text, timestamp)
+        print(f"Mood logged: {mood_name} with note: {note_text}")
+        return entry
+    except Exception as e:
+        print(f"Error saving mood log: {e}", file=sys.stderr)
+
+# Function to load mood history from file
+def load_mood_history():
+    """Load all mood logs from the text file with newest first"""
+    try:
+        return get_mood_log().history_text()
+    except Exception as e:
+        return f"Error loading mood history: {e}"
+
+# Function to calculate mood statistics
+def calculate_mood_stats():
+    """Calculate various mood statistics"""
+    try:
+        return get_mood_log().stats_text()
+    except Exception as e:
+        return f"Error calculating statistics: {e}"
@@ -0,0 +1,462 @@
+"""Delta sync of the mood log with a replica shared by several trackers.
+
+The replica is another mood log, either in a folder (a shared drive, a USB
+stick) or behind a socket:
+
+    python mood_sync.py serve --replica shared_moods --socket mood_sync.sock
+    MOOD_TRACKER_SYNC=mood_sync.sock python simple_code.py
+    python mood_cli.py sync shared_moods
+
+Each round sends the entries written after the last byte offset the replica
+acknowledged and fetches the replica's entries after the last offset read
+from it, so the work depends on the new entries only. Batches are packed
+(moods as small codes, times as integers) and zlib compressed. An entry's
+ID is a hash of its text, and both sides skip entries whose ID they already
+have, so a batch sent twice or an entry that went round through another
+tracker is stored once. The offsets are kept in <log>.sync.json and the IDs
+of every entry in <log>.entry_ids.bin.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import stat
+import struct
+import sys
+import threading
+import queue
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows - only one tracker at a time should use a replica folder
+
+from mood_storage import (MoodJournal, iter_mood_entries, format_mood_entry, log_size, log_offset_is_boundary,
+                          log_generation, to_index_time, from_index_time, MoodEntry)
+from mood_server import connect_socket
+
+max_batch_entries = 5000  # Most entries a replica sends back in one round
+
+# Function to give an entry an ID that is the same on every tracker
+def entry_id(entry):
+    return hashlib.blake2b(format_mood_entry(entry).encode("utf-8"), digest_size=12).digest()
+
+# Function to pack entries for sending
+def encode_batch(entries):
+    """Entries as a compressed batch: a table of moods, then time, mood code and note for each entry"""
+    moods = list(dict.fromkeys(entry.mood for entry in entries))
+    codes = {mood: code for code, mood in enumerate(moods)}
+    parts = [struct.pack("<IH", len(entries), len(moods))]
+    for mood in moods:
+        name = mood.encode("utf-8")
+        parts.append(struct.pack("<H", len(name)) + name)
+    for entry in entries:
+        note = entry.note.encode("utf-8")
+        parts.append(struct.pack("<qHI", to_index_time(entry.timestamp), codes[entry.mood], len(note)) + note)
+    return zlib.compress(b"".join(parts), 6)
+
+def decode_batch(data):
+    """MoodEntry tuples (without offsets) from encode_batch()"""
+    data = zlib.decompress(data)
+    count, mood_count = struct.unpack_from("<IH", data)
+    position = 6
+    moods = []
+    for _ in range(mood_count):
+        (length,) = struct.unpack_from("<H", data, position)
+        moods.append(data[position + 2:position + 2 + length].decode("utf-8"))
+        position += 2 + length
+    entries = []
+    for _ in range(count):
+        seconds, code, length = struct.unpack_from("<qHI", data, position)
+        position += 14
+        note = data[position:position + length].decode("utf-8")
+        position += length
+        entries.append(MoodEntry(from_index_time(seconds), moods[code], note))
+    return entries
+
+# Function to read the next batch of entries from a log
+def read_batch(path, start, limit, end=None):
+    """Up to limit entries from start, and the offset just after the last one returned"""
+    if end is None:
+        end = log_size(path)
+    entries = list(islice(iter_mood_entries(path, start=start, end=end), limit + 1))
+    if len(entries) > limit:
+        return entries[:limit], entries[limit].offset
+    return entries, end
+
+# IDs of every entry in a log, persisted next to it and brought up to date from the saved offset
+class EntryIdIndex:
+    id_size = 12
+    header = struct.Struct("<q")  # Byte offset in the log covered by the IDs that follow
+
+    def __init__(self, log_path="mood_log.txt"):
+        self.log_path = log_path
+        self.path = os.path.splitext(log_path)[0] + ".entry_ids.bin"
+        self.offset = 0
+        self.generation = 0  # Generation of the log the offset belongs to
+        self.ids = set()
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        self.offset = 0
+        self.generation = log_generation(self.log_path)
+        self.ids = set()
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as file:
+                    data = file.read()
+                (offset,) = self.header.unpack_from(data)
+                if log_offset_is_boundary(self.log_path, offset):
+                    self.offset = offset
+                    end = len(data) - (len(data) - self.header.size) % self.id_size
+                    self.ids = {data[position:position + self.id_size]
+                                for position in range(self.header.size, end, self.id_size)}
+                else:
+                    print("Entry IDs are out of date, rebuilding from the mood log", file=sys.stderr)
+        except Exception as e:
+            print(f"Error loading entry IDs: {e}", file=sys.stderr)
+            self.offset = 0
+            self.ids = set()
+
+    def refresh(self):
+        """Add the IDs of entries written since the last refresh"""
+        if not self.loaded or self.generation != log_generation(self.log_path):
+            # First use, or the log was compacted since
+            self.load()
+        size = log_size(self.log_path)
+        if size < self.offset:
+            # The log was truncated or replaced - start over
+            self.offset = 0
+            self.ids = set()
+        if size == self.offset:
+            return
+        # Deleted entries keep their IDs, so the replica can't bring them back
+        new_ids = [entry_id(entry) for entry in iter_mood_entries(self.log_path, start=self.offset, end=size,
+                                                                  include_dead=True)]
+        self.ids.update(new_ids)
+        try:
+            # IDs first, then the offset - after a crash the extra IDs are harmless
+            if self.offset and os.path.exists(self.path):
+                with open(self.path, "r+b") as file:
+                    file.seek(0, os.SEEK_END)
+                    file.write(b"".join(new_ids))
+                    file.seek(0)
+                    file.write(self.header.pack(size))
+            else:
+                with open(self.path, "wb") as file:
+                    file.write(self.header.pack(size) + b"".join(self.ids))
+        except Exception as e:
+            print(f"Error saving entry IDs: {e}", file=sys.stderr)
+        self.offset = size
+
+    def __contains__(self, key):
+        return key in self.ids
+
+# Function to keep two trackers from writing a replica folder at the same time
+@contextmanager
+def replica_lock(folder):
+    with open(os.path.join(folder, ".sync.lock"), "a+b") as file:
+        if fcntl:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+# A replica kept in a folder on this machine
+class DirectoryPeer:
+    def __init__(self, folder, fsync_policy="always"):
+        self.folder = folder
+        self.log_path = os.path.join(folder, "mood_log.txt")
+        self.key = "dir:" + os.path.abspath(folder)
+        self.fsync_policy = fsync_policy
+        self.ids = EntryIdIndex(self.log_path)
+
+    def exchange(self, payload, pull_offset, limit):
+        """Store the pushed entries the replica doesn't have yet, and read its entries after pull_offset.
+
+        Returns (entries added, batch of replica entries, offset to pull from
+        next time, whether more are waiting). Entries that were just pushed
+        are left out of the batch sent back.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        with replica_lock(self.folder):
+            self.ids.refresh()
+            pushed = set()
+            added = 0
+            journal = None
+            try:
+                for entry in decode_batch(payload):
+                    key = entry_id(entry)
+                    if key in self.ids or key in pushed:
+                        continue
+                    pushed.add(key)
+                    if journal is None:
+                        journal = MoodJournal(self.log_path, fsync_policy=self.fsync_policy)
+                        journal.start()
+                    journal.append((format_mood_entry(entry) + "\n\n").encode("utf-8"))
+                    added += 1
+            finally:
+                if journal:
+                    journal.close()
+            self.ids.refresh()
+
+            size = log_size(self.log_path)
+            if not log_offset_is_boundary(self.log_path, pull_offset):
+                pull_offset = 0
+            entries, next_offset = read_batch(self.log_path, pull_offset, min(limit, max_batch_entries), size)
+            entries = [entry for entry in entries if entry_id(entry) not in pushed]
+            return added, encode_batch(entries), next_offset, next_offset < size
+
+# A replica served by "mood_sync.py serve", over a Unix socket or localhost TCP
+class SocketPeer:
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.key = "socket:" + address
+        self.timeout = timeout
+
+    def exchange(self, payload, pull_offset, limit):
+        """Same as DirectoryPeer.exchange(), done by the server"""
+        header = {"op": "exchange", "pull_offset": pull_offset, "limit": limit, "size": len(payload)}
+        with connect_socket(self.address, self.timeout) as connection:
+            connection.sendall(json.dumps(header).encode("utf-8") + b"\n" + payload)
+            with connection.makefile("rb") as reader:
+                reply = json.loads(reader.readline() or b"{}")
+                data = reader.read(reply.get("size", 0))
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "no reply from the sync server"))
+        if len(data) != reply["size"]:
+            raise ConnectionError("sync server closed the connection")
+        return reply["added"], data, reply["next_offset"], reply["more"]
+
+# Function to pick the peer for an address
+def peer_from_address(address):
+    """SocketPeer for "host:port" or a Unix socket, DirectoryPeer for anything else"""
+    host, _, port = address.rpartition(":")
+    if (host and port.isdigit()) or (os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode)):
+        return SocketPeer(address)
+    return DirectoryPeer(address)
+
+# Syncs one mood log with one replica
+class MoodSync:
+    def __init__(self, log_path, peer, batch_size=500):
+        self.log_path = log_path
+        self.peer = peer
+        self.batch_size = batch_size  # Most entries sent or fetched per round
+        self.state_path = os.path.splitext(log_path)[0] + ".sync.json"
+        self.ids = EntryIdIndex(log_path)
+        self.received = set()  # IDs fetched from the replica, not worth sending back to it
+
+    def load_state(self):
+        """Byte offsets acknowledged so far: {"pushed": in our log, "pulled": in the replica's, "generation": of our log}"""
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r", encoding="utf-8") as file:
+                    state = json.load(file).get(self.peer.key)
+                if state:
+                    return state
+        except Exception as e:
+            print(f"Error loading sync state: {e}", file=sys.stderr)
+        return {"pushed": 0, "pulled": 0}
+
+    def save_state(self, state):
+        try:
+            data = {}
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            data[self.peer.key] = state
+            temp_path = self.state_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file, indent=1)
+            os.replace(temp_path, self.state_path)
+        except Exception as e:
+            print(f"Error saving sync state: {e}", file=sys.stderr)
+
+    def sync_round(self, apply):
+        """Send one batch of new entries and fetch one batch from the replica.
+
+        apply(entries) must have saved the fetched entries to the log by the
+        time it returns; they are not asked for again. Returns (sent, stored
+        by the replica, fetched, whether another round has more to do).
+        """
+        state = self.load_state()
+        generation = log_generation(self.log_path)
+        size = log_size(self.log_path)
+        pushed_offset = state["pushed"]
+        if state.get("generation", 0) != generation or not log_offset_is_boundary(self.log_path, pushed_offset):
+            # The log was replaced or compacted - send it all again, the replica skips what it has
+            pushed_offset = 0
+        outgoing, next_pushed = read_batch(self.log_path, pushed_offset, self.batch_size, size)
+        outgoing = [entry for entry in outgoing if entry_id(entry) not in self.received]
+
+        added, data, next_pulled, more = self.peer.exchange(encode_batch(outgoing), state["pulled"], self.batch_size)
+        # Our own entries the replica already had don't need saving again
+        self.ids.refresh()
+        incoming = []
+        for entry in decode_batch(data):
+            key = entry_id(entry)
+            if key not in self.ids and key not in self.received:
+                self.received.add(key)
+                incoming.append(entry)
+        if incoming:
+            apply(incoming)
+        self.save_state({"pushed": next_pushed, "pulled": next_pulled, "generation": generation})
+        return len(outgoing), added, len(incoming), more or next_pushed < size
+
+    def sync(self, apply):
+        """Run rounds until both sides are caught up; returns the (sent, stored, fetched) totals"""
+        totals = [0, 0, 0]
+        while True:
+            sent, added, fetched, more = self.sync_round(apply)
+            totals = [totals[0] + sent, totals[1] + added, totals[2] + fetched]
+            if not more:
+                return tuple(totals)
+
+# Runs MoodSync on its own thread, so the Tk loop never waits on the replica
+class SyncWorker:
+    def __init__(self, mood_sync, interval=60, flush=None):
+        self.mood_sync = mood_sync
+        self.interval = interval  # Seconds between rounds when nothing asks for one sooner
+        self.flush = flush  # Called before each round so entries saved a moment ago are in the log
+        self.wake = threading.Event()
+        self.pulled = queue.Queue()  # (entries, done event) waiting for the thread that owns the log
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="mood-sync", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def request(self):
+        """Sync soon, e.g. right after a save"""
+        self.wake.set()
+
+    def close(self):
+        """Send anything saved since the last round, then stop"""
+        self.closed = True
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=5)
+
+    def run(self):
+        while True:
+            try:
+                if self.flush:
+                    self.flush()
+                sent, added, fetched = self.mood_sync.sync(self.hand_over)
+                if sent or fetched:
+                    print(f"Synced with {self.mood_sync.peer.key}: sent {sent} ({added} new there), received {fetched}")
+            except Exception as e:
+                print(f"Error syncing mood log: {e}", file=sys.stderr)
+            if self.closed:
+                return
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def hand_over(self, entries):
+        """Wait until the owner thread has saved the fetched entries (see apply_pulled)"""
+        done = threading.Event()
+        self.pulled.put((entries, done))
+        while not done.wait(0.5):
+            if self.closed:
+                raise RuntimeError("stopped before the fetched entries were saved")
+
+    def apply_pulled(self, save):
+        """Call save(entries) for fetched entries - on the thread that owns the MoodLog. Returns how many"""
+        count = 0
+        while not self.pulled.empty():
+            entries, done = self.pulled.get_nowait()
+            try:
+                save(entries)
+                count += len(entries)
+            finally:
+                done.set()
+        return count
+
+def sync_from_environment(mood_log):
+    """SyncWorker for the replica in MOOD_TRACKER_SYNC (a folder or socket), or None when turned off"""
+    address = os.environ.get("MOOD_TRACKER_SYNC")
+    if not address:
+        return None
+    try:
+        return SyncWorker(MoodSync(mood_log.path, peer_from_address(address)), flush=mood_log.journal.flush)
+    except Exception as e:
+        print(f"Error starting sync: {e}", file=sys.stderr)
+        return None
+
+# Function to serve a replica folder until Ctrl+C or SIGTERM
+async def serve(args):
+    peer = DirectoryPeer(args.replica)
+    # Replica access happens on one thread, in the order requests arrived
+    storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mood-replica")
+    loop = asyncio.get_running_loop()
+
+    async def handle_client(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                data = b""
+                try:
+                    header = json.loads(line)
+                    payload = await reader.readexactly(int(header.get("size", 0)))
+                    added, data, next_offset, more = await loop.run_in_executor(
+                        storage, peer.exchange, payload, int(header["pull_offset"]), int(header["limit"]))
+                    reply = {"ok": True, "added": added, "next_offset": next_offset, "more": more}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    data = b""
+                    reply = {"ok": False, "error": str(e)}
+                reply["size"] = len(data)
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n" + data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    if args.port:
+        server = await asyncio.start_server(handle_client, args.host, args.port, limit=1 << 20)
+    else:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)  # Left over from a server that didn't shut down cleanly
+        server = await asyncio.start_unix_server(handle_client, args.socket, limit=1 << 20)
+    print(f"Serving replica {args.replica} on {f'{args.host}:{args.port}' if args.port else args.socket}",
+          file=sys.stderr)
+    stop = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    await stop.wait()
+    server.close()
+    await server.wait_closed()
+    storage.shutdown()
+    if not args.port and os.path.exists(args.socket):
+        os.remove(args.socket)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mood log replica for trackers to sync with.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="serve a replica folder over a socket")
+    serve_parser.add_argument("--replica", default="shared_moods", help="folder holding the replica log")
+    serve_parser.add_argument("--socket", default="mood_sync.sock", help="Unix socket to listen on")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address for --port")
+    serve_parser.add_argument("--port", type=int, help="listen on TCP instead of the Unix socket")
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,286 +1,599 @@
 import tkinter as tk
+from tkinter import messagebox
 from PIL import Image, ImageTk
 import os
 import glob
 import random
-from datetime import datetime, timedelta
-import re
-from collections import Counter
-try:
-    import pygame
-    pygame_available = True
-except ImportError:
-    pygame_available = False
-    print("pygame not found. Music functionality disabled. Install with: pip install pygame")
-
-# Create the main window - scaled down from 1230x420 to 984x336
-root = tk.Tk()
-root.title("Mood Tracker")
-root.geometry("984x336")
-root.resizable(False, False)
-
-# Create a canvas to hold everything - scaled down proportionally
-canvas = tk.Canvas(root, width=984, height=336, highlightthickness=0, bd=0)
-canvas.pack()
+import hashlib
+import tempfile
+import threading
+import time
+import queue
+from collections import OrderedDict
+from itertools import islice
+from array import array
+import json
+import difflib
+from mood_storage import (get_mood_log, save_mood_log, calculate_mood_stats, format_mood_entry,
+                          iter_mood_entries, log_version, log_generation, mood_order)
+from mood_music import MusicPlayer
+from mood_metrics import metrics_from_environment
+from mood_analytics import calculate_mood_trends
+from mood_notes import calculate_note_analytics, note_analytics_version, close_note_analytics
+from mood_heatmap import YearInPixels
+from mood_server import client_from_environment
+from mood_sync import sync_from_environment
+
+# Records how long each startup phase takes, so time-to-first-paint regressions are easy to spot
+class StartupTimeline:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # (name, start ms, duration ms) - start is measured from import
+
+    def run(self, name, function):
+        """Run one startup phase and record its timing (a failing phase doesn't stop the others)"""
+        start = time.perf_counter()
+        try:
+            function()
+        except Exception as e:
+            print(f"Error during startup phase '{name}': {e}")
+        end = time.perf_counter()
+        self.phases.append((name, (start - self.started) * 1000, (end - start) * 1000))
+
+    def mark(self, name):
+        """Record a moment such as the first paint"""
+        self.phases.append((name, (time.perf_counter() - self.started) * 1000, 0.0))
+
+    def report(self):
+        """Print the timeline, and save it as JSON when MOOD_TRACKER_STARTUP_REPORT names a file"""
+        print("Startup timeline (ms):")
+        print(f"  {'start':>8}  {'took':>7}  phase")
+        for name, start, duration in self.phases:
+            print(f"  {start:8.1f}  {duration:7.1f}  {name}")
+        
+        report_path = os.environ.get("MOOD_TRACKER_STARTUP_REPORT")
+        if report_path:
+            try:
+                with open(report_path, "w", encoding="utf-8") as file:
+                    json.dump({"phases": [{"name": name, "start_ms": round(start, 3), "duration_ms": round(duration, 3)}
+                                          for name, start, duration in self.phases]}, file, indent=2)
+            except Exception as e:
+                print(f"Error saving startup report: {e}")
+
+startup_timeline = StartupTimeline()
+
+# Main window widgets - created by create_window()
+root = None
+canvas = None
+canvas_scene = None  # Retained canvas items for the mood display and confirmation
+note_entry = None
+
+# Background music - the player and its pygame calls live on their own thread
+music_player = None
 
 # Variables to track current view
-current_view = "main"  # "main", "history", or "stats"
+current_view = "main"  # "main", "history", "stats" or "heatmap"
+# The history and stats widgets are built the first time their view opens and kept while hidden
 history_text = None
 history_frame = None
+history_search = None
+history_pager = None  # Newest-first entry iterator feeding the history view
+history_page_pending = False
+history_page_size = 40  # Entries rendered per page in the history view
+history_query = None  # Query the history widget shows results for ("" for the full history)
+history_version = None  # log_version() when the history widget was last brought up to date
+history_menu = None  # Right-click menu for editing or deleting an entry
+history_menu_offset = None  # (log generation, offset) of the entry the menu was opened on
 stats_text = None
 stats_frame = None
+stats_filter = None
+stats_shown = None  # (query, log version, day, notes version) the stats widget was last filled for
+notes_poll_pending = False  # A check for finished note analytics is scheduled
+time_index_poll_pending = False  # A filtered statistics page waits for the time index
+heatmap_frame = None
+heatmap_image = None  # Label showing the year in pixels
+heatmap_year_label = None
+heatmap_year = None  # Year shown, the current one until the arrows change it
+heatmap_photo = None  # Kept referenced so Tk doesn't drop the image
+heatmap_painter = None  # YearInPixels drawing the month tiles in the background
+heatmap_shown = None  # (year, painter version) on screen
+heatmap_poll_pending = False
+
+# Images loaded during startup
+click_photo = None
+confirmation_photo = None
+confirmation_after_id = None  # Timer hiding the confirmation message
 
 # Variables for falling leaves animation
-leaves = []
+leaf_particles = None
 leaf_photo = None
+frame_scheduler = None
 
-# Variables for music functionality
-music_playing = False
-music_paused = False
-current_music_file = None
-music_files = []
-
-# Load and set the background image - scaled down
-try:
-    image_path = os.path.join("images", "background.png")
-    background_image = Image.open(image_path).resize((984, 336), Image.Resampling.LANCZOS)
-    bg_photo = ImageTk.PhotoImage(background_image)
-    canvas.create_image(0, 0, image=bg_photo, anchor="nw")
-except FileNotFoundError:
-    print("Error: background.png not found in images folder")
-    canvas.configure(bg="lightgray")
-except Exception as e:
-    print(f"Error loading image: {e}")
-    canvas.configure(bg="lightgray")
-
-# Load leaf image for falling leaves animation
-try:
-    leaf_path = os.path.join("images", "leaf.png")
-    leaf_image = Image.open(leaf_path).resize((20, 20), Image.Resampling.LANCZOS)
-    leaf_photo = ImageTk.PhotoImage(leaf_image)
-except FileNotFoundError:
-    print("Error: leaf.png not found in images folder")
-    leaf_photo = None
-except Exception as e:
-    print(f"Error loading leaf image: {e}")
-    leaf_photo = None
-
-# Class to represent a falling leaf with natural movement
-class Leaf:
-    def __init__(self, canvas, leaf_photo, x, y):
-        self.canvas = canvas
-        self.photo = leaf_photo
-        self.x = x
-        self.y = y
-        self.speed_x = (hash(str(x + y)) % 3) - 1  # Random horizontal drift (-1, 0, or 1)
-        self.speed_y = 1 + (hash(str(x + y)) % 2)  # Random fall speed (1 or 2)
-        self.swing = 0  # Swing animation counter
-        self.swing_speed = 0.1 + (hash(str(x + y)) % 10) * 0.01  # Random swing speed (0.1-0.19)
-        if self.photo:
-            self.canvas_id = self.canvas.create_image(self.x, self.y, image=self.photo, anchor="center", tags="leaf")
-        else:
-            self.canvas_id = None
+# Folder holding already-resized copies of the images, so later launches skip decoding and resampling
+image_cache_folder = ".image_cache"
+cache_modes = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}  # Image mode by bytes per pixel
+
+# Function to open an image at a given size, using the on-disk cache when possible
+def load_scaled_image(path, size):
+    """Return the image at path resized to size, reusing a cached copy when the file hasn't changed.
+
+    Cache files hold the raw pixels under a name made from the source path,
+    its modification time and size and the target size, so a lookup is a
+    single open; copies of older versions are removed when a new one is made.
+    """
+    stat = os.stat(path)  # Raises FileNotFoundError like Image.open would
+    width, height = size
+    path_key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:10]
+    version_key = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8")).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    prefix = f"{stem}-{path_key}-{width}x{height}-"
+    cache_path = os.path.join(image_cache_folder, f"{prefix}{version_key}.raw")
     
-    def update(self):
-        if not self.canvas_id:
-            return False
-        
-        # Update position with swaying motion (mimics natural leaf falling)
-        self.swing += self.swing_speed
-        swing_offset = 2 * (0.5 - abs(0.5 - (self.swing % 1)))  # Creates a triangular wave for swaying
-        self.x += self.speed_x + swing_offset
-        self.y += self.speed_y
-        
-        # Move the leaf on canvas
-        self.canvas.coords(self.canvas_id, self.x, self.y)
-        
-        # Remove leaf if it goes off screen
-        if self.y > 350:  # Slightly below the canvas height
-            self.canvas.delete(self.canvas_id)
-            return False
-        
-        return True
-
-# Function to create new leaves
-def create_leaf():
-    if leaf_photo and len(leaves) < 15:  # Limit number of leaves
-        x = random.randint(-20, 1004)  # Start slightly off-screen
-        y = random.randint(-50, -20)   # Start above the canvas
-        new_leaf = Leaf(canvas, leaf_photo, x, y)
-        leaves.append(new_leaf)
-
-# Function to update all leaves
-def update_leaves():
-    global leaves
-    # Update existing leaves and remove those that are off-screen
-    leaves = [leaf for leaf in leaves if leaf.update()]
-    
-    # Randomly create new leaves (about 10% chance each update)
-    if random.random() < 0.1:
-        create_leaf()
-    
-    # Schedule next update
-    root.after(50, update_leaves)  # Update every 50ms for smooth animation
-
-# Initialize pygame mixer for music (if available)
-if pygame_available:
+    # The pixel mode follows from the bytes per pixel
     try:
-        pygame.mixer.init()
-        print("Music system initialized successfully")
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as file:
+                data = file.read()
+            pixel_size, extra = divmod(len(data), width * height)
+            if not extra and pixel_size in cache_modes:
+                return Image.frombytes(cache_modes[pixel_size], size, data)
     except Exception as e:
-        print(f"Error initializing music system: {e}")
-        pygame_available = False
+        print(f"Error reading image cache for {path}: {e}")
+    
+    image = Image.open(path).resize(size, Image.Resampling.LANCZOS)
+    if image.mode not in cache_modes.values():
+        # Palette and other modes are stored as plain RGBA pixels
+        image = image.convert("RGBA")
+    
+    temp_path = None
+    try:
+        os.makedirs(image_cache_folder, exist_ok=True)
+        # Copies made from older versions of the file
+        for cache_name in os.listdir(image_cache_folder):
+            if cache_name.startswith(prefix) and cache_name.endswith(".raw") and cache_name != os.path.basename(cache_path):
+                try:
+                    os.remove(os.path.join(image_cache_folder, cache_name))
+                except FileNotFoundError:
+                    pass  # Removed by the other thread
+        # A temp file of its own, as the prefetch thread and the Tk thread can write the same image
+        with tempfile.NamedTemporaryFile(dir=image_cache_folder, prefix=prefix, suffix=".tmp", delete=False) as file:
+            temp_path = file.name
+            file.write(image.tobytes())
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f"Error writing image cache for {path}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return image
 
-# Function to load available music files
-def load_music_files():
-    """Load available music files from the music folder"""
-    global music_files
-    music_files = []
+# Function to create the main window
+def create_window():
+    """Create the root window, the canvas and the notes box"""
+    global root, canvas, canvas_scene, note_entry
+    # Create the main window - scaled down from 1230x420 to 984x336
+    root = tk.Tk()
+    root.title("Mood Tracker")
+    root.geometry("984x336")
+    root.resizable(False, False)
     
-    if not pygame_available:
-        return
+    # Create a canvas to hold everything - scaled down proportionally
+    canvas = tk.Canvas(root, width=984, height=336, highlightthickness=0, bd=0)
+    canvas.pack()
+    canvas_scene = CanvasScene(canvas)
     
-    # Create music folder if it doesn't exist
-    music_folder = "music"
-    if not os.path.exists(music_folder):
-        os.makedirs(music_folder)
-        print("Created 'music' folder. Add .mp3, .wav, or .ogg files there for background music!")
-        return
+    # Create text widget for multi-line notes - scaled dimensions and font
+    note_entry = tk.Text(root, width=52, height=8, font=("Stardew Valley", 16), 
+                         wrap=tk.WORD, bg="#ffc478", relief="solid", bd=2, fg="#88563d")
+    note_entry.place(x=40, y=96)
     
-    # Load music files
-    music_extensions = ['*.mp3', '*.wav', '*.ogg']
-    for extension in music_extensions:
-        files = glob.glob(os.path.join(music_folder, extension))
-        music_files.extend(files)
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+# Function to load the background image
+def load_background():
+    """Load and set the background image - scaled down"""
+    try:
+        image_path = os.path.join("images", "background.png")
+        background_image = load_scaled_image(image_path, (984, 336))
+        bg_photo = ImageTk.PhotoImage(background_image)
+        canvas.create_image(0, 0, image=bg_photo, anchor="nw")
+        # Keep a reference to prevent garbage collection
+        canvas.bg = bg_photo
+    except FileNotFoundError:
+        print("Error: background.png not found in images folder")
+        canvas.configure(bg="lightgray")
+    except Exception as e:
+        print(f"Error loading image: {e}")
+        canvas.configure(bg="lightgray")
+
+# Function to start the falling leaves
+def start_leaf_animation():
+    """Load the leaf image and register the falling leaves with the frame scheduler"""
+    global leaf_photo, leaf_particles, frame_scheduler
+    try:
+        leaf_path = os.path.join("images", "leaf.png")
+        leaf_image = load_scaled_image(leaf_path, (20, 20))
+        leaf_photo = ImageTk.PhotoImage(leaf_image)
+    except FileNotFoundError:
+        print("Error: leaf.png not found in images folder")
+        leaf_photo = None
+    except Exception as e:
+        print(f"Error loading leaf image: {e}")
+        leaf_photo = None
     
-    if music_files:
-        print(f"Found {len(music_files)} music file(s):")
-        for music_file in music_files:
-            print(f"  - {os.path.basename(music_file)}")
-    else:
-        print("No music files found. Add .mp3, .wav, or .ogg files to the 'music' folder!")
+    frame_scheduler = FrameScheduler(root, metrics=hot_path_metrics)
+    if leaf_photo:
+        canvas.leaf = leaf_photo
+        leaf_particles = LeafParticles(canvas, leaf_photo)
+        frame_scheduler.register(update_leaves)
+
+# Central scheduler that drives every periodic callback from one Tk timer
+class FrameScheduler:
+    def __init__(self, root, target_fps=20, idle_fps=4, frame_budget=0.010, idle_timeout=120, max_delta=0.25,
+                 metrics=None):
+        self.root = root
+        self.metrics = metrics  # Optional HotPathMetrics counting late frames
+        self.target_fps = target_fps  # Frame rate while the window is in use
+        self.idle_fps = idle_fps  # Frame rate while unfocused or nobody has touched it for a while
+        self.frame_budget = frame_budget  # Seconds of callbacks per frame before the rest wait a frame
+        self.idle_timeout = idle_timeout  # Seconds without input before throttling
+        self.max_delta = max_delta  # Longest step handed to a callback, e.g. after a stall
+        self.callbacks = []  # [callback, time it last ran]
+        self.requests = {}  # One-shot callbacks for the next frame, in the order first requested
+        self.next_callback = 0  # Where the next frame starts, so deferred callbacks go first
+        self.after_id = None
+        self.due = None  # When the scheduled frame should start
+        self.iconified = False
+        self.focused = True
+        self.last_input = time.perf_counter()
+        
+        root.bind("<Unmap>", self.on_unmap, add="+")
+        root.bind("<Map>", self.on_map, add="+")
+        root.bind("<FocusIn>", self.on_focus_change, add="+")
+        root.bind("<FocusOut>", self.on_focus_change, add="+")
+        for sequence in ("<Motion>", "<KeyPress>", "<ButtonPress>"):
+            root.bind_all(sequence, self.on_input, add="+")
+
+    def register(self, callback):
+        """Call callback(dt) every frame, where dt is the seconds since it last ran"""
+        self.callbacks.append([callback, time.perf_counter()])
+        self.start()
+
+    def unregister(self, callback):
+        self.callbacks = [entry for entry in self.callbacks if entry[0] is not callback]
+        self.next_callback = 0
+
+    def request(self, callback):
+        """Call callback() once at the start of the next frame, however often it is requested before then"""
+        self.requests[callback] = None
+        if self.after_id is not None and self.due - time.perf_counter() > 1 / self.target_fps:
+            # Throttled to the idle rate - don't keep a click waiting for the slow frame
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        self.start()
+
+    def start(self):
+        if self.after_id is None and not self.iconified and (self.callbacks or self.requests):
+            self.after_id = self.root.after(1, self.tick)
+            self.due = time.perf_counter() + 0.001
+
+    def current_fps(self):
+        idle = time.perf_counter() - self.last_input > self.idle_timeout
+        return self.idle_fps if idle or not self.focused else self.target_fps
+
+    def tick(self):
+        self.after_id = None
+        if self.iconified or not (self.callbacks or self.requests):
+            # Suspended - on_map() starts the frames again
+            return
+        
+        frame_start = time.perf_counter()
+        if self.metrics and self.due is not None:
+            self.metrics.record_frame(frame_start - self.due, 1 / self.current_fps())
+        requests, self.requests = self.requests, {}
+        for callback in requests:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in frame request {getattr(callback, '__name__', callback)}: {e}")
+        count = len(self.callbacks)
+        ran = 0
+        for n in range(count):
+            entry = self.callbacks[(self.next_callback + n) % count]
+            now = time.perf_counter()
+            if ran and now - frame_start > self.frame_budget:
+                break
+            dt = min(now - entry[1], self.max_delta)
+            entry[1] = now
+            try:
+                entry[0](dt)
+            except Exception as e:
+                print(f"Error in frame callback {getattr(entry[0], '__name__', entry[0])}: {e}")
+            ran += 1
+        if self.callbacks:
+            self.next_callback = (self.next_callback + ran) % len(self.callbacks)
+        
+        # Schedule the next frame, leaving out the time this one took
+        elapsed = time.perf_counter() - frame_start
+        delay = max(1, int((1 / self.current_fps() - elapsed) * 1000))
+        self.after_id = self.root.after(delay, self.tick)
+        self.due = time.perf_counter() + delay / 1000
+
+    def on_unmap(self, event):
+        if event.widget is self.root:
+            # Minimized - stop drawing entirely
+            self.iconified = True
+            if self.after_id is not None:
+                self.root.after_cancel(self.after_id)
+                self.after_id = None
+
+    def on_map(self, event):
+        if event.widget is self.root and self.iconified:
+            self.iconified = False
+            self.start()
+
+    def on_focus_change(self, event):
+        # Focus moves between our own widgets too, so ask Tk once things settle
+        self.root.after_idle(self.check_focus)
+
+    def check_focus(self):
+        try:
+            self.focused = self.root.focus_get() is not None
+        except Exception:
+            self.focused = True
+
+    def on_input(self, event):
+        self.last_input = time.perf_counter()
+
+# Canvas items created once and afterwards only changed where their state changed
+class CanvasScene:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.items = {}  # name -> [item id, coords, options, visible]
+
+    def show(self, name, kind, coords, **options):
+        """Show the named item (tagged with its name), creating it the first time"""
+        coords = tuple(coords)
+        item = self.items.get(name)
+        if item is None:
+            item_id = getattr(self.canvas, f"create_{kind}")(*coords, tags=name, **options)
+            self.items[name] = [item_id, coords, options, True]
+            return item_id
+        
+        item_id, old_coords, old_options, visible = item
+        if coords != old_coords:
+            self.canvas.coords(item_id, *coords)
+        changed = {key: value for key, value in options.items() if old_options.get(key) != value}
+        if not visible:
+            changed["state"] = "normal"
+        if changed:
+            self.canvas.itemconfigure(item_id, **changed)
+        self.items[name] = [item_id, coords, {**old_options, **options}, True]
+        return item_id
+
+    def hide(self, *names):
+        for name in names:
+            item = self.items.get(name)
+            if item and item[3]:
+                self.canvas.itemconfigure(item[0], state="hidden")
+                item[3] = False
+
+# Pooled particle system for the falling leaves - canvas items are created once and reused
+class LeafParticles:
+    def __init__(self, canvas, leaf_photo, pool_size=15, spawn_chance=0.1):
+        self.canvas = canvas
+        self.photo = leaf_photo
+        self.pool_size = pool_size  # Limit number of leaves
+        self.spawn_chance = spawn_chance  # Chance of a new leaf each update
+        # Every leaf gets a hidden canvas item up front; falling off-screen just hides it again
+        self.item_ids = [canvas.create_image(0, -100, image=leaf_photo, anchor="center",
+                                             tags="leaf", state="hidden")
+                         for _ in range(pool_size)]
+        # Per-leaf state in flat arrays, indexed by pool slot
+        self.x = array("d", [0.0] * pool_size)
+        self.y = array("d", [0.0] * pool_size)
+        self.speed_x = array("d", [0.0] * pool_size)
+        self.speed_y = array("d", [0.0] * pool_size)
+        self.swing = array("d", [0.0] * pool_size)  # Swing animation counter
+        self.swing_speed = array("d", [0.0] * pool_size)
+        self.active = array("b", [0] * pool_size)
+        self.free_slots = list(range(pool_size))
+
+    def spawn(self):
+        """Drop a leaf from a free slot of the pool"""
+        if not self.free_slots:
+            return
+        slot = self.free_slots.pop()
+        self.x[slot] = random.randint(-20, 1004)  # Start slightly off-screen
+        self.y[slot] = random.randint(-50, -20)   # Start above the canvas
+        self.speed_x[slot] = random.randint(-1, 1)  # Random horizontal drift (-1, 0, or 1)
+        self.speed_y[slot] = random.randint(1, 2)   # Random fall speed (1 or 2)
+        self.swing[slot] = 0
+        self.swing_speed[slot] = 0.1 + random.randint(0, 9) * 0.01  # Random swing speed (0.1-0.19)
+        self.active[slot] = 1
+        item_id = self.item_ids[slot]
+        self.canvas.coords(item_id, self.x[slot], self.y[slot])
+        self.canvas.itemconfigure(item_id, state="normal")
+        # Keep leaves in front of items drawn since the pool was created
+        self.canvas.tag_raise("leaf")
+
+    def update(self, dt=0.05):
+        """Move every falling leaf by dt seconds and recycle those that left the screen"""
+        # Speeds are in steps of the original 50ms frame
+        steps = dt / 0.05
+        x, y, swing, active = self.x, self.y, self.swing, self.active
+        coords = self.canvas.coords
+        for slot in range(self.pool_size):
+            if not active[slot]:
+                continue
+            # Update position with swaying motion (mimics natural leaf falling)
+            swing[slot] += self.swing_speed[slot] * steps
+            swing_offset = 2 * (0.5 - abs(0.5 - (swing[slot] % 1)))  # Creates a triangular wave for swaying
+            x[slot] += (self.speed_x[slot] + swing_offset) * steps
+            y[slot] += self.speed_y[slot] * steps
+            
+            if y[slot] > 350:  # Slightly below the canvas height
+                active[slot] = 0
+                self.canvas.itemconfigure(self.item_ids[slot], state="hidden")
+                self.free_slots.append(slot)
+            else:
+                coords(self.item_ids[slot], x[slot], y[slot])
+        
+        # Randomly create new leaves (about 10% chance every 50ms)
+        if random.random() < self.spawn_chance * steps:
+            self.spawn()
+
+# Function to update all leaves (registered with the frame scheduler)
+def update_leaves(dt):
+    leaf_particles.update(dt)
+
+# Function to set up the music system
+def start_music():
+    """Start the music worker - it loads pygame and the music library on its own thread"""
+    global music_player
+    music_player = MusicPlayer("music")
+    music_player.start(autoplay=True)
 
 # Function to play background music
 def play_music():
     """Start or resume background music"""
-    global music_playing, music_paused, current_music_file
-    
-    if not pygame_available or not music_files:
-        return
-    
-    try:
-        if music_paused:
-            # Resume paused music
-            pygame.mixer.music.unpause()
-            music_paused = False
-            music_playing = True
-            print("Music resumed")
-        elif not music_playing:
-            # Start new music
-            if not current_music_file:
-                current_music_file = random.choice(music_files)
-            
-            pygame.mixer.music.load(current_music_file)
-            pygame.mixer.music.play(-1)  # -1 means loop indefinitely
-            music_playing = True
-            print(f"Playing: {os.path.basename(current_music_file)}")
-            
-    except Exception as e:
-        print(f"Error playing music: {e}")
+    if music_player:
+        music_player.play()
 
 # Function to pause background music
 def pause_music():
     """Pause background music"""
-    global music_playing, music_paused
-    
-    if not pygame_available or not music_playing:
-        return
-    
-    try:
-        pygame.mixer.music.pause()
-        music_playing = False
-        music_paused = True
-        print("Music paused")
-    except Exception as e:
-        print(f"Error pausing music: {e}")
+    if music_player:
+        music_player.pause()
 
 # Function to stop background music
 def stop_music():
     """Stop background music"""
-    global music_playing, music_paused, current_music_file
-    
-    if not pygame_available:
-        return
-    
-    try:
-        pygame.mixer.music.stop()
-        music_playing = False
-        music_paused = False
-        current_music_file = None
-        print("Music stopped")
-    except Exception as e:
-        print(f"Error stopping music: {e}")
+    if music_player:
+        music_player.stop()
+
+# Function to skip to the next track
+def next_music():
+    """Skip to the next track in the playlist"""
+    if music_player:
+        music_player.next_track()
 
 # Function to toggle music on/off
 def toggle_music():
     """Toggle background music on/off"""
-    if music_playing:
-        pause_music()
-    else:
-        play_music()
+    if music_player:
+        music_player.toggle()
 
-# Load mood images for slideshow in specific order
+# Mood image files for the slideshow in specific order - decoded on demand by mood_portraits
 mood_images = []
-mood_photos = []
 current_mood_index = 0
 
-# Define the desired order of moods
-mood_order = ["joy", "neutral", "sadness", "anger", "annoyed", "anxiety", "fear"]
-
-try:
-    # First, collect all mood files
-    all_mood_files = []
-    image_extensions = ['*.png', '*.jpg', '*.jpeg']
-    for extension in image_extensions:
-        files = glob.glob(os.path.join("images", extension))
-        for file in files:
-            filename = os.path.basename(file).lower()
-            # Exclude UI elements and the leaf animation image from mood selection
-            if not any(exclude in filename for exclude in ['background', 'arrow1', 'arrow2', 'close', 'click1','confirmation','notes','history','stats','leaf','music']):
-                all_mood_files.append(file)
-
-    # Sort files according to the specified mood order
-    ordered_mood_files = []
-    
-    # Add files in the specified order
-    for mood in mood_order:
+# Function to find the mood images
+def find_mood_images():
+    """Collect the mood image files in mood_order (only names - images load when first shown)"""
+    try:
+        # First, collect all mood files
+        all_mood_files = []
+        image_extensions = ['*.png', '*.jpg', '*.jpeg']
+        for extension in image_extensions:
+            files = glob.glob(os.path.join("images", extension))
+            for file in files:
+                filename = os.path.basename(file).lower()
+                # Exclude UI elements and the leaf animation image from mood selection
+                if not any(exclude in filename for exclude in ['background', 'arrow1', 'arrow2', 'close', 'click1','confirmation','notes','history','stats','leaf','music']):
+                    all_mood_files.append(file)
+
+        # Sort files according to the specified mood order
+        ordered_mood_files = []
+    
+        # Add files in the specified order
+        for mood in mood_order:
+            for file in all_mood_files:
+                filename = os.path.splitext(os.path.basename(file))[0].lower()
+                if filename == mood.lower():
+                    ordered_mood_files.append(file)
+                    break
+    
+        # Add any remaining files that weren't in the specified order
+        ordered_set = set(ordered_mood_files)
         for file in all_mood_files:
-            filename = os.path.splitext(os.path.basename(file))[0].lower()
-            if filename == mood.lower():
+            if file not in ordered_set:
                 ordered_mood_files.append(file)
-                break
-    
-    # Add any remaining files that weren't in the specified order
-    for file in all_mood_files:
-        if file not in ordered_mood_files:
-            ordered_mood_files.append(file)
 
-    # Load the ordered mood images - scaled down from 250x250 to 200x200
-    for mood_file in ordered_mood_files:
+        # Only the file names are collected here - images are loaded when first shown
+        mood_images.extend(ordered_mood_files)
+
+        print(f"Found {len(mood_images)} mood images in order:")
+        for i, img in enumerate(mood_images):
+            print(f"{i+1}. {os.path.basename(img)}")
+
+    except Exception as e:
+        print(f"Error loading mood images: {e}")
+
+# Bounded cache of mood portraits, decoded on demand with neighbours prefetched in the background
+class MoodPortraitCache:
+    def __init__(self, files, size=(200, 200), capacity=8, prefetch_distance=2):
+        self.files = files
+        self.size = size  # Scaled down from 250x250 to 200x200
+        self.capacity = capacity
+        self.prefetch_distance = prefetch_distance
+        self.images = OrderedDict()  # index -> resized PIL image, filled by the worker
+        self.photos = OrderedDict()  # index -> PhotoImage, only touched on the Tk thread
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.prefetch_worker, name="mood-prefetch", daemon=True)
+        self.worker.start()
+
+    def remember(self, cache, index, value):
+        """Store a value and evict the least recently used ones beyond capacity"""
+        cache[index] = value
+        cache.move_to_end(index)
+        while len(cache) > self.capacity:
+            cache.popitem(last=False)
+
+    def load_image(self, index):
+        """Decode and resize one portrait (safe to call from any thread)"""
+        with self.lock:
+            image = self.images.get(index)
+            if image is not None:
+                self.images.move_to_end(index)
+                return image
         try:
-            img = Image.open(mood_file).resize((200, 200), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            mood_images.append(mood_file)
-            mood_photos.append(photo)
+            image = load_scaled_image(self.files[index], self.size)
         except Exception as e:
-            print(f"Error loading {mood_file}: {e}")
+            print(f"Error loading {self.files[index]}: {e}")
+            return None
+        with self.lock:
+            self.remember(self.images, index, image)
+        return image
+
+    def get_photo(self, index):
+        """Return the PhotoImage for a mood, decoding it now only if it wasn't prefetched"""
+        photo = self.photos.get(index)
+        if photo is None:
+            image = self.load_image(index)
+            if image is None:
+                return None
+            photo = ImageTk.PhotoImage(image)
+        self.remember(self.photos, index, photo)
+        return photo
 
-    print(f"Loaded {len(mood_photos)} mood images in order:")
-    for i, img in enumerate(mood_images):
-        print(f"{i+1}. {os.path.basename(img)}")
+    def prefetch_around(self, index):
+        """Ask the worker to decode the moods next to index"""
+        count = len(self.files)
+        for distance in range(1, self.prefetch_distance + 1):
+            for neighbour in ((index + distance) % count, (index - distance) % count):
+                if neighbour not in self.photos:
+                    self.requests.put(neighbour)
 
-except Exception as e:
-    print(f"Error loading mood images: {e}")
+    def prefetch_worker(self):
+        while True:
+            index = self.requests.get()
+            with self.lock:
+                cached = index in self.images
+            if not cached:
+                self.load_image(index)
+
+mood_portraits = None  # Created once the mood images are found
 
 # Function to get mood name from filename
 def get_mood_name(filename):
@@ -288,118 +601,258 @@ def get_mood_name(filename):
     mood_name = os.path.splitext(os.path.basename(filename))[0]
     return mood_name.capitalize()
 
-# Function to save mood log to file
-def save_mood_log(mood_name, note_text):
-    """Save mood and note to a text file"""
+# Opened after the first paint (or by the first save, whichever comes first)
+mood_log = None
+# Client for a shared mood server - set MOOD_TRACKER_SERVER to use one instead of the local file
+mood_service = None
+# Background sync with a replica - set MOOD_TRACKER_SYNC to a folder or socket (see mood_sync.py)
+sync_worker = None
+service_answers = queue.Queue()  # (kind, request number, show, result) from mood server calls on worker threads
+service_requests = {}  # kind -> number of its newest request; answers to older ones are dropped
+service_waiting = 0  # Requests whose answer hasn't been shown yet
+service_poll_pending = False
+
+# Function to ask the mood server without blocking the window
+def ask_mood_service(kind, call, show):
+    """Run call() on a worker thread and pass its result (or the exception it raised) to show() on the Tk thread"""
+    global service_waiting
+    number = service_requests.get(kind, 0) + 1
+    service_requests[kind] = number
+    
+    def run():
+        try:
+            result = call()
+        except Exception as e:
+            result = e
+        service_answers.put((kind, number, show, result))
+    service_waiting += 1
+    threading.Thread(target=run, name=f"mood-service-{kind}", daemon=True).start()
+    schedule_service_poll()
+
+def schedule_service_poll():
+    global service_poll_pending
+    if not service_poll_pending:
+        service_poll_pending = True
+        root.after(50, poll_mood_service)
+
+def poll_mood_service():
+    """Show the answers that came back from the mood server"""
+    global service_poll_pending, service_waiting
+    service_poll_pending = False
+    while not service_answers.empty():
+        kind, number, show, result = service_answers.get_nowait()
+        service_waiting -= 1
+        # A newer request of the same kind replaces this one
+        if number == service_requests[kind]:
+            show(result)
+    if service_waiting:
+        schedule_service_poll()
+
+# Function to show the next page of older entries in the history view
+def load_history_page():
+    """Append the next page of entries (newest first) to the history text widget"""
+    global history_pager, history_page_pending
+    history_page_pending = False
+    if not history_text or not history_pager:
+        return
+    
     try:
-        now = datetime.now()
-        date = now.strftime("%Y-%m-%d")
-        time = now.strftime("%H:%M:%S")
-        
-        with open("mood_log.txt", "a", encoding="utf-8") as file:
-            file.write(f"Date: {date} Time: {time} Mood: {mood_name}\n")
-            file.write(f"Note: {note_text}\n\n")
-        print(f"Mood logged: {mood_name} with note: {note_text}")
+        entries = list(islice(history_pager, history_page_size))
     except Exception as e:
-        print(f"Error saving mood log: {e}")
+        entries = []
+        print(f"Error loading mood history: {e}")
+    if len(entries) < history_page_size:
+        # Reached the oldest entry
+        history_pager = None
+    if not entries:
+        return
+    
+    history_text.configure(state="normal")
+    insert_history_entries("end", entries, '\n\n' if history_text.index("end-1c") != "1.0" else "")
+    history_text.configure(state="disabled")
+
+# Function to add entries to the history widget, each tagged with its log offset for the edit menu
+def insert_history_entries(index, entries, before="", after=""):
+    """Insert the entries (in the order given) at index as one block"""
+    parts = [before, ()]
+    for i, entry in enumerate(entries):
+        tags = (f"entry-{entry.offset}",) if entry.offset is not None else ()
+        parts += ['\n\n' if i else "", (), format_mood_entry(entry), tags]
+    parts += [after, ()]
+    history_text.insert(index, *parts)
 
-# Function to load mood history from file
-def load_mood_history():
-    """Load all mood logs from the text file with newest first"""
+# Function to run the query typed into the history search box
+def search_history(event=None):
+    """Show entries matching the search box (or the full history when it is empty)"""
+    global history_pager, history_query, history_version
+    if not history_text:
+        return
+    query = history_search.get().strip() if history_search else ""
+    
+    if mood_service:
+        # The server sends a page at a time as the view scrolls; ask again whenever the view is shown
+        history_pager = history_query = history_version = None
+        history_text.configure(state="normal")
+        history_text.delete("1.0", "end")
+        history_text.insert("1.0", "Asking the mood server...")
+        history_text.configure(state="disabled")
+        ask_mood_service("history", lambda: mood_service.find_entries(query, history_page_size),
+                         lambda pager: show_history_results(query, pager))
+        return
     try:
-        if os.path.exists("mood_log.txt"):
-            with open("mood_log.txt", "r", encoding="utf-8") as file:
-                content = file.read()
-                if content.strip():
-                    # Split by double newlines to get individual entries
-                    entries = content.strip().split('\n\n')
-                    # Reverse to show newest first
-                    entries.reverse()
-                    # Join back with double newlines
-                    return '\n\n'.join(entries)
-                else:
-                    return "No mood logs found. Start logging your moods!"
+        # Make sure entries still queued for writing are in the file before reading it
+        log = get_mood_log()
+        log.flush()
+        history_query, history_version = query, log_version(log.path)
+        if query:
+            pager = log.find_entries(query)
         else:
-            return "No mood logs found. Start logging your moods!"
+            # Display only the newest page of mood history - older pages load on scroll
+            pager = log.newest_entries()
     except Exception as e:
-        return f"Error loading mood history: {e}"
+        pager = e
+    show_history_results(query, pager)
 
-# Function to calculate mood statistics
-def calculate_mood_stats():
-    """Calculate various mood statistics"""
+# Function to fill the history view with the results of a search
+def show_history_results(query, pager):
+    """Show the first page from a newest-first entry iterator, or the error raised getting one"""
+    global history_pager, history_query
+    if not history_text:
+        return
+    
+    history_text.configure(state="normal")
+    history_text.delete("1.0", "end")
+    if isinstance(pager, Exception):
+        history_pager = history_query = None
+        history_text.insert("1.0", f"Error searching mood history: {pager}")
+    else:
+        history_pager = pager
+        load_history_page()
+        if history_text.index("end-1c") == "1.0":
+            history_text.configure(state="normal")
+            if query:
+                history_text.insert("1.0", f"No entries match '{query}'.")
+            else:
+                # Nothing to add the next entry to - fill the view again once there is one
+                history_query = None
+                history_text.insert("1.0", "No mood logs found. Start logging your moods!")
+    
+    # Make text read-only
+    history_text.configure(state="disabled")
+
+# Function to bring the history view up to date when it is shown again
+def update_history():
+    """Add entries saved since the history view was filled to its top"""
+    global history_version
+    if mood_service:
+        search_history()
+        return
+    log = get_mood_log()
+    log.flush()
+    version = log_version(log.path)
+    if history_query is not None and version == history_version:
+        return
+    if history_query != "" or version[:2] != history_version[:2] or version[2] < history_version[2]:
+        # Search results, or entries were edited, deleted or compacted away - run the query again
+        search_history()
+        return
+    
     try:
-        if not os.path.exists("mood_log.txt"):
-            return "No mood logs found. Start logging your moods!"
-        
-        with open("mood_log.txt", "r", encoding="utf-8") as file:
-            content = file.read()
-        
-        if not content.strip():
-            return "No mood logs found. Start logging your moods!"
-        
-        # Parse mood entries
-        mood_pattern = r"Date: (\d{4}-\d{2}-\d{2}) Time: (\d{2}:\d{2}:\d{2}) Mood: (\w+)"
-        matches = re.findall(mood_pattern, content)
-        
-        if not matches:
-            return "No valid mood entries found!"
-        
-        # Extract data
-        dates = [datetime.strptime(match[0], "%Y-%m-%d").date() for match in matches]
-        times = [match[1] for match in matches]
-        moods = [match[2] for match in matches]
-        
-        # Calculate statistics
-        total_entries = len(matches)
-        mood_counts = Counter(moods)
-        
-        # Date range
-        min_date = min(dates) if dates else None
-        max_date = max(dates) if dates else None
-        
-        # Recent activity (last 7 days)
-        recent_date = datetime.now().date() - timedelta(days=7)
-        recent_moods = [mood for date, mood in zip(dates, moods) if date >= recent_date]
-        
-        # Today's entries
-        today = datetime.now().date()
-        today_count = sum(1 for date in dates if date == today)
-        
-        # Build statistics text
-        stats_text = "OVERVIEW:\n"
-        stats_text += f"Total Entries: {total_entries}\n"
-        stats_text += f"Today's Logs: {today_count}\n"
-        stats_text += f"Last 7 Days: {len(recent_moods)} entries\n\n"
-        
-        if min_date and max_date:
-            days_tracked = (max_date - min_date).days + 1
-            stats_text += f"DATE RANGE:\n"
-            stats_text += f"First Entry: {min_date.strftime('%Y-%m-%d')}\n"
-            stats_text += f"Latest Entry: {max_date.strftime('%Y-%m-%d')}\n"
-            stats_text += f"Days Tracked: {days_tracked}\n\n"
-        
-        stats_text += f"TOP 3 MOODS:\n"
-        for mood, count in mood_counts.most_common(3):
-            percentage = (count / total_entries) * 100
-            stats_text += f"{mood}: {count} times ({percentage:.1f}%)\n"
-        
-        return stats_text
-        
+        # Read only the bytes appended since the view was filled
+        entries = list(iter_mood_entries(log.path, start=history_version[2]))
     except Exception as e:
-        return f"Error calculating statistics: {e}"
+        print(f"Error loading mood history: {e}")
+        search_history()
+        return
+    history_version = version
+    if entries:
+        history_text.configure(state="normal")
+        insert_history_entries("1.0", list(reversed(entries)), after='\n\n')
+        history_text.configure(state="disabled")
+
+# Function to open the edit menu for the entry under the mouse
+def show_history_menu(event):
+    global history_menu_offset
+    if mood_service:
+        # The mood server only takes new entries
+        return
+    tags = history_text.tag_names(f"@{event.x},{event.y}")
+    offsets = [int(tag[len("entry-"):]) for tag in tags if tag.startswith("entry-")]
+    if offsets:
+        # The offsets in the widget belong to the generation it was filled under
+        generation = history_version[0] if history_version else log_generation(get_mood_log().path)
+        history_menu_offset = (generation, offsets[0])
+        history_menu.tk_popup(event.x_root, event.y_root)
+
+# Function to correct the mood and note of the entry the menu was opened on
+def edit_history_entry():
+    """Open a small window with the entry's mood and note; saving appends the corrected entry"""
+    log = get_mood_log()
+    generation, offset = history_menu_offset
+    log.flush()
+    entry = log.entry_at(offset) if generation == log_generation(log.path) else None
+    if entry is None or entry.offset != offset:
+        # Changed or compacted since the view was filled
+        search_history()
+        return
+    
+    dialog = tk.Toplevel(root)
+    dialog.title(f"Edit entry from {entry.timestamp:%Y-%m-%d %H:%M}")
+    dialog.transient(root)
+    mood_choice = tk.StringVar(dialog, value=entry.mood)
+    moods = list(dict.fromkeys([get_mood_name(image) for image in mood_images] + [entry.mood]))
+    tk.OptionMenu(dialog, mood_choice, *moods).pack(side="top", fill="x")
+    note_box = tk.Text(dialog, font=("Stardew Valley", 14), width=40, height=6, wrap=tk.WORD,
+                       bg="#ffc478", fg="#88563d", relief="solid", bd=2)
+    note_box.insert("1.0", entry.note)
+    note_box.pack(side="top", fill="both", expand=True)
+    
+    def save_edit():
+        mood_name, note_text = mood_choice.get(), note_box.get("1.0", "end-1c")
+        dialog.destroy()
+        if (mood_name, note_text) == (entry.mood, entry.note):
+            return
+        try:
+            log.edit(offset, mood_name, note_text, generation)
+            if sync_worker:
+                sync_worker.request()
+        except Exception as e:
+            print(f"Error editing mood entry: {e}")
+        search_history()
+    
+    tk.Button(dialog, text="Save", command=save_edit).pack(side="right")
+    tk.Button(dialog, text="Cancel", command=dialog.destroy).pack(side="right")
+
+# Function to delete the entry the menu was opened on
+def delete_history_entry():
+    if not messagebox.askyesno("Delete entry", "Delete this mood entry?", parent=root):
+        return
+    try:
+        generation, offset = history_menu_offset
+        get_mood_log().delete(offset, generation)
+    except Exception as e:
+        print(f"Error deleting mood entry: {e}")
+    search_history()
 
 # Function to hide confirmation message
 def hide_confirmation():
-    canvas.delete("confirmation")
+    global confirmation_after_id
+    confirmation_after_id = None
+    canvas_scene.hide("confirmation")
 
 # Function to handle mood selection
 def select_mood(event=None):
-    if mood_photos and current_view == "main":
+    if mood_images and current_view == "main":
         current_mood = get_mood_name(mood_images[current_mood_index])
         note_text = note_entry.get("1.0", "end-1c")  # Get text from text widget
         
-        # Save mood with note
-        save_mood_log(current_mood, note_text)
+        # Save mood with note (sent in the background when a mood server is used)
+        if mood_service:
+            mood_service.save(current_mood, note_text)
+        else:
+            save_mood_log(current_mood, note_text)
+            if sync_worker:
+                sync_worker.request()
         
         # Clear the note after logging
         note_entry.delete("1.0", "end")
@@ -409,60 +862,46 @@ def select_mood(event=None):
 
 def show_confirmation(mood_name):
     """Show mood logged confirmation message"""
-    # Clear any existing confirmation
-    canvas.delete("confirmation")
-    
+    global confirmation_after_id
     # Show confirmation image if available - scaled position
     if confirmation_photo:
-        canvas.create_image(792, 160, image=confirmation_photo, anchor="center", tags="confirmation")
+        canvas_scene.show("confirmation", "image", (792, 160), image=confirmation_photo, anchor="center")
     
-    # Auto-hide confirmation after 2 seconds
-    root.after(2000, hide_confirmation)
+    # Auto-hide confirmation 2 seconds after the latest save
+    if confirmation_after_id is not None:
+        root.after_cancel(confirmation_after_id)
+    confirmation_after_id = root.after(2000, hide_confirmation)
 
 def show_main_view():
     """Show the main mood tracking interface"""
-    global current_view, history_text, history_frame, stats_text, stats_frame
+    global current_view
     current_view = "main"
     
-    # Hide other widgets if they exist
-    if history_text:
-        history_text.destroy()
-        history_text = None
+    # Hide the other views - their widgets stay alive for next time
     if history_frame:
-        history_frame.destroy()
-        history_frame = None
-    if stats_text:
-        stats_text.destroy()
-        stats_text = None
+        history_frame.place_forget()
     if stats_frame:
-        stats_frame.destroy()
-        stats_frame = None
+        stats_frame.place_forget()
+    if heatmap_frame:
+        heatmap_frame.place_forget()
     
     # Show main interface elements - scaled position
     note_entry.place(x=40, y=96)
     
     update_mood_display()
 
-def show_history_view():
-    """Show the mood history interface"""
-    global current_view, history_text, history_frame, stats_text, stats_frame
-    current_view = "history"
-    
-    # Hide main interface elements
-    note_entry.place_forget()
-    canvas.delete("mood", "mood_text", "click_button")
+# Function to build the history widgets the first time the view opens
+def create_history_view():
+    global history_text, history_frame, history_search, history_menu
     
-    # Hide stats widgets if they exist
-    if stats_text:
-        stats_text.destroy()
-        stats_text = None
-    if stats_frame:
-        stats_frame.destroy()
-        stats_frame = None
-    
-    # Create history frame - scaled dimensions
+    # Create history frame
     history_frame = tk.Frame(root)
-    history_frame.place(x=40, y=96, width=525, height=178)
+    
+    # Create search box - words, "word*" prefixes, "mood:joy" and "date:2024-03" filters, Enter to search
+    history_search = tk.Entry(history_frame, font=("Stardew Valley", 14),
+                              bg="#ffc478", fg="#88563d", relief="solid", bd=2)
+    history_search.pack(side="top", fill="x")
+    history_search.bind("<Return>", search_history)
     
     # Create text widget for history - scaled font
     history_text = tk.Text(history_frame, font=("Stardew Valley", 16), 
@@ -471,48 +910,73 @@ def show_history_view():
     
     # Create scrollbar
     scrollbar = tk.Scrollbar(history_frame, orient="vertical", command=history_text.yview)
-    history_text.configure(yscrollcommand=scrollbar.set)
+    
+    def on_history_scroll(first, last):
+        global history_page_pending
+        scrollbar.set(first, last)
+        # Load older entries as the scrollbar nears the bottom
+        if history_pager and not history_page_pending and float(last) > 0.9:
+            history_page_pending = True
+            root.after_idle(load_history_page)
+    
+    history_text.configure(yscrollcommand=on_history_scroll)
+    
+    # Right-click an entry to edit or delete it
+    history_menu = tk.Menu(history_text, tearoff=0)
+    history_menu.add_command(label="Edit entry", command=edit_history_entry)
+    history_menu.add_command(label="Delete entry", command=delete_history_entry)
+    history_text.bind("<Button-3>", show_history_menu)
     
     # Pack widgets
     history_text.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
+
+def show_history_view():
+    """Show the mood history interface"""
+    global current_view
+    current_view = "history"
     
-    # Load and display mood history
-    history_content = load_mood_history()
-    history_text.delete("1.0", "end")
-    history_text.insert("1.0", history_content)
+    # Hide main interface elements
+    note_entry.place_forget()
     
-    # Make text read-only
-    history_text.configure(state="disabled")
+    # Hide the stats view
+    if stats_frame:
+        stats_frame.place_forget()
+    if heatmap_frame:
+        heatmap_frame.place_forget()
+    
+    if not history_frame:
+        create_history_view()
+    # Scaled dimensions
+    history_frame.place(x=40, y=96, width=525, height=178)
+    
+    # Add entries saved while the view was hidden (loads the history the first time)
+    update_history()
     
     # Display mood images and navigation (but disable click button)
     update_mood_display()
 
-def show_stats_view():
-    """Show the mood statistics interface"""
-    global current_view, history_text, history_frame, stats_text, stats_frame
-    current_view = "stats"
+# Function to build the statistics widgets the first time the view opens
+def create_stats_view():
+    global stats_text, stats_frame, stats_filter
     
-    # Hide main interface elements
-    note_entry.place_forget()
-    canvas.delete("mood", "mood_text", "click_button")
-    
-    # Hide history widgets if they exist
-    if history_text:
-        history_text.destroy()
-        history_text = None
-    if history_frame:
-        history_frame.destroy()
-        history_frame = None
-    
-    # Create stats frame - scaled dimensions
+    # Create stats frame
     stats_frame = tk.Frame(root)
-    stats_frame.place(x=40, y=96, width=525, height=178)
+    
+    # Create filter box - "date:2024-03", "from:2024-01 to:2024-06" and "mood:joy", Enter to apply
+    filter_row = tk.Frame(stats_frame)
+    filter_row.pack(side="top", fill="x")
+    tk.Button(filter_row, text="Year in pixels", font=("Stardew Valley", 11), bg="#ffc478", fg="#88563d",
+              command=open_heatmap).pack(side="right")
+    stats_filter = tk.Entry(filter_row, font=("Stardew Valley", 14),
+                            bg="#ffc478", fg="#88563d", relief="solid", bd=2)
+    stats_filter.pack(side="left", fill="x", expand=True)
+    stats_filter.bind("<Return>", refresh_stats)
     
     # Create text widget for stats - scaled font
     stats_text = tk.Text(stats_frame, font=("Stardew Valley", 16), 
                         wrap=tk.WORD, bg="#ffc478", fg="#88563d",
-                        relief="solid", bd=2)
+                        relief="solid", bd=2, state="disabled")
     
     # Create scrollbar
     scrollbar = tk.Scrollbar(stats_frame, orient="vertical", command=stats_text.yview)
@@ -521,18 +985,251 @@ def show_stats_view():
     # Pack widgets
     stats_text.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
+
+def show_stats_view():
+    """Show the mood statistics interface"""
+    global current_view
+    current_view = "stats"
     
-    # Load and display mood statistics
-    stats_content = calculate_mood_stats()
-    stats_text.delete("1.0", "end")
-    stats_text.insert("1.0", stats_content)
+    # Hide main interface elements
+    note_entry.place_forget()
     
-    # Make text read-only
-    stats_text.configure(state="disabled")
+    # Hide the history view
+    if history_frame:
+        history_frame.place_forget()
+    if heatmap_frame:
+        heatmap_frame.place_forget()
+    
+    if not stats_frame:
+        create_stats_view()
+    # Scaled dimensions
+    stats_frame.place(x=40, y=96, width=525, height=178)
+    
+    # Load and display mood statistics (only the lines that changed since last time)
+    refresh_stats()
     
     # Display mood images and navigation (but disable click button)
     update_mood_display()
 
+# Function to build the year in pixels panel the first time it opens
+def create_heatmap_view():
+    global heatmap_frame, heatmap_image, heatmap_year_label, heatmap_painter
+    heatmap_frame = tk.Frame(root, bg="#ffc478", relief="solid", bd=2)
+    
+    # Year arrows and the way back to the statistics
+    top_row = tk.Frame(heatmap_frame, bg="#ffc478")
+    top_row.pack(side="top", fill="x")
+    button_style = {"font": ("Stardew Valley", 11), "bg": "#ffc478", "fg": "#88563d"}
+    tk.Button(top_row, text="<", command=lambda: change_heatmap_year(-1), **button_style).pack(side="left")
+    heatmap_year_label = tk.Label(top_row, font=("Stardew Valley", 14), bg="#ffc478", fg="#88563d")
+    heatmap_year_label.pack(side="left", padx=6)
+    tk.Button(top_row, text=">", command=lambda: change_heatmap_year(1), **button_style).pack(side="left")
+    tk.Button(top_row, text="Statistics", command=open_stats, **button_style).pack(side="right")
+    
+    heatmap_image = tk.Label(heatmap_frame, bg="#ffc478", fg="#88563d", font=("Stardew Valley", 14))
+    heatmap_image.pack(side="top", fill="both", expand=True)
+    heatmap_painter = YearInPixels()
+
+def show_heatmap_view():
+    """Show the year in pixels next to the statistics"""
+    global current_view, heatmap_year
+    current_view = "heatmap"
+    
+    # Hide main interface elements and the other views
+    note_entry.place_forget()
+    if history_frame:
+        history_frame.place_forget()
+    if stats_frame:
+        stats_frame.place_forget()
+    
+    if not heatmap_frame:
+        create_heatmap_view()
+    if heatmap_year is None:
+        heatmap_year = int(time.strftime("%Y"))
+    heatmap_frame.place(x=40, y=96, width=525, height=178)
+    
+    # Shows the last drawing of the year straight away - changed months are drawn in the background
+    refresh_heatmap()
+    
+    update_mood_display()
+
+def change_heatmap_year(step):
+    global heatmap_year
+    heatmap_year += step
+    refresh_heatmap()
+
+def refresh_heatmap():
+    """Ask for the shown year to be drawn again and show the last finished drawing meanwhile"""
+    if not heatmap_frame:
+        return
+    heatmap_year_label.configure(text=str(heatmap_year))
+    if mood_service:
+        heatmap_image.configure(image="", text="The year in pixels needs the mood log on this computer.")
+        return
+    try:
+        # Entries are read on the painter thread, up to what is written now
+        log = get_mood_log()
+        log.flush()
+        heatmap_painter.request(heatmap_year, log.path, log_version(log.path))
+    except Exception as e:
+        heatmap_image.configure(image="", text=f"Error reading mood log: {e}")
+        return
+    show_heatmap_image()
+    schedule_heatmap_poll()
+
+def show_heatmap_image():
+    global heatmap_photo, heatmap_shown
+    shown = (heatmap_year, heatmap_painter.version)
+    if shown == heatmap_shown:
+        return
+    image = heatmap_painter.image(heatmap_year)
+    if image is None:
+        heatmap_image.configure(image="", text="Drawing...")
+        return
+    heatmap_photo = ImageTk.PhotoImage(image)
+    heatmap_image.configure(image=heatmap_photo, text="")
+    heatmap_shown = shown
+
+def schedule_heatmap_poll():
+    global heatmap_poll_pending
+    if not heatmap_poll_pending:
+        heatmap_poll_pending = True
+        root.after(50, poll_heatmap)
+
+def poll_heatmap():
+    """Show the drawing once the painter thread has finished it"""
+    global heatmap_poll_pending
+    heatmap_poll_pending = False
+    if current_view != "heatmap":
+        return
+    # Checked first, so a drawing finished in between is still shown
+    busy = heatmap_painter.busy()
+    show_heatmap_image()
+    if busy:
+        schedule_heatmap_poll()
+
+# Function to fill the statistics page
+def refresh_stats(event=None):
+    """Show the statistics for the filter box (or all entries and the trends when it is empty)"""
+    global stats_shown
+    if not stats_text:
+        return
+    query = stats_filter.get().strip() if stats_filter else ""
+    
+    # Nothing to do when neither the filter, the log nor the day changed
+    try:
+        if mood_service:
+            shown = None  # Others save to the server too - always ask it
+        else:
+            log = get_mood_log()
+            log.flush()
+            shown = (query, log_version(log.path), time.strftime("%Y-%m-%d"), note_analytics_version(log)[0])
+    except Exception as e:
+        print(f"Error reading mood log: {e}")
+        shown = None
+    if shown is not None and shown == stats_shown:
+        return
+    
+    if mood_service:
+        # Filled in by show_service_stats once the server answers
+        if not stats_text.get("1.0", "end-1c").strip():
+            show_stats_content("Asking the mood server...\n")
+        ask_mood_service("stats", lambda: mood_service.stats_text(query), show_service_stats)
+        stats_shown = None
+        return
+    if query:
+        try:
+            if get_mood_log().time_index_ready():
+                stats_content = get_mood_log().filtered_stats_text(query)
+            else:
+                # Filled in once the time index has been read in the background
+                stats_content = f"FILTER: {query}\nReading the mood log...\n"
+                shown = None
+                schedule_time_index_poll()
+        except Exception as e:
+            stats_content = f"Error calculating statistics: {e}"
+    else:
+        # All entries, followed by the trends over time
+        stats_content = calculate_mood_stats()
+        trends_content = calculate_mood_trends()
+        if trends_content:
+            stats_content = stats_content.rstrip("\n") + "\n\n" + trends_content
+        # The notes are counted in worker processes - show the last result and fill in the new one when it is ready
+        try:
+            notes_content = calculate_note_analytics(get_mood_log()) or "NOTES:\nReading your notes...\n"
+            schedule_notes_poll()
+        except Exception as e:
+            notes_content = f"Error analysing notes: {e}\n"
+        stats_content = stats_content.rstrip("\n") + "\n\n" + notes_content
+    show_stats_content(stats_content)
+    stats_shown = shown
+
+def show_stats_content(stats_content):
+    stats_text.configure(state="normal")
+    replace_changed_lines(stats_text, stats_content)
+    
+    # Make text read-only
+    stats_text.configure(state="disabled")
+
+def show_service_stats(result):
+    """Show the statistics page the mood server sent (or why it couldn't be had)"""
+    if not stats_text:
+        return
+    if isinstance(result, Exception):
+        result = f"Error getting statistics from the mood server: {result}"
+    show_stats_content(result)
+
+# Function to fill in a filtered statistics page once the time index is read
+def schedule_time_index_poll():
+    global time_index_poll_pending
+    if not time_index_poll_pending:
+        time_index_poll_pending = True
+        root.after(100, poll_time_index)
+
+def poll_time_index():
+    global time_index_poll_pending
+    time_index_poll_pending = False
+    if current_view == "stats":
+        refresh_stats()
+
+# Function to show the note analytics once the worker processes are done
+def schedule_notes_poll():
+    global notes_poll_pending
+    if not notes_poll_pending:
+        notes_poll_pending = True
+        root.after(500, poll_note_analytics)
+
+def poll_note_analytics():
+    global notes_poll_pending
+    notes_poll_pending = False
+    version, running = note_analytics_version(get_mood_log())
+    if current_view == "stats" and stats_shown and version != stats_shown[3]:
+        refresh_stats()
+    elif running:
+        schedule_notes_poll()
+
+# Function to update a text widget in place
+def replace_changed_lines(text_widget, content):
+    """Make the widget show content, editing only the lines that differ"""
+    if not content.endswith("\n"):
+        content += "\n"
+    current = text_widget.get("1.0", "end-1c")
+    if current and not current.endswith("\n"):
+        text_widget.delete("1.0", "end")
+        current = ""
+    # Every line ends with a newline, so line n spans "n.0" up to "n+1.0"
+    old_lines = current.split("\n")[:-1]
+    new_lines = content.split("\n")[:-1]
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    # Apply the edits from the bottom up so earlier line numbers stay valid
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            text_widget.delete(f"{i1 + 1}.0", f"{i2 + 1}.0")
+        if j2 > j1:
+            text_widget.insert(f"{i1 + 1}.0", "".join(line + "\n" for line in new_lines[j1:j2]))
+
 # Functions for Notes, History, and Stats button handlers
 def open_notes(event=None):
     """Switch to the main notes/mood tracking view"""
@@ -549,175 +1246,321 @@ def open_stats(event=None):
     print("Switching to Statistics view")
     show_stats_view()
 
+def open_heatmap(event=None):
+    """Switch to the year in pixels"""
+    print("Switching to Year in pixels view")
+    show_heatmap_view()
+
 # Update mood display on canvas (called when mood changes or view switches)
 def update_mood_display():
-    # Clear existing mood elements
-    canvas.delete("mood")
-    canvas.delete("mood_text")
-    canvas.delete("click_button")
-    if mood_photos:
+    if mood_images:
         # Display current mood image - scaled position
-        canvas.create_image(792, 144, image=mood_photos[current_mood_index], anchor="center", tags="mood")
+        canvas_scene.show("mood", "image", (792, 144), image=mood_portraits.get_photo(current_mood_index),
+                          anchor="center")
         
         # Display mood name below the image with scaled font
         mood_name = get_mood_name(mood_images[current_mood_index])
-        canvas.create_text(792, 284, text=mood_name, font=("Stardew Valley", 32, "bold"), 
-                          fill="#895837", anchor="center", tags="mood_text")
-        
-        # Only show click button in main view (not in history or stats)
-        if current_view == "main":
-            # Display click button above the mood image - scaled position
-            canvas.create_image(936, 232, image=click_photo, anchor="center", tags="click_button")
+        canvas_scene.show("mood_text", "text", (792, 284), text=mood_name, font=("Stardew Valley", 32, "bold"),
+                          fill="#895837", anchor="center")
+    
+    # Only show click button in main view (not in history or stats)
+    if mood_images and current_view == "main" and click_photo:
+        # Display click button above the mood image - scaled position
+        canvas_scene.show("click_button", "image", (936, 232), image=click_photo, anchor="center")
+    else:
+        canvas_scene.hide("click_button")
+
+# Function to draw the mood the arrows moved to (once per frame, however many steps were taken)
+def redraw_mood():
+    update_mood_display()
+    mood_portraits.prefetch_around(current_mood_index)
+    print(f"Showing mood image: {os.path.basename(mood_images[current_mood_index])}")
+
+def request_mood_redraw():
+    if frame_scheduler:
+        frame_scheduler.request(redraw_mood)
+    else:
+        redraw_mood()
 
 def next_mood(event=None):
     global current_mood_index
-    if mood_photos:
-        current_mood_index = (current_mood_index + 1) % len(mood_photos)
-        update_mood_display()
-        print(f"Showing mood image: {os.path.basename(mood_images[current_mood_index])}")
+    if mood_images:
+        current_mood_index = (current_mood_index + 1) % len(mood_images)
+        request_mood_redraw()
 
 def previous_mood(event=None):
     global current_mood_index
-    if mood_photos:
-        current_mood_index = (current_mood_index - 1) % len(mood_photos)
-        update_mood_display()
-        print(f"Showing mood image: {os.path.basename(mood_images[current_mood_index])}")
-
-# Create text widget for multi-line notes - scaled dimensions and font
-note_entry = tk.Text(root, width=52, height=8, font=("Stardew Valley", 16), 
-                     wrap=tk.WORD, bg="#ffc478", relief="solid", bd=2, fg="#88563d")
-note_entry.place(x=40, y=96)
-
-# Load and place arrow images as clickable canvas items - scaled sizes and positions
-try:
-    arrow2_path = os.path.join("images", "arrow2.png")
-    arrow2_image = Image.open(arrow2_path).resize((32, 32), Image.Resampling.LANCZOS)
-    arrow2_photo = ImageTk.PhotoImage(arrow2_image)
-
-    arrow1_path = os.path.join("images", "arrow1.png")
-    arrow1_image = Image.open(arrow1_path).resize((32, 32), Image.Resampling.LANCZOS)
-    arrow1_photo = ImageTk.PhotoImage(arrow1_image)
-
-    # Add left arrow image - scaled position
-    left_arrow = canvas.create_image(624, 168, image=arrow2_photo, anchor="center")
-    canvas.tag_bind(left_arrow, "<Button-1>", previous_mood)
-
-    # Add right arrow image - scaled position
-    right_arrow = canvas.create_image(960, 168, image=arrow1_photo, anchor="center")
-    canvas.tag_bind(right_arrow, "<Button-1>", next_mood)
-
-    # Keep references to prevent garbage collection
-    canvas.arrow_left = arrow2_photo
-    canvas.arrow_right = arrow1_photo
-    canvas.bg = bg_photo
-    canvas.leaf = leaf_photo
-
-except FileNotFoundError as e:
-    print(f"Error: Arrow image not found - {e}")
-except Exception as e:
-    print(f"Error loading arrow images: {e}")
-
-# Load click button image - scaled size
-try:
-    click_path = os.path.join("images", "click1.png")
-    click_image = Image.open(click_path).resize((35, 35), Image.Resampling.LANCZOS)
-    click_photo = ImageTk.PhotoImage(click_image)
-    
-    # Bind click event to the button (will be created in update_mood_display)
-    canvas.tag_bind("click_button", "<Button-1>", select_mood)
-    
-except FileNotFoundError as e:
-    print(f"Error: click1.png not found - {e}")
-    click_photo = None
-except Exception as e:
-    print(f"Error loading click button: {e}")
-    click_photo = None
-
-# Load confirmation message image - scaled size
-try:
-    confirmation_path = os.path.join("images", "confirmation.png")
-    confirmation_image = Image.open(confirmation_path).resize((240, 72), Image.Resampling.LANCZOS)
-    confirmation_photo = ImageTk.PhotoImage(confirmation_image)
-except FileNotFoundError:
-    print("No confirmation image found")
-    confirmation_photo = None
-except Exception as e:
-    print(f"Error loading confirmation image: {e}")
-    confirmation_photo = None
-
-# Load and place Notes, History, and Stats buttons - scaled sizes and positions
-try:
-    # Load Notes button - scaled size
-    notes_path = os.path.join("images", "notes.png")
-    notes_image = Image.open(notes_path).resize((144, 44), Image.Resampling.LANCZOS)
-    notes_photo = ImageTk.PhotoImage(notes_image)
-    
-    # Load History button - scaled size
-    history_path = os.path.join("images", "history.png")
-    history_image = Image.open(history_path).resize((144, 44), Image.Resampling.LANCZOS)
-    history_photo = ImageTk.PhotoImage(history_image)
-    
-    # Load Stats button - scaled size
+    if mood_images:
+        current_mood_index = (current_mood_index - 1) % len(mood_images)
+        request_mood_redraw()
+
+# Function to step through the moods with the arrow keys (outside the text boxes)
+def on_arrow_key(event):
+    if isinstance(event.widget, (tk.Text, tk.Entry)):
+        return
+    if event.keysym == "Left":
+        previous_mood()
+    else:
+        next_mood()
+
+# Function to place the mood arrows
+def load_arrows():
+    """Load and place arrow images as clickable canvas items - scaled sizes and positions"""
     try:
-        stats_path = os.path.join("images", "stats.png")
-        stats_image = Image.open(stats_path).resize((144, 44), Image.Resampling.LANCZOS)
-        stats_photo = ImageTk.PhotoImage(stats_image)
+        arrow2_path = os.path.join("images", "arrow2.png")
+        arrow2_image = load_scaled_image(arrow2_path, (32, 32))
+        arrow2_photo = ImageTk.PhotoImage(arrow2_image)
+
+        arrow1_path = os.path.join("images", "arrow1.png")
+        arrow1_image = load_scaled_image(arrow1_path, (32, 32))
+        arrow1_photo = ImageTk.PhotoImage(arrow1_image)
+
+        # Add left arrow image - scaled position
+        left_arrow = canvas.create_image(624, 168, image=arrow2_photo, anchor="center")
+        canvas.tag_bind(left_arrow, "<Button-1>", previous_mood)
+
+        # Add right arrow image - scaled position
+        right_arrow = canvas.create_image(960, 168, image=arrow1_photo, anchor="center")
+        canvas.tag_bind(right_arrow, "<Button-1>", next_mood)
+        root.bind("<Left>", on_arrow_key)
+        root.bind("<Right>", on_arrow_key)
+
+        # Keep references to prevent garbage collection
+        canvas.arrow_left = arrow2_photo
+        canvas.arrow_right = arrow1_photo
+
+    except FileNotFoundError as e:
+        print(f"Error: Arrow image not found - {e}")
+    except Exception as e:
+        print(f"Error loading arrow images: {e}")
+
+# Function to load the click button
+def load_click_button():
+    """Load click button image - scaled size"""
+    global click_photo
+    try:
+        click_path = os.path.join("images", "click1.png")
+        click_image = load_scaled_image(click_path, (35, 35))
+        click_photo = ImageTk.PhotoImage(click_image)
+    
+        # Bind click event to the button (created by the first update_mood_display)
+        canvas.tag_bind("click_button", "<Button-1>", select_mood)
+    
+    except FileNotFoundError as e:
+        print(f"Error: click1.png not found - {e}")
+        click_photo = None
+    except Exception as e:
+        print(f"Error loading click button: {e}")
+        click_photo = None
+
+# Function to load the confirmation message (only needed after the first save)
+def load_confirmation_image():
+    """Load confirmation message image - scaled size"""
+    global confirmation_photo
+    try:
+        confirmation_path = os.path.join("images", "confirmation.png")
+        confirmation_image = load_scaled_image(confirmation_path, (240, 72))
+        confirmation_photo = ImageTk.PhotoImage(confirmation_image)
     except FileNotFoundError:
-        # Create a simple stats button using text if image doesn't exist
-        stats_photo = None
-    
-    # Load Music button - scaled size (44x44 for square icon)
-    music_path = os.path.join("images", "music.png")
-    music_image = Image.open(music_path).resize((44, 44), Image.Resampling.LANCZOS)
-    music_photo = ImageTk.PhotoImage(music_image)
-    
-    # Add Notes button to canvas - scaled position
-    notes_button = canvas.create_image(96, 48, image=notes_photo, anchor="center")
-    canvas.tag_bind(notes_button, "<Button-1>", open_notes)
-    
-    # Add History button to canvas - scaled position
-    history_button = canvas.create_image(256, 48, image=history_photo, anchor="center")
-    canvas.tag_bind(history_button, "<Button-1>", open_history)
-    
-    # Add Stats button to canvas - scaled position and size
-    if stats_photo:
-        stats_button = canvas.create_image(416, 48, image=stats_photo, anchor="center")
-        canvas.tag_bind(stats_button, "<Button-1>", open_stats)
-        canvas.stats_photo = stats_photo
+        print("No confirmation image found")
+        confirmation_photo = None
+    except Exception as e:
+        print(f"Error loading confirmation image: {e}")
+        confirmation_photo = None
+
+# Function to place the Notes, History, Stats and Music buttons
+def load_navigation_buttons():
+    """Load and place Notes, History, and Stats buttons - scaled sizes and positions"""
+    try:
+        # Load Notes button - scaled size
+        notes_path = os.path.join("images", "notes.png")
+        notes_image = load_scaled_image(notes_path, (144, 44))
+        notes_photo = ImageTk.PhotoImage(notes_image)
+    
+        # Load History button - scaled size
+        history_path = os.path.join("images", "history.png")
+        history_image = load_scaled_image(history_path, (144, 44))
+        history_photo = ImageTk.PhotoImage(history_image)
+    
+        # Load Stats button - scaled size
+        try:
+            stats_path = os.path.join("images", "stats.png")
+            stats_image = load_scaled_image(stats_path, (144, 44))
+            stats_photo = ImageTk.PhotoImage(stats_image)
+        except FileNotFoundError:
+            # Create a simple stats button using text if image doesn't exist
+            stats_photo = None
+    
+        # Load Music button - scaled size (44x44 for square icon)
+        music_path = os.path.join("images", "music.png")
+        music_image = load_scaled_image(music_path, (44, 44))
+        music_photo = ImageTk.PhotoImage(music_image)
+    
+        # Add Notes button to canvas - scaled position
+        notes_button = canvas.create_image(96, 48, image=notes_photo, anchor="center")
+        canvas.tag_bind(notes_button, "<Button-1>", open_notes)
+    
+        # Add History button to canvas - scaled position
+        history_button = canvas.create_image(256, 48, image=history_photo, anchor="center")
+        canvas.tag_bind(history_button, "<Button-1>", open_history)
+    
+        # Add Stats button to canvas - scaled position and size
+        if stats_photo:
+            stats_button = canvas.create_image(416, 48, image=stats_photo, anchor="center")
+            canvas.tag_bind(stats_button, "<Button-1>", open_stats)
+            canvas.stats_photo = stats_photo
+        else:
+            # Create text-based stats button - scaled dimensions and font
+            stats_button = canvas.create_rectangle(352, 28, 480, 68, fill="#ffc478", outline="#88563d", width=2)
+            canvas.create_text(416, 48, text="STATISTICS", font=("Stardew Valley", 11, "bold"), fill="#88563d")
+            canvas.tag_bind(stats_button, "<Button-1>", open_stats)
+    
+        # Add Music button to canvas - music.png only
+        music_button = canvas.create_image(520, 45, image=music_photo, anchor="center")
+        canvas.tag_bind(music_button, "<Button-1>", lambda e: toggle_music())
+        canvas.tag_bind(music_button, "<Button-3>", lambda e: next_music())
+        canvas.music_photo = music_photo
+    
+        # Keep references to prevent garbage collection
+        canvas.notes_photo = notes_photo
+        canvas.history_photo = history_photo
+    
+    except FileNotFoundError as e:
+        print(f"Error: Notes or History button image not found - {e}")
+    except Exception as e:
+        print(f"Error loading Notes/History buttons: {e}")
+
+# Function to close the app without losing queued log entries
+def on_close():
+    """Stop the music, flush the mood journal to disk, then close the window"""
+    if music_player:
+        music_player.close()
+    if sync_worker:
+        sync_worker.close()
+    if mood_log:
+        mood_log.close()
+    close_note_analytics()
+    if mood_service:
+        mood_service.close()
+    if hot_path_metrics:
+        hot_path_metrics.close()
+    root.destroy()
+
+# Function to build the main view
+def load_main_view():
+    """Everything the first paint needs: arrows, buttons and the current mood portrait"""
+    global mood_portraits
+    find_mood_images()
+    mood_portraits = MoodPortraitCache(mood_images)
+    load_arrows()
+    load_click_button()
+    load_navigation_buttons()
+    
+    # Initialize the mood display
+    if mood_images:
+        update_mood_display()
+        mood_portraits.prefetch_around(current_mood_index)
+
+# Function to open the mood log
+def open_log():
+    """Recover any half-written entry, start the background writer and load the statistics snapshot"""
+    global mood_log
+    if not mood_service:
+        mood_log = get_mood_log()
+        # Date filters need the time index - start reading it in the background now
+        mood_log.time_index_ready()
+
+# Function to start syncing with a replica, if one is configured
+def start_sync():
+    global sync_worker
+    if mood_service:
+        return
+    sync_worker = sync_from_environment(get_mood_log())
+    if sync_worker:
+        sync_worker.start()
+        root.after(500, poll_sync)
+
+def poll_sync():
+    """Save entries the sync thread fetched (on the Tk thread, which owns the mood log)"""
+    if not sync_worker:
+        return
+    if sync_worker.apply_pulled(save_synced_entries):
+        # Show them if the history or stats page is open
+        if current_view == "history":
+            update_history()
+        elif current_view == "stats":
+            refresh_stats()
+        elif current_view == "heatmap":
+            refresh_heatmap()
+    root.after(500, poll_sync)
+
+def save_synced_entries(entries):
+    log = get_mood_log()
+    for entry in entries:
+        log.save(entry.mood, entry.note, entry.timestamp, checkpoint=False)
+    log.checkpoint()
+
+# Startup work that waits until the window has painted, run one phase per event loop turn
+first_paint_done = False
+deferred_startup_phases = [
+    ("open mood log", open_log),
+    ("load view assets", load_confirmation_image),
+    ("start leaf animation", start_leaf_animation),
+    ("start music", start_music),
+    ("start sync", start_sync),
+]
+
+def run_deferred_startup(event=None):
+    """Run the next deferred startup phase, then give the event loop a turn"""
+    if deferred_startup_phases:
+        name, phase = deferred_startup_phases.pop(0)
+        startup_timeline.run(name, phase)
+        root.after(1, run_deferred_startup)
     else:
-        # Create text-based stats button - scaled dimensions and font
-        stats_button = canvas.create_rectangle(352, 28, 480, 68, fill="#ffc478", outline="#88563d", width=2)
-        canvas.create_text(416, 48, text="STATISTICS", font=("Stardew Valley", 11, "bold"), fill="#88563d")
-        canvas.tag_bind(stats_button, "<Button-1>", open_stats)
-    
-    # Add Music button to canvas - music.png only
-    music_button = canvas.create_image(520, 45, image=music_photo, anchor="center")
-    canvas.tag_bind(music_button, "<Button-1>", lambda e: toggle_music())
-    canvas.music_photo = music_photo
-    
-    # Keep references to prevent garbage collection
-    canvas.notes_photo = notes_photo
-    canvas.history_photo = history_photo
-    
-except FileNotFoundError as e:
-    print(f"Error: Notes or History button image not found - {e}")
-except Exception as e:
-    print(f"Error loading Notes/History buttons: {e}")
-
-# Load available music files
-load_music_files()
-
-# Initialize the mood display
-if mood_photos:
-    update_mood_display()
+        startup_timeline.mark("startup complete")
+        startup_timeline.report()
 
-# Start falling leaves animation
-if leaf_photo:
-    update_leaves()
+def on_first_map(event):
+    """Mark the first paint once the window is on screen, then start the deferred phases"""
+    global first_paint_done
+    if event.widget is not root or first_paint_done:
+        return
+    first_paint_done = True
+    # Draw everything that is pending so the mark covers the actual paint
+    root.update_idletasks()
+    startup_timeline.mark("first paint")
+    root.after(1, run_deferred_startup)
+
+# Opt-in handler timing - set MOOD_TRACKER_METRICS to a .jsonl file to turn it on (see mood_metrics.py)
+hot_path_metrics = None
+instrumented_handlers = [
+    "select_mood", "next_mood", "previous_mood", "redraw_mood", "hide_confirmation",
+    "open_notes", "open_history", "open_stats",
+    "show_main_view", "show_history_view", "show_stats_view", "search_history", "load_history_page", "refresh_stats",
+    "open_heatmap", "show_heatmap_view", "refresh_heatmap",
+    "edit_history_entry", "delete_history_entry",
+    "toggle_music", "next_music", "update_leaves", "run_deferred_startup",
+]
 
-# Auto-start background music if available
-if pygame_available and music_files:
-    play_music()
+def enable_instrumentation():
+    """Wrap the Tk handlers with timing, before any of them is bound"""
+    global hot_path_metrics
+    hot_path_metrics = metrics_from_environment()
+    if hot_path_metrics:
+        for name in instrumented_handlers:
+            globals()[name] = hot_path_metrics.wrap(name, globals()[name])
+
+def main():
+    global mood_service
+    enable_instrumentation()
+    mood_service = client_from_environment()
+    startup_timeline.run("create window", create_window)
+    startup_timeline.run("background", load_background)
+    startup_timeline.run("main view", load_main_view)
+    root.bind("<Map>", on_first_map, add="+")
+    
+    # Start the GUI event loop
+    root.mainloop()
 
-# Start the GUI event loop
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,16 @@
+import unittest
+from unittest import mock
+
+import mood_analytics
+
+
+class MoodTrendsTest(unittest.TestCase):
+    def test_trends_are_left_out_without_numpy(self):
+        with mock.patch.object(mood_analytics, "np", None), \
+                mock.patch.object(mood_analytics, "get_mood_log") as get_mood_log:
+            self.assertEqual(mood_analytics.calculate_mood_trends(), "")
+        get_mood_log.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
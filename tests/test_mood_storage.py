@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from mood_storage import MoodLog
+
+
+class FilteredStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = MoodLog(os.path.join(self.directory.name, "mood_log.txt"))
+        self.log.open()
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def save(self, mood, day):
+        return self.log.save(mood, "", datetime(2024, 1, day, 12, 0, 0))
+
+    def test_mood_filter_counts_only_matching_entries(self):
+        self.save("Sadness", 1)
+        self.save("Joy", 3)
+        self.save("Anger", 4)
+        self.save("Joy", 5)
+        deleted = self.save("Joy", 6)
+        self.save("Sadness", 9)
+        self.log.flush()
+        self.log.delete(deleted.offset)
+        self.log.flush()
+
+        stats_text = self.log.filtered_stats_text("mood:joy")
+        self.assertIn("Entries: 2\n", stats_text)
+        self.assertIn("First Entry: 2024-01-03\n", stats_text)
+        self.assertIn("Latest Entry: 2024-01-05\n", stats_text)
+        self.assertIn("Days Tracked: 3\n", stats_text)
+        self.assertIn("Joy: 2 times (100.0%)\n", stats_text)
+
+    def test_mood_filter_with_date_range(self):
+        self.save("Joy", 2)
+        self.save("Sadness", 3)
+        self.save("Joy", 4)
+        self.save("Anger", 8)
+        self.log.flush()
+
+        stats_text = self.log.filtered_stats_text("mood:joy mood:anger from:2024-01-03")
+        self.assertIn("Entries: 2\n", stats_text)
+        self.assertIn("First Entry: 2024-01-04\n", stats_text)
+        self.assertIn("Latest Entry: 2024-01-08\n", stats_text)
+        self.assertIn("Joy: 1 times (50.0%)\n", stats_text)
+        self.assertIn("Anger: 1 times (50.0%)\n", stats_text)
+
+    def test_unknown_mood_matches_nothing(self):
+        self.save("Joy", 2)
+        self.log.flush()
+        self.assertEqual(self.log.filtered_stats_text("mood:calm"), "No entries match 'mood:calm'.")
+
+
+if __name__ == "__main__":
+    unittest.main()